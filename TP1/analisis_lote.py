@@ -0,0 +1,250 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from cadena import GENESIS_HASH, RegistroCadena, construir_bloque
+from estadisticas import VentanaDeslizante
+from main import VENTANA, detectar_alerta
+
+SALIDA_FILE = "blockchain_lote.jsonl"
+COLUMNAS = ["timestamp", "frecuencia", "presion_sistolica", "presion_diastolica", "oxigeno"]
+# Señal que analiza cada proceso de main.py (la presión usa la sistólica)
+SENALES = {"frecuencia": "frecuencia", "presion": "presion_sistolica", "oxigeno": "oxigeno"}
+# Muestras por tramo: acota la memoria y el error acumulado de las sumas
+TRAMO = 1 << 20
+# En modo lote el fsync se agrupa mucho más que en vivo
+FSYNC_LOTE = 100000
+
+
+def cargar_dataset(ruta):
+    """
+    Carga un dataset grabado
+    - CSV con encabezado: timestamp,frecuencia,presion_sistolica,presion_diastolica,oxigeno
+    - .npz con un array por columna (mismos nombres)
+    Devuelve un dict columna -> array
+    """
+    if ruta.endswith(".npz"):
+        with np.load(ruta) as datos:
+            return {col: datos[col] for col in COLUMNAS}
+    with open(ruta) as f:
+        encabezado = f.readline().strip().split(",")
+    indices = [encabezado.index(col) for col in COLUMNAS]
+    numeros = np.loadtxt(ruta, delimiter=",", skiprows=1, usecols=indices[1:], ndmin=2)
+    timestamps = np.loadtxt(ruta, delimiter=",", skiprows=1, usecols=indices[0], dtype=str, ndmin=1)
+    dataset = {"timestamp": timestamps}
+    for i, col in enumerate(COLUMNAS[1:]):
+        dataset[col] = numeros[:, i]
+    return dataset
+
+
+def estadisticas_ventana(valores, tamano):
+    """
+    Media y desviación (poblacional) de la ventana deslizante para todas las
+    muestras a la vez, con sumas acumuladas
+    - Las primeras muestras usan ventanas parciales, igual que el analizador
+    - Cada tramo se centra en su media para evitar cancelaciones numéricas
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = len(valores)
+    medias = np.empty(n)
+    desvs = np.empty(n)
+    for inicio in range(0, n, TRAMO):
+        fin = min(n, inicio + TRAMO)
+        # Se agregan las tamano-1 muestras anteriores al tramo
+        desde = max(0, inicio - tamano + 1)
+        centro = valores[desde:fin].mean()
+        x = valores[desde:fin] - centro
+        suma = np.concatenate(([0.0], np.cumsum(x)))
+        suma_cuad = np.concatenate(([0.0], np.cumsum(x * x)))
+
+        hasta = np.arange(inicio - desde, fin - desde) + 1
+        comienzo = np.maximum(hasta - tamano, 0)
+        cuenta = hasta - comienzo
+        media = (suma[hasta] - suma[comienzo]) / cuenta
+        var = (suma_cuad[hasta] - suma_cuad[comienzo]) / cuenta - media * media
+        medias[inicio:fin] = media + centro
+        desvs[inicio:fin] = np.sqrt(np.maximum(var, 0.0))
+    return medias, desvs
+
+
+def analizar(dataset, tamano=VENTANA):
+    """Estadísticas de las tres señales y alertas de cada muestra"""
+    resultados = {tipo: estadisticas_ventana(dataset[col], tamano) for tipo, col in SENALES.items()}
+    alertas = detectar_alerta(resultados["frecuencia"][0], resultados["presion"][0], resultados["oxigeno"][0])
+    return resultados, alertas
+
+
+def _plantilla(ordenado):
+    """
+    Plantilla de str.format con el mismo texto que produce json.dumps
+    - ordenado: json.dumps(datos, sort_keys=True), el texto que se hashea
+    - si no: la sección "datos" de la línea del registro (separadores compactos)
+    Campos: {mf} {df} {mp} {dp} {mo} {do} (repr de los float) y {ts} (JSON)
+    """
+    senales = []
+    for tipo, m, d in (("frecuencia", "mf", "df"), ("presion", "mp", "dp"), ("oxigeno", "mo", "do")):
+        if ordenado:
+            senales.append(f'"{tipo}": {{{{"desv": {{{d}}}, "media": {{{m}}}, '
+                           f'"timestamp": {{ts}}, "tipo": "{tipo}"}}}}')
+        else:
+            senales.append(f'"{tipo}":{{{{"tipo":"{tipo}","timestamp":{{ts}},'
+                           f'"media":{{{m}}},"desv":{{{d}}}}}}}')
+    if ordenado:
+        # sort_keys: frecuencia, oxigeno, presion
+        return "{{" + ", ".join([senales[0], senales[2], senales[1]]) + "}}"
+    return "{{" + ",".join(senales) + "}}"
+
+
+PLANTILLA_HASH = _plantilla(True)
+PLANTILLA_DATOS = _plantilla(False)
+
+
+def construir_bloques(dataset, resultados, alertas, registro, prev_hash=GENESIS_HASH):
+    """
+    Construye los bloques en bloque y los agrega al registro
+    - El texto de cada bloque se arma con plantillas (sin json.dumps por bloque)
+      y el repr de cada float se calcula una sola vez
+    - El encadenamiento de hashes es secuencial por definición
+    """
+    # Los float de Python usan el mismo repr que json.dumps
+    columnas = {
+        m: list(map(repr, resultados[tipo][0].tolist())) for tipo, m in
+        (("frecuencia", "mf"), ("presion", "mp"), ("oxigeno", "mo"))
+    }
+    columnas.update({
+        d: list(map(repr, resultados[tipo][1].tolist())) for tipo, d in
+        (("frecuencia", "df"), ("presion", "dp"), ("oxigeno", "do"))
+    })
+    timestamps = dataset["timestamp"].tolist()
+    nombres = list(columnas)
+    for i, alerta in enumerate(alertas.tolist()):
+        timestamp = timestamps[i]
+        campos = {nombre: columnas[nombre][i] for nombre in nombres}
+        campos["ts"] = ts = json.dumps(timestamp)
+
+        bloque_hash = hashlib.sha256(
+            (PLANTILLA_HASH.format(**campos) + timestamp + prev_hash).encode()
+        ).hexdigest()
+        registro.agregar_linea(
+            '{"timestamp":' + ts + ',"datos":' + PLANTILLA_DATOS.format(**campos)
+            + ',"alerta":' + ("true" if alerta else "false")
+            + ',"prev_hash":"' + prev_hash + '","hash":"' + bloque_hash + '"}'
+        )
+        prev_hash = bloque_hash
+    return prev_hash
+
+
+def generar_dataset(ruta, muestras, hz):
+    """Dataset sintético con las mismas distribuciones que generar_datos()"""
+    rng = np.random.default_rng()
+    inicio = datetime.now().replace(microsecond=0)
+    paso = timedelta(seconds=1 / hz)
+    timespec = "seconds" if hz <= 1 else "milliseconds"
+    with open(ruta, "w") as f:
+        f.write(",".join(COLUMNAS) + "\n")
+        for desde in range(0, muestras, TRAMO):
+            n = min(TRAMO, muestras - desde)
+            columnas = [
+                [(inicio + paso * (desde + i)).isoformat(timespec=timespec) for i in range(n)],
+                rng.integers(60, 221, n).tolist(),
+                rng.integers(110, 221, n).tolist(),
+                rng.integers(70, 111, n).tolist(),
+                rng.integers(85, 106, n).tolist()
+            ]
+            f.writelines(",".join(map(str, fila)) + "\n" for fila in zip(*columnas))
+
+
+def verificar(dataset, resultados, alertas, tamano, muestras=2000):
+    """Compara el modo lote con el analizador en vivo y con construir_bloque"""
+    total = len(dataset["timestamp"])
+    # El comienzo de la serie y, si hay más de uno, el paso entre tramos
+    comienzos = [0] + ([TRAMO - muestras] if total > TRAMO else [])
+    for tipo, col in SENALES.items():
+        for comienzo in comienzos:
+            ventana = VentanaDeslizante(tamano)
+            for i in range(comienzo, min(total, comienzo + 2 * muestras)):
+                media, desv = ventana.agregar(dataset[col][i])
+                if comienzo and i < comienzo + tamano - 1:
+                    continue  # la ventana en vivo todavía no está completa
+                # Se compara la varianza: la raíz amplifica el redondeo cerca de cero
+                assert abs(media - resultados[tipo][0][i]) < 1e-9, (tipo, i)
+                assert abs(desv ** 2 - resultados[tipo][1][i] ** 2) < 1e-6, (tipo, i)
+
+    # Los bloques armados con plantillas deben ser idénticos a los de main.py
+    ruta = SALIDA_FILE + ".verificacion"
+    parcial = {k: v[:50] for k, v in dataset.items()}
+    with RegistroCadena(ruta) as registro:
+        construir_bloques(parcial, {t: (r[0][:50], r[1][:50]) for t, r in resultados.items()},
+                          alertas[:50], registro)
+    prev_hash = GENESIS_HASH
+    with open(ruta) as f:
+        for i, linea in enumerate(f):
+            ts = str(parcial["timestamp"][i])
+            datos = {
+                tipo: {"tipo": tipo, "timestamp": ts,
+                       "media": float(resultados[tipo][0][i]), "desv": float(resultados[tipo][1][i])}
+                for tipo in ("frecuencia", "presion", "oxigeno")
+            }
+            esperado = construir_bloque(datos, ts, bool(alertas[i]), prev_hash)
+            assert json.loads(linea) == esperado, i
+            prev_hash = esperado["hash"]
+    os.remove(ruta)
+    print("Verificación OK: estadísticas y bloques coinciden con el modo en vivo")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Análisis por lotes de un dataset biométrico grabado")
+    parser.add_argument("dataset", help="CSV o .npz con las columnas " + ",".join(COLUMNAS))
+    parser.add_argument("--ventana", type=int, default=VENTANA, help=f"Tamaño de la ventana (default: {VENTANA})")
+    parser.add_argument("--salida", default=SALIDA_FILE, help=f"Cadena generada (default: {SALIDA_FILE})")
+    parser.add_argument("--solo-estadisticas", metavar="NPZ",
+                        help="Guarda medias, desvíos y alertas en un .npz sin construir bloques")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Compara con el analizador en vivo antes de procesar")
+    parser.add_argument("--generar", type=int, metavar="N",
+                        help="Genera un dataset sintético de N muestras en la ruta indicada y termina")
+    parser.add_argument("--hz", type=float, default=1000, help="Frecuencia del dataset generado (default: 1000)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.generar:
+        inicio = time.perf_counter()
+        generar_dataset(args.dataset, args.generar, args.hz)
+        print(f"{args.generar} muestras generadas en {args.dataset} ({time.perf_counter() - inicio:.1f}s)")
+        return
+
+    inicio = time.perf_counter()
+    dataset = cargar_dataset(args.dataset)
+    total = len(dataset["timestamp"])
+    print(f"{total} muestras cargadas ({time.perf_counter() - inicio:.1f}s)")
+
+    inicio = time.perf_counter()
+    resultados, alertas = analizar(dataset, args.ventana)
+    print(f"Estadísticas calculadas ({time.perf_counter() - inicio:.2f}s), {int(alertas.sum())} alertas")
+
+    if args.verificar:
+        verificar(dataset, resultados, alertas, args.ventana)
+
+    if args.solo_estadisticas:
+        np.savez(args.solo_estadisticas, alerta=alertas,
+                 **{f"{tipo}_{k}": r[j] for tipo, r in resultados.items() for j, k in enumerate(("media", "desv"))})
+        print(f"Estadísticas guardadas en {args.solo_estadisticas}")
+        return
+
+    inicio = time.perf_counter()
+    if os.path.exists(args.salida):
+        os.remove(args.salida)
+    with RegistroCadena(args.salida, fsync_cada=FSYNC_LOTE, fsync_intervalo=float("inf")) as registro:
+        ultimo = construir_bloques(dataset, resultados, alertas, registro)
+    duracion = time.perf_counter() - inicio
+    print(f"{total} bloques escritos en {args.salida} ({duracion:.1f}s, {total / duracion:,.0f} bloques/s)")
+    print(f"Último hash: {ultimo[:10]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from transporte import MUESTRA_DTYPE
+
+# Registros que entran en el anillo (a 10 kHz, unos 0,4 s de margen)
+CAPACIDAD = 4096
+
+# Cada contador del encabezado ocupa su propia línea de caché (64 bytes) para
+# que el productor y los consumidores no se invaliden la caché mutuamente
+_LINEA = 8  # int64 por línea
+_ESCRITO = 0
+_CERRADO = 1
+_LEIDOS = 2  # primera línea de los cursores de lectura
+
+
+class AnilloMuestras:
+    """
+    Buffer circular de un productor y varios consumidores en memoria compartida
+    - Registros de ancho fijo (dtype) que se escriben una sola vez: cada
+      consumidor los lee como una vista de NumPy, sin pickle ni copias
+    - Un cursor de lectura por consumidor; el productor no pisa un registro
+      hasta que todos lo confirmaron
+    - Un semáforo por consumidor avisa que hay registros nuevos y otro avisa al
+      productor que se liberó espacio; se vacían en cada consulta para que sus
+      contadores no crezcan sin límite
+    """
+
+    def __init__(self, consumidores, capacidad=CAPACIDAD, dtype=MUESTRA_DTYPE):
+        self.consumidores = consumidores
+        self.capacidad = capacidad
+        self.dtype = np.dtype(dtype)
+        tam = (_LEIDOS + consumidores) * _LINEA * 8 + capacidad * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=tam)
+        self.creador = True
+        self.hay_datos = [multiprocessing.Semaphore(0) for _ in range(consumidores)]
+        self.hay_espacio = multiprocessing.Semaphore(0)
+        self._mapear()
+        self.encabezado[:] = 0
+
+    def _mapear(self):
+        n = (_LEIDOS + self.consumidores) * _LINEA
+        self.encabezado = np.ndarray(n, dtype=np.int64, buffer=self.shm.buf)
+        self.registros = np.ndarray(self.capacidad, dtype=self.dtype, buffer=self.shm.buf, offset=n * 8)
+
+    # Con el método "spawn" el anillo se reabre por nombre en el proceso hijo
+    def __getstate__(self):
+        estado = {k: v for k, v in self.__dict__.items() if k not in ("shm", "encabezado", "registros")}
+        estado.update(nombre=self.shm.name, creador=False)
+        return estado
+
+    def __setstate__(self, estado):
+        nombre = estado.pop("nombre")
+        self.__dict__.update(estado)
+        self.shm = shared_memory.SharedMemory(name=nombre)
+        self._mapear()
+
+    def _leido(self, consumidor):
+        return int(self.encabezado[(_LEIDOS + consumidor) * _LINEA])
+
+    @staticmethod
+    def _vaciar_avisos(semaforo):
+        while semaforo.acquire(False):
+            pass
+
+    # Productor
+
+    def _esperar_espacio(self, escrito):
+        """Registros libres (espera si el consumidor más lento tiene el anillo lleno)"""
+        while True:
+            self._vaciar_avisos(self.hay_espacio)
+            libres = self.capacidad - (escrito - int(self.encabezado[_LEIDOS * _LINEA::_LINEA].min()))
+            if libres > 0:
+                return libres
+            self.hay_espacio.acquire()
+
+    def _publicar(self, escrito):
+        # El cursor se publica después de escribir los registros completos
+        self.encabezado[_ESCRITO * _LINEA] = escrito
+        for semaforo in self.hay_datos:
+            semaforo.release()
+
+    def agregar(self, registro):
+        """Escribe un registro (tupla en el orden del dtype) y lo publica"""
+        escrito = int(self.encabezado[_ESCRITO * _LINEA])
+        self._esperar_espacio(escrito)
+        self.registros[escrito % self.capacidad] = registro
+        self._publicar(escrito + 1)
+
+    def agregar_lote(self, registros):
+        """Escribe y publica un array de registros, en tramos contiguos del anillo"""
+        escrito = int(self.encabezado[_ESCRITO * _LINEA])
+        hecho = 0
+        while hecho < len(registros):
+            inicio = escrito % self.capacidad
+            n = min(len(registros) - hecho, self._esperar_espacio(escrito), self.capacidad - inicio)
+            self.registros[inicio:inicio + n] = registros[hecho:hecho + n]
+            escrito += n
+            hecho += n
+            self._publicar(escrito)
+
+    def cerrar(self):
+        """Marca el fin de los datos; los consumidores terminan de leer lo pendiente"""
+        self.encabezado[_CERRADO * _LINEA] = 1
+        for semaforo in self.hay_datos:
+            semaforo.release()
+
+    # Consumidores
+
+    def leer(self, consumidor, timeout=None):
+        """
+        Vista sobre los registros disponibles para el consumidor (sin copiar)
+        - Espera hasta timeout segundos si no hay nada (vista vacía si vence)
+        - None cuando el productor cerró y no quedan registros
+        - La vista es válida hasta llamar a confirmar
+        """
+        semaforo = self.hay_datos[consumidor]
+        while True:
+            self._vaciar_avisos(semaforo)
+            leido = self._leido(consumidor)
+            escrito = int(self.encabezado[_ESCRITO * _LINEA])
+            if escrito > leido:
+                inicio = leido % self.capacidad
+                # Hasta el final del buffer; el resto se lee en la próxima llamada
+                fin = min(self.capacidad, inicio + escrito - leido)
+                return self.registros[inicio:fin]
+            if self.encabezado[_CERRADO * _LINEA]:
+                return None
+            if not semaforo.acquire(timeout=timeout):
+                return self.registros[:0]
+
+    def confirmar(self, consumidor, cantidad):
+        """Libera los registros ya procesados por el consumidor"""
+        self.encabezado[(_LEIDOS + consumidor) * _LINEA] += cantidad
+        self.hay_espacio.release()
+
+    def liberar(self):
+        """Cierra la memoria compartida (y la elimina, en el proceso que la creó)"""
+        self.encabezado = self.registros = None
+        self.shm.close()
+        if self.creador:
+            self.shm.unlink()
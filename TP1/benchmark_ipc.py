@@ -0,0 +1,157 @@
+import argparse
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from anillo import AnilloMuestras
+from transporte import MUESTRA_DTYPE, EmisorLotes, decodificar
+
+LOTES = [1, 64, 1024]
+CONSUMIDORES = 3  # Como en main.py: una copia de cada muestra por analizador
+
+
+def muestras_sinteticas(n):
+    """Registros (seq, timestamp, frecuencia, sistólica, diastólica, oxígeno) pregenerados"""
+    rng = np.random.default_rng(0)
+    inicio = datetime.now().replace(microsecond=0)
+    columnas = [
+        range(n),
+        [(inicio + timedelta(milliseconds=i)).isoformat(timespec="milliseconds") for i in range(n)],
+        rng.integers(60, 221, n).tolist(),
+        rng.integers(110, 221, n).tolist(),
+        rng.integers(70, 111, n).tolist(),
+        rng.integers(85, 106, n).tolist()
+    ]
+    return list(zip(*columnas))
+
+
+def consumidor_dict(conn, resultado):
+    """Un dict por muestra, como el main.py original"""
+    total = suma = 0
+    while True:
+        datos = conn.recv()
+        if datos is None:
+            break
+        suma += datos["frecuencia"]
+        total += 1
+    resultado.send((total, suma))
+
+
+def consumidor_lotes(conn, resultado):
+    total = suma = 0
+    while True:
+        datos = conn.recv_bytes()
+        if not datos:
+            break
+        lote = decodificar(datos, MUESTRA_DTYPE)
+        suma += sum(lote["frecuencia"].tolist())
+        total += len(lote)
+    resultado.send((total, suma))
+
+
+def consumidor_anillo(anillo, consumidor, resultado):
+    total = suma = 0
+    while True:
+        lote = anillo.leer(consumidor)
+        if lote is None:
+            break
+        suma += sum(lote["frecuencia"].tolist())
+        total += len(lote)
+        anillo.confirmar(consumidor, len(lote))
+    resultado.send((total, suma))
+
+
+def medir(muestras, tamano_lote=None, consumidores=CONSUMIDORES):
+    """
+    Envía todas las muestras a los consumidores y devuelve (segundos, mensajes)
+    - tamano_lote=None: un dict con pickle por muestra y por consumidor
+    - tamano_lote=("anillo", n): AnilloMuestras, publicando de a n registros
+    - si no: lotes de registros de ancho fijo con EmisorLotes
+    """
+    anillo = AnilloMuestras(consumidores) if isinstance(tamano_lote, tuple) else None
+    conns, resultados, procesos = [], [], []
+    for i in range(consumidores):
+        padre, hijo = multiprocessing.Pipe()
+        res_padre, res_hijo = multiprocessing.Pipe(duplex=False)
+        if anillo is not None:
+            p = multiprocessing.Process(target=consumidor_anillo, args=(anillo, i, res_hijo))
+        elif tamano_lote is None:
+            p = multiprocessing.Process(target=consumidor_dict, args=(hijo, res_hijo))
+        else:
+            p = multiprocessing.Process(target=consumidor_lotes, args=(hijo, res_hijo))
+        p.start()
+        conns.append(padre)
+        resultados.append(res_padre)
+        procesos.append(p)
+
+    inicio = time.perf_counter()
+    if anillo is not None:
+        publicar = tamano_lote[1]
+        if publicar == 1:
+            for registro in muestras:
+                anillo.agregar(registro)
+        else:
+            registros = np.array(muestras, dtype=MUESTRA_DTYPE)
+            for desde in range(0, len(registros), publicar):
+                anillo.agregar_lote(registros[desde:desde + publicar])
+        mensajes = -(-len(muestras) // publicar)
+        anillo.cerrar()
+    elif tamano_lote is None:
+        for seq, ts, frec, sis, dia, oxi in muestras:
+            datos = {"seq": seq, "timestamp": ts, "frecuencia": frec, "presion": [sis, dia], "oxigeno": oxi}
+            for conn in conns:
+                conn.send(datos)
+        mensajes = len(muestras)
+        for conn in conns:
+            conn.send(None)
+    else:
+        def enviar_lote(datos):
+            for conn in conns:
+                conn.send_bytes(datos)
+
+        # Sin límite de latencia: se mide solo el costo del transporte
+        emisor = EmisorLotes(enviar_lote, MUESTRA_DTYPE, tamano_lote, latencia_max=float("inf"))
+        for registro in muestras:
+            emisor.agregar(registro)
+        emisor.vaciar()
+        mensajes = emisor.lotes_enviados
+        for conn in conns:
+            conn.send_bytes(b"")
+
+    esperado = (len(muestras), sum(m[2] for m in muestras))
+    for res in resultados:
+        assert res.recv() == esperado
+    duracion = time.perf_counter() - inicio
+    for p in procesos:
+        p.join()
+    if anillo is not None:
+        anillo.liberar()
+    return duracion, mensajes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestras por segundo entre generador y analizadores según el transporte")
+    parser.add_argument("--muestras", type=int, default=200000, help="Muestras enviadas por prueba (default: 200000)")
+    parser.add_argument("--consumidores", type=int, default=CONSUMIDORES,
+                        help=f"Procesos que reciben cada muestra (default: {CONSUMIDORES})")
+    parser.add_argument("--lotes", type=int, nargs="+", default=LOTES,
+                        help="Tamaños de lote a medir (default: 1 64 1024)")
+    args = parser.parse_args()
+
+    muestras = muestras_sinteticas(args.muestras)
+    print(f"{args.muestras} muestras, {args.consumidores} consumidores")
+    print(f"{'transporte':<18}{'muestras/s':>14}{'mensajes/s':>14}")
+    transportes = [None] + args.lotes + [("anillo", n) for n in args.lotes]
+    for tamano_lote in transportes:
+        duracion, mensajes = medir(muestras, tamano_lote, args.consumidores)
+        if tamano_lote is None:
+            nombre = "dict (pickle)"
+        elif isinstance(tamano_lote, tuple):
+            nombre = f"anillo de {tamano_lote[1]}"
+        else:
+            nombre = f"lote de {tamano_lote}"
+        print(f"{nombre:<18}{len(muestras) / duracion:>14,.0f}{mensajes / duracion:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import json
+import hashlib
+import os
+import time
+
+CADENA_FILE = "blockchain.jsonl"
+LEGACY_FILE = "blockchain.json"
+GENESIS_HASH = "0" * 64
+
+# fsync cada tantos bloques o cada tantos segundos (lo que ocurra primero)
+FSYNC_CADA = 64
+FSYNC_INTERVALO = 1.0
+
+
+def calcular_hash(datos, timestamp, prev_hash):
+    """Hash del bloque: datos (con claves ordenadas) + timestamp + hash anterior"""
+    bloque_str = json.dumps(datos, sort_keys=True) + timestamp + prev_hash
+    return hashlib.sha256(bloque_str.encode()).hexdigest()
+
+
+def construir_bloque(datos, timestamp, alerta, prev_hash):
+    """Arma un bloque con la misma estructura que blockchain.json"""
+    return {
+        "timestamp": timestamp,
+        "datos": datos,
+        "alerta": alerta,
+        "prev_hash": prev_hash,
+        "hash": calcular_hash(datos, timestamp, prev_hash)
+    }
+
+
+class RegistroCadena:
+    """
+    Registro de bloques de solo agregado (JSON Lines, un bloque por línea)
+    - Cada bloque se escribe una sola vez al final del archivo: el costo por
+      bloque no depende del largo de la cadena
+    - El fsync se agrupa cada FSYNC_CADA bloques o FSYNC_INTERVALO segundos
+    """
+
+    def __init__(self, ruta=CADENA_FILE, fsync_cada=FSYNC_CADA, fsync_intervalo=FSYNC_INTERVALO):
+        self.ruta = ruta
+        self.fsync_cada = fsync_cada
+        self.fsync_intervalo = fsync_intervalo
+        self.archivo = open(ruta, "ab")
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+
+    def agregar(self, bloque):
+        self.agregar_linea(json.dumps(bloque, separators=(",", ":")))
+
+    def agregar_linea(self, linea):
+        """Agrega un bloque ya serializado (sin salto de línea)"""
+        self.archivo.write((linea + "\n").encode())
+        self.pendientes += 1
+        if (self.pendientes >= self.fsync_cada or
+                time.monotonic() - self.ultimo_fsync >= self.fsync_intervalo):
+            self.sincronizar()
+
+    def sincronizar(self):
+        """Baja a disco los bloques escritos desde el último fsync"""
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+
+    def cerrar(self):
+        if not self.archivo.closed:
+            self.sincronizar()
+            self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def leer_bloques(ruta=CADENA_FILE):
+    """
+    Recorre la cadena bloque por bloque sin cargarla entera en memoria
+    - Una última línea incompleta (corte durante una escritura) se ignora
+    - Cualquier otra línea ilegible es un error de formato
+    """
+    with open(ruta, "rb") as f:
+        for numero, linea in enumerate(f, start=1):
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                if not linea.endswith(b"\n") and not f.read(1):
+                    print(f"Aviso: se ignora el último bloque incompleto de {ruta}")
+                    return
+                raise ValueError(f"Línea {numero} de {ruta} corrupta")
+
+
+def exportar_json(ruta_jsonl=CADENA_FILE, ruta_json=LEGACY_FILE):
+    """Escribe la cadena con el formato de blockchain.json (lista con indent=4)"""
+    total = 0
+    with open(ruta_json, "w") as salida:
+        for bloque in leer_bloques(ruta_jsonl):
+            salida.write("[\n" if total == 0 else ",\n")
+            texto = json.dumps(bloque, indent=4)
+            salida.write("\n".join("    " + linea for linea in texto.split("\n")))
+            total += 1
+        salida.write("\n]" if total else "[]")
+    return total
@@ -0,0 +1,107 @@
+import math
+
+# Cada cuántas actualizaciones se recalculan media y dispersión desde cero
+# para acotar el error acumulado de punto flotante
+RENORMALIZAR_CADA = 10000
+
+
+class VentanaDeslizante:
+    """
+    Media y desviación estándar de las últimas `tamano` muestras en O(1)
+    - Buffer circular de tamaño fijo (no hay pop(0) ni copias)
+    - Actualización de Welford al agregar y al reemplazar la muestra más vieja
+    - Cada RENORMALIZAR_CADA muestras se recalcula todo desde el buffer
+    - La desviación es la poblacional, igual que np.std
+    """
+
+    def __init__(self, tamano, renormalizar_cada=RENORMALIZAR_CADA):
+        if tamano < 1:
+            raise ValueError("El tamaño de la ventana debe ser al menos 1")
+        self.tamano = tamano
+        self.renormalizar_cada = renormalizar_cada
+        self.buffer = [0.0] * tamano
+        self.inicio = 0          # posición de la muestra más vieja
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0            # suma de cuadrados de las desviaciones
+        self.actualizaciones = 0
+
+    def agregar(self, valor):
+        """Agrega una muestra y devuelve (media, desv) de la ventana"""
+        valor = float(valor)
+        if self.n < self.tamano:
+            self.buffer[(self.inicio + self.n) % self.tamano] = valor
+            self.n += 1
+            delta = valor - self.media
+            self.media += delta / self.n
+            self.m2 += delta * (valor - self.media)
+        else:
+            # La muestra nueva ocupa el lugar de la más vieja
+            viejo = self.buffer[self.inicio]
+            self.buffer[self.inicio] = valor
+            self.inicio = (self.inicio + 1) % self.tamano
+            if self.n == 1:
+                self.media, self.m2 = valor, 0.0
+            else:
+                media_anterior = self.media
+                self.media += (valor - viejo) / self.n
+                self.m2 += (valor - viejo) * (valor - self.media + viejo - media_anterior)
+
+        self.actualizaciones += 1
+        if self.renormalizar_cada and self.actualizaciones % self.renormalizar_cada == 0:
+            self.renormalizar()
+        return self.media, self.desv
+
+    def renormalizar(self):
+        """Recalcula media y dispersión exactas a partir del buffer"""
+        valores = self.valores()
+        self.media = math.fsum(valores) / self.n if self.n else 0.0
+        self.m2 = math.fsum((v - self.media) ** 2 for v in valores)
+
+    def valores(self):
+        """Muestras de la ventana, de la más vieja a la más nueva"""
+        return [self.buffer[(self.inicio + i) % self.tamano] for i in range(self.n)]
+
+    @property
+    def desv(self):
+        # m2 puede quedar apenas negativo por redondeo cuando la ventana es constante
+        return math.sqrt(max(self.m2, 0.0) / self.n) if self.n else 0.0
+
+    def __len__(self):
+        return self.n
+
+
+def _verificar_contra_numpy(muestras=200000, tamanos=(1, 2, 30, 1000)):
+    """Compara contra np.mean/np.std sobre una ventana recalculada en cada muestra"""
+    import random
+    import time
+    import numpy as np
+
+    for tamano in tamanos:
+        datos = [random.gauss(120, 25) for _ in range(muestras)]
+        # Tramo constante: caso límite para la dispersión
+        datos[muestras // 2:muestras // 2 + tamano * 2] = [100.0] * (tamano * 2)
+
+        ventana = VentanaDeslizante(tamano)
+        inicio = time.perf_counter()
+        resultados = [ventana.agregar(v) for v in datos]
+        duracion = time.perf_counter() - inicio
+
+        arr = np.array(datos)
+        # La varianza se compara en lugar de la desviación: la raíz amplifica
+        # el redondeo cuando la dispersión es casi cero
+        error_media = error_var = 0.0
+        indices = list(range(0, muestras, max(1, muestras // 5000)))
+        indices += range(muestras // 2, muestras // 2 + tamano * 3)
+        for i in indices:
+            tramo = arr[max(0, i - tamano + 1):i + 1]
+            error_media = max(error_media, abs(resultados[i][0] - float(np.mean(tramo))))
+            error_var = max(error_var, abs(resultados[i][1] ** 2 - float(np.var(tramo))))
+
+        print(f"ventana={tamano:<5} {muestras / duracion:>12,.0f} muestras/s  "
+              f"error máx media={error_media:.2e} varianza={error_var:.2e}")
+        assert error_media < 1e-9 and error_var < 1e-6
+
+
+if __name__ == "__main__":
+    _verificar_contra_numpy()
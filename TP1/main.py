@@ -1,166 +1,292 @@
+import argparse
+import itertools
 import multiprocessing
+import signal
 import time
-import json
 import random
-import hashlib
 import os
+from collections import deque
 from datetime import datetime
-import numpy as np
+from anillo import AnilloMuestras
+from estadisticas import VentanaDeslizante
+from cadena import CADENA_FILE, GENESIS_HASH, RegistroCadena, construir_bloque
+from merkle import construir_bloque_merkle
+from transporte import RESULTADO_DTYPE, TAMANO_LOTE, LATENCIA_MAX, EmisorLotes, decodificar
+from verificar_cadena import CHECKPOINT_SUFIJO
 
-BLOCKCHAIN_FILE = "blockchain.json"
 TOTAL_MUESTRAS = 60
 VENTANA = 30
+# Frecuencia de muestreo por defecto y rango admitido (Hz)
+FRECUENCIA = 1.0
+FRECUENCIA_MIN = 1.0
+FRECUENCIA_MAX = 10000.0
+# Una muestra que sale más tarde que esto (o que un período) cuenta como atrasada
+TOLERANCIA_ATRASO = 0.01
+TIPOS = ["frecuencia", "presion", "oxigeno"]
+# Campo del registro de muestra que analiza cada proceso (la presión usa la sistólica)
+CAMPOS = {"frecuencia": "frecuencia", "presion": "sistolica", "oxigeno": "oxigeno"}
 
 # Generador de datos biométricos
-def generar_datos():
+def generar_datos(timespec='seconds'):
     """Genera datos biométricos aleatorios para simular sensores médicos"""
     return {
-        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "timestamp": datetime.now().isoformat(timespec=timespec),
         "frecuencia": random.randint(60, 220),                     # Frecuencia cardíaca
         "presion": [random.randint(110, 220), random.randint(70, 110)],  # Presión sistólica y diastólica
         "oxigeno": random.randint(85, 105)                         # Saturación de oxígeno
     }
 
+# Detección de alertas médicas (acepta números o arrays de NumPy)
+def detectar_alerta(media_frec, media_pres, media_oxi):
+    return (
+        (media_frec >= 200) |  # Taquicardia severa
+        (media_oxi < 90) | (media_oxi > 100) |  # Hipoxemia
+        (media_pres >= 200)  # Hipertensión severa
+    )
+
 # Análisis por tipo de señal
-def analizador(tipo, conn, queue):
+def analizador(tipo, anillo, consumidor, queue):
     """
     Analiza una señal biométrica específica usando ventana deslizante
     - tipo: tipo de señal a analizar (frecuencia, presion, oxigeno)
-    - conn: conexión para recibir datos del proceso principal
-    - queue: cola para enviar resultados al verificador
+    - anillo: buffer compartido con las muestras del proceso principal
+    - consumidor: índice del cursor de lectura de este analizador
+    - queue: cola compartida para enviar lotes de resultados al verificador
     """
-    ventana = []  # Ventana deslizante para calcular promedios
+    # Ctrl+C lo atiende el proceso principal, que cierra el anillo
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ventana = VentanaDeslizante(VENTANA)  # Media y desviación en O(1) por muestra
+    campo = CAMPOS[tipo]
+    emisor = EmisorLotes(lambda datos: queue.put((tipo, datos)), RESULTADO_DTYPE, TAMANO_LOTE, LATENCIA_MAX)
     try:
-        for _ in range(TOTAL_MUESTRAS):
-            datos = conn.recv()
-            timestamp = datos["timestamp"]
-
-            if tipo == "frecuencia":
-                valor = datos["frecuencia"]
-            elif tipo == "presion":
-                valor = datos["presion"][0]
-            elif tipo == "oxigeno":
-                valor = datos["oxigeno"]
-            else:
-                continue
-
-            # Mantiene el tamaño de la ventana deslizante
-            ventana.append(valor)
-            if len(ventana) > VENTANA:
-                ventana.pop(0)  # Elimina el valor más antiguo
-
-            media = float(np.mean(ventana))
-            desv = float(np.std(ventana))
+        while True:
+            # Si hay resultados pendientes, la espera no supera su latencia máxima
+            plazo = emisor.plazo()
+            lote = anillo.leer(consumidor, None if plazo is None else max(0.0, plazo - time.monotonic()))
+            if lote is None:
+                break  # Fin de las muestras
 
-            resultado = {
-                "tipo": tipo,
-                "timestamp": timestamp,
-                "media": media,
-                "desv": desv
-            }
+            # La ventana descarta sola el valor más antiguo
+            for seq, timestamp, valor in zip(lote["seq"].tolist(), lote["timestamp"].tolist(),
+                                             lote[campo].tolist()):
+                media, desv = ventana.agregar(valor)
+                emisor.agregar((seq, timestamp, media, desv))
+            anillo.confirmar(consumidor, len(lote))
 
-            queue.put(resultado)
+            if emisor.vencido():
+                emisor.vaciar()
     finally:
-        conn.close()  # Cierra la conexión al terminar
+        emisor.vaciar()
+        queue.put((tipo, None))  # Avisa al verificador que no hay más resultados
 
 # Verificación y construcción de bloques
-def verificador(queue_frec, queue_pres, queue_oxi):
+def verificador(queue, mostrar_cada=1, merkle=0):
     """
     Recolecta resultados de análisis y construye bloques del blockchain
-    - Espera resultados de los 3 procesos analizadores
+    - Espera (bloqueado, sin consumir CPU) lotes de resultados de los 3
+      analizadores en una única cola compartida
+    - Cada analizador entrega sus resultados en orden: se encadena cada muestra
+      en cuanto llegaron los tres, aunque los analizadores avancen a distinta
+      velocidad o con lotes de distinto tamaño
     - Detecta alertas médicas basadas en umbrales
-    - Construye y almacena bloques en el blockchain
+    - Construye y agrega los bloques al registro de la cadena: uno por muestra
+      o, con merkle=K, uno cada K muestras con la raíz de Merkle de todas
+    - Muestra uno de cada mostrar_cada bloques por consola
     """
-    blockchain = []
-    prev_hash = "0" * 64
-
-    if os.path.exists(BLOCKCHAIN_FILE):
-        os.remove(BLOCKCHAIN_FILE)
-
-    for i in range(TOTAL_MUESTRAS):
-        resultados = {}
-        while len(resultados) < 3:
-            for q in [queue_frec, queue_pres, queue_oxi]:
-                if not q.empty():
-                    r = q.get()
-                    resultados[r["tipo"]] = r
-
-        timestamp = resultados["frecuencia"]["timestamp"]
-        
-        # Detección de alertas
-        alerta = (
-            resultados["frecuencia"]["media"] >= 200 or  # Taquicardia severa
-            not (90 <= resultados["oxigeno"]["media"] <= 100) or  # Hipoxemia
-            resultados["presion"]["media"] >= 200  # Hipertensión severa
-        )
-
-        # Estructura de datos para el bloque
-        datos = {
-            "frecuencia": resultados["frecuencia"],
-            "presion": resultados["presion"],
-            "oxigeno": resultados["oxigeno"]
-        }
-
-        # Creación del hash del bloque (datos + timestamp + hash anterior)
-        bloque_str = json.dumps(datos, sort_keys=True) + timestamp + prev_hash
-        bloque_hash = hashlib.sha256(bloque_str.encode()).hexdigest()
-
-        # Estructura completa del bloque
-        bloque = {
-            "timestamp": timestamp,
-            "datos": datos,
-            "alerta": alerta,
-            "prev_hash": prev_hash,
-            "hash": bloque_hash
-        }
-
-        blockchain.append(bloque)
-        prev_hash = bloque_hash
-
-        with open(BLOCKCHAIN_FILE, "w") as f:
-            json.dump(blockchain, f, indent=4)
-
-        print(f"[{i+1}] Hash: {bloque_hash[:10]}... Alerta: {alerta}")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    prev_hash = GENESIS_HASH
+
+    # El checkpoint describe la cadena anterior: se borra junto con ella
+    for ruta in (CADENA_FILE, CADENA_FILE + CHECKPOINT_SUFIJO):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    registro = RegistroCadena(CADENA_FILE)
+
+    pendientes = {tipo: deque() for tipo in TIPOS}  # (seq, timestamp, media, desv) sin encadenar
+    grupo = []  # Muestras del próximo bloque de Merkle
+    bloques = 0
+    activos = len(TIPOS)
+
+    while activos:
+        tipo, datos = queue.get()
+        if datos is None:
+            activos -= 1
+            continue
+        lote = decodificar(datos, RESULTADO_DTYPE)
+        pendientes[tipo].extend(zip(lote["seq"].tolist(), lote["timestamp"].tolist(),
+                                    lote["media"].tolist(), lote["desv"].tolist()))
+
+        # Encadena todas las muestras que ya tienen los tres resultados
+        while all(pendientes.values()):
+            filas = {t: pendientes[t].popleft() for t in TIPOS}
+            seq = filas["frecuencia"][0]
+            if any(fila[0] != seq for fila in filas.values()):
+                raise RuntimeError(f"Resultados desalineados en la muestra {seq}")
+            resultados = {
+                t: {"tipo": t, "timestamp": ts.decode(), "media": media, "desv": desv}
+                for t, (_, ts, media, desv) in filas.items()
+            }
+            muestra = registro_muestra(resultados)
+            if not merkle:
+                prev_hash = agregar_bloque(registro, muestra, prev_hash, seq, seq % mostrar_cada == 0)
+                continue
+            grupo.append(muestra)
+            if len(grupo) == merkle:
+                prev_hash = agregar_bloque_merkle(registro, grupo, prev_hash, seq, bloques % mostrar_cada == 0)
+                grupo = []
+                bloques += 1
+
+    # El último bloque de Merkle puede tener menos de K muestras
+    if grupo:
+        agregar_bloque_merkle(registro, grupo, prev_hash, seq, True)
+
+    incompletas = max(len(p) for p in pendientes.values())
+    if incompletas:
+        print(f"Aviso: {incompletas} muestras incompletas descartadas")
+    registro.cerrar()
+
+def registro_muestra(resultados):
+    """Timestamp, datos y alerta de una muestra a partir de los tres resultados"""
+    timestamp = resultados["frecuencia"]["timestamp"]
+
+    # Detección de alertas
+    alerta = bool(detectar_alerta(
+        resultados["frecuencia"]["media"],
+        resultados["presion"]["media"],
+        resultados["oxigeno"]["media"]
+    ))
+
+    # Estructura de datos para el bloque
+    datos = {
+        "frecuencia": resultados["frecuencia"],
+        "presion": resultados["presion"],
+        "oxigeno": resultados["oxigeno"]
+    }
+    return {"timestamp": timestamp, "datos": datos, "alerta": alerta}
+
+def agregar_bloque(registro, muestra, prev_hash, seq, mostrar=True):
+    """Construye el bloque de una muestra, lo agrega al registro y devuelve su hash"""
+    # Bloque con su hash (datos + timestamp + hash anterior)
+    bloque = construir_bloque(muestra["datos"], muestra["timestamp"], muestra["alerta"], prev_hash)
+
+    # Solo se agrega la línea del bloque nuevo, sin reescribir la cadena
+    registro.agregar(bloque)
+
+    if mostrar:
+        print(f"[{seq+1}] Hash: {bloque['hash'][:10]}... Alerta: {bloque['alerta']}")
+    return bloque["hash"]
+
+def agregar_bloque_merkle(registro, muestras, prev_hash, seq, mostrar=True):
+    """Un bloque para varias muestras (seq es la última); devuelve su hash"""
+    bloque = construir_bloque_merkle(muestras, prev_hash)
+    registro.agregar(bloque)
+
+    if mostrar:
+        print(f"[{seq+2-len(muestras)}-{seq+1}] Raíz: {bloque['datos']['merkle_raiz'][:10]}... "
+              f"Hash: {bloque['hash'][:10]}... Alerta: {bloque['alerta']}")
+    return bloque["hash"]
+
+# Generación de muestras a frecuencia fija
+def generar(anillo, frecuencia, total=None):
+    """
+    Escribe muestras en el anillo a `frecuencia` Hz hasta `total` (None: sin fin)
+    - Cada muestra tiene un plazo absoluto (inicio + n / frecuencia) sobre
+      time.monotonic: el tiempo de trabajo y el exceso de sleep no se acumulan
+    - Si el generador se atrasa, las muestras siguientes salen sin esperar hasta
+      recuperar el ritmo; las que salen tarde se cuentan e informan
+    - Ctrl+C termina la generación sin perder las muestras ya escritas
+    Devuelve (muestras, segundos, atrasadas, atraso máximo en segundos)
+    """
+    periodo = 1 / frecuencia
+    tolerancia = min(periodo, TOLERANCIA_ATRASO)
+    # Con más de una muestra por segundo, el timestamp necesita decimales
+    timespec = 'seconds' if frecuencia <= 1 else 'milliseconds' if frecuencia <= 1000 else 'microseconds'
+    atrasadas = atrasadas_informadas = 0
+    atraso_max = atraso_max_informado = 0.0
+    inicio = ultimo_aviso = time.monotonic()
+    enviadas = 0
+
+    try:
+        for seq in itertools.count() if total is None else range(total):
+            plazo = inicio + seq * periodo
+            ahora = time.monotonic()
+            if plazo > ahora:
+                time.sleep(plazo - ahora)
+            elif ahora - plazo > tolerancia:
+                atrasadas += 1
+                atraso_max = max(atraso_max, ahora - plazo)
+                atraso_max_informado = max(atraso_max_informado, ahora - plazo)
+                # Aviso como máximo una vez por segundo, sin frenar al generador
+                if ahora - ultimo_aviso >= 1:
+                    print(f"Aviso: {atrasadas - atrasadas_informadas} muestras atrasadas "
+                          f"(máx {atraso_max_informado * 1000:.1f} ms)")
+                    atrasadas_informadas, atraso_max_informado, ultimo_aviso = atrasadas, 0.0, ahora
+
+            datos = generar_datos(timespec)
+            # Cada muestra se escribe una sola vez y la leen los tres analizadores
+            anillo.agregar((seq, datos["timestamp"], datos["frecuencia"], *datos["presion"], datos["oxigeno"]))
+            enviadas += 1
+    except KeyboardInterrupt:
+        print("Interrumpido: se procesan las muestras pendientes")
+    return enviadas, time.monotonic() - inicio, atrasadas, atraso_max
+
+def frecuencia_valida(valor):
+    frecuencia = float(valor)
+    if not FRECUENCIA_MIN <= frecuencia <= FRECUENCIA_MAX:
+        raise argparse.ArgumentTypeError(f"debe estar entre {FRECUENCIA_MIN:g} y {FRECUENCIA_MAX:g} Hz")
+    return frecuencia
+
+def merkle_valido(valor):
+    # 0 desactiva los bloques de Merkle (un bloque por muestra)
+    muestras = int(valor)
+    if muestras < 0:
+        raise argparse.ArgumentTypeError("debe ser un entero positivo, o 0 para un bloque por muestra")
+    return muestras
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Análisis biométrico concurrente con cadena de bloques")
+    parser.add_argument("--hz", type=frecuencia_valida, default=FRECUENCIA,
+                        help=f"Muestras por segundo, de {FRECUENCIA_MIN:g} a {FRECUENCIA_MAX:g} (default: {FRECUENCIA:g})")
+    parser.add_argument("--muestras", type=int, default=TOTAL_MUESTRAS,
+                        help=f"Cantidad de muestras; 0 genera sin fin hasta Ctrl+C (default: {TOTAL_MUESTRAS})")
+    parser.add_argument("--merkle", type=merkle_valido, default=0, metavar="K",
+                        help="Agrupa K muestras por bloque con un árbol de Merkle; 0 es un bloque por muestra (default: 0)")
+    return parser.parse_args()
 
 # Función principal
 def main():
-    parent_conns = []
-    child_conns = []
-    queues = []
-
-    # Crea pipes y colas para 3 procesos analizadores
-    for _ in range(3):
-        parent_conn, child_conn = multiprocessing.Pipe()
-        queue = multiprocessing.Queue()
-        parent_conns.append(parent_conn)
-        child_conns.append(child_conn)
-        queues.append(queue)
+    args = parse_args()
+    # Anillo en memoria compartida con un cursor por analizador y una cola de
+    # resultados compartida
+    anillo = AnilloMuestras(len(TIPOS))
+    queue = multiprocessing.Queue()
 
     # Inicia procesos analizadores para cada tipo de señal
     procesos = []
-    for tipo, conn, queue in zip(["frecuencia", "presion", "oxigeno"], child_conns, queues):
-        p = multiprocessing.Process(target=analizador, args=(tipo, conn, queue))
+    for consumidor, tipo in enumerate(TIPOS):
+        p = multiprocessing.Process(target=analizador, args=(tipo, anillo, consumidor, queue))
         procesos.append(p)
         p.start()
 
     # Inicia proceso verificador que construye el blockchain
-    p_verificador = multiprocessing.Process(target=verificador, args=tuple(queues))
+    # A más de 10 bloques por segundo se muestra aproximadamente uno por segundo
+    bloques_por_segundo = args.hz / max(1, args.merkle)
+    mostrar_cada = max(1, round(bloques_por_segundo)) if bloques_por_segundo > 10 else 1
+    p_verificador = multiprocessing.Process(target=verificador, args=(queue, mostrar_cada, args.merkle))
     p_verificador.start()
 
     try:
-        for _ in range(TOTAL_MUESTRAS):
-            datos = generar_datos()
-            for conn in parent_conns:
-                conn.send(datos)
-            time.sleep(1)
+        muestras, duracion, atrasadas, atraso_max = generar(anillo, args.hz, args.muestras or None)
     finally:
-        for conn in parent_conns:
-            conn.close()
+        anillo.cerrar()
 
     for p in procesos:
         p.join()
 
     p_verificador.join()
+    anillo.liberar()
+    print(f"{muestras} muestras en {duracion:.1f}s ({muestras / max(duracion, 1e-9):.1f} Hz reales), "
+          f"{atrasadas} atrasadas (máx {atraso_max * 1000:.1f} ms)")
     print("Análisis finalizado.")
 
 if __name__ == "__main__":
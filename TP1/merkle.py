@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from cadena import CADENA_FILE, calcular_hash, leer_bloques
+
+# Prefijos distintos para hojas y nodos internos: una hoja no puede hacerse
+# pasar por un nodo (mismo esquema que RFC 6962)
+PREFIJO_HOJA = b"\x00"
+PREFIJO_NODO = b"\x01"
+
+PRUEBA_FILE = "prueba.json"
+
+
+def hash_hoja(registro):
+    """Hash de una muestra (timestamp, datos y alerta), con claves ordenadas"""
+    return hashlib.sha256(PREFIJO_HOJA + json.dumps(registro, sort_keys=True).encode()).digest()
+
+
+def _nodo(izquierda, derecha):
+    return hashlib.sha256(PREFIJO_NODO + izquierda + derecha).digest()
+
+
+def _nivel_superior(nivel):
+    # Un nodo sin pareja sube tal cual (no se duplica)
+    return [_nodo(nivel[i], nivel[i + 1]) if i + 1 < len(nivel) else nivel[i]
+            for i in range(0, len(nivel), 2)]
+
+
+def raiz_merkle(hojas):
+    """Raíz (bytes) del árbol sobre los hashes de las hojas, en orden"""
+    if not hojas:
+        raise ValueError("Un árbol de Merkle necesita al menos una hoja")
+    nivel = hojas
+    while len(nivel) > 1:
+        nivel = _nivel_superior(nivel)
+    return nivel[0]
+
+
+def prueba_inclusion(hojas, indice):
+    """Hermanos desde la hoja hasta la raíz: lista de (lado, hash hex)"""
+    ruta = []
+    nivel = hojas
+    while len(nivel) > 1:
+        hermano = indice ^ 1
+        if hermano < len(nivel):
+            ruta.append(("izq" if hermano < indice else "der", nivel[hermano].hex()))
+        nivel = _nivel_superior(nivel)
+        indice //= 2
+    return ruta
+
+
+def raiz_desde_prueba(hoja, ruta):
+    actual = hoja
+    for lado, hermano in ruta:
+        hermano = bytes.fromhex(hermano)
+        actual = _nodo(hermano, actual) if lado == "izq" else _nodo(actual, hermano)
+    return actual
+
+
+def construir_bloque_merkle(registros, prev_hash):
+    """
+    Un bloque para varias muestras
+    - datos solo contiene la raíz de Merkle y la cantidad de muestras: el hash
+      del bloque las compromete a todas a través de la raíz
+    - registros guarda las muestras completas, en orden
+    - alerta indica si alguna muestra del bloque tiene alerta
+    """
+    datos = {
+        "merkle_raiz": raiz_merkle([hash_hoja(r) for r in registros]).hex(),
+        "muestras": len(registros)
+    }
+    timestamp = registros[0]["timestamp"]
+    return {
+        "timestamp": timestamp,
+        "datos": datos,
+        "registros": registros,
+        "alerta": any(r["alerta"] for r in registros),
+        "prev_hash": prev_hash,
+        "hash": calcular_hash(datos, timestamp, prev_hash)
+    }
+
+
+def es_bloque_merkle(bloque):
+    return "merkle_raiz" in bloque["datos"]
+
+
+def verificar_bloque_merkle(bloque):
+    """Comprueba que los registros guardados coincidan con la raíz del bloque"""
+    registros = bloque.get("registros") or []
+    datos = bloque["datos"]
+    return (bool(registros) and len(registros) == datos["muestras"] and
+            raiz_merkle([hash_hoja(r) for r in registros]).hex() == datos["merkle_raiz"])
+
+
+def generar_prueba(muestra, ruta=CADENA_FILE):
+    """
+    Prueba de inclusión de la muestra número `muestra` (desde 0) de la cadena
+    - Incluye la muestra, el camino hasta la raíz y los campos del bloque que
+      hacen falta para recalcular su hash
+    """
+    vistas = 0
+    for numero, bloque in enumerate(leer_bloques(ruta)):
+        if not es_bloque_merkle(bloque):
+            raise ValueError(f"El bloque {numero} no es un bloque de Merkle")
+        cantidad = bloque["datos"]["muestras"]
+        if muestra < vistas + cantidad:
+            indice = muestra - vistas
+            hojas = [hash_hoja(r) for r in bloque["registros"]]
+            return {
+                "muestra": muestra,
+                "registro": bloque["registros"][indice],
+                "indice": indice,
+                "ruta": prueba_inclusion(hojas, indice),
+                "bloque": {
+                    "numero": numero,
+                    "timestamp": bloque["timestamp"],
+                    "datos": bloque["datos"],
+                    "prev_hash": bloque["prev_hash"],
+                    "hash": bloque["hash"]
+                }
+            }
+        vistas += cantidad
+    raise ValueError(f"La cadena tiene {vistas} muestras")
+
+
+def verificar_prueba(prueba):
+    """
+    La muestra pertenece al bloque si la raíz recalculada coincide con la del
+    bloque y el hash del bloque coincide con sus datos
+    """
+    bloque = prueba["bloque"]
+    raiz = raiz_desde_prueba(hash_hoja(prueba["registro"]), prueba["ruta"])
+    return (raiz.hex() == bloque["datos"]["merkle_raiz"] and
+            calcular_hash(bloque["datos"], bloque["timestamp"], bloque["prev_hash"]) == bloque["hash"])
+
+
+def hash_en_cadena(numero, ruta=CADENA_FILE):
+    """Hash guardado del bloque `numero` de la cadena, o None si no existe"""
+    bloque = next(itertools.islice(leer_bloques(ruta), numero, None), None)
+    return bloque and bloque["hash"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de inclusión de muestras en bloques de Merkle")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    generar = sub.add_parser("prueba", help="Genera la prueba de inclusión de una muestra")
+    generar.add_argument("muestra", type=int, help="Número de muestra (desde 0)")
+    generar.add_argument("--salida", default=PRUEBA_FILE, help=f"Archivo de la prueba (default: {PRUEBA_FILE})")
+    verificar = sub.add_parser("verificar", help="Verifica una prueba de inclusión")
+    verificar.add_argument("archivo", nargs="?", default=PRUEBA_FILE)
+    args = parser.parse_args()
+
+    if args.comando == "prueba":
+        prueba = generar_prueba(args.muestra)
+        with open(args.salida, "w") as f:
+            json.dump(prueba, f, indent=4)
+        print(f"Muestra {args.muestra}: bloque {prueba['bloque']['numero']}, posición {prueba['indice']}, "
+              f"{len(prueba['ruta'])} hashes en la prueba ({args.salida})")
+    else:
+        with open(args.archivo) as f:
+            prueba = json.load(f)
+        bloque = prueba["bloque"]
+        if not verificar_prueba(prueba):
+            print("Prueba inválida")
+            return
+        print(f"Prueba válida: la muestra {prueba['muestra']} está en el bloque "
+              f"{bloque['numero']} ({bloque['hash'][:10]}...)")
+        # La cadena local, si existe, debe tener ese mismo bloque
+        if os.path.exists(CADENA_FILE):
+            if hash_en_cadena(bloque["numero"]) == bloque["hash"]:
+                print(f"El bloque {bloque['numero']} de {CADENA_FILE} tiene ese hash")
+            else:
+                print(f"Aviso: el bloque {bloque['numero']} de {CADENA_FILE} no tiene ese hash")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import time
+import numpy as np
+
+# Registro de ancho fijo de una muestra: los lotes viajan como bytes, sin pickle
+MUESTRA_DTYPE = np.dtype([
+    ("seq", "<i8"),
+    ("timestamp", "S26"),           # isoformat, hasta microsegundos
+    ("frecuencia", "<i4"),
+    ("sistolica", "<i4"),
+    ("diastolica", "<i4"),
+    ("oxigeno", "<i4"),
+])
+
+# Resultado de un analizador para una muestra
+RESULTADO_DTYPE = np.dtype([
+    ("seq", "<i8"),
+    ("timestamp", "S26"),
+    ("media", "<f8"),
+    ("desv", "<f8"),
+])
+
+# Muestras por mensaje y espera máxima de una muestra antes de enviarse
+TAMANO_LOTE = 64
+LATENCIA_MAX = 0.05
+
+
+class EmisorLotes:
+    """
+    Agrupa registros de ancho fijo en un array de NumPy y los envía como un
+    único mensaje de bytes
+    - El lote se envía cuando se llena o cuando el registro más viejo esperó
+      latencia_max segundos
+    - enviar: función que recibe los bytes del lote (p. ej. conn.send_bytes)
+    """
+
+    def __init__(self, enviar, dtype=MUESTRA_DTYPE, tamano_lote=TAMANO_LOTE, latencia_max=LATENCIA_MAX):
+        if tamano_lote < 1:
+            raise ValueError("El tamaño del lote debe ser al menos 1")
+        self.enviar = enviar
+        self.tamano_lote = tamano_lote
+        self.latencia_max = latencia_max
+        self.lote = np.zeros(tamano_lote, dtype=dtype)
+        self.n = 0
+        self.primero = None     # instante (monotonic) del registro pendiente más viejo
+        self.lotes_enviados = 0
+
+    def agregar(self, registro):
+        """Agrega un registro (tupla con los campos en el orden del dtype)"""
+        if self.n == 0:
+            self.primero = time.monotonic()
+        self.lote[self.n] = registro
+        self.n += 1
+        if self.n == self.tamano_lote or self.vencido():
+            self.vaciar()
+
+    def plazo(self):
+        """Instante (monotonic) en que vence el lote pendiente, o None si está vacío"""
+        return None if self.n == 0 else self.primero + self.latencia_max
+
+    def vencido(self):
+        return self.n > 0 and time.monotonic() >= self.primero + self.latencia_max
+
+    def vaciar(self):
+        """Envía los registros pendientes, aunque el lote no esté lleno"""
+        if self.n:
+            self.enviar(self.lote[:self.n].tobytes())
+            self.n = 0
+            self.primero = None
+            self.lotes_enviados += 1
+
+
+def decodificar(datos, dtype=MUESTRA_DTYPE):
+    """Array de registros sobre los bytes de un lote (sin copiarlos)"""
+    return np.frombuffer(datos, dtype=dtype)
+
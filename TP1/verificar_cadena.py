@@ -1,57 +1,224 @@
+import argparse
 import json
-import hashlib
+import multiprocessing
+import os
+from cadena import CADENA_FILE, LEGACY_FILE, GENESIS_HASH, calcular_hash, exportar_json
+from merkle import es_bloque_merkle, verificar_bloque_merkle
 
-BLOCKCHAIN_FILE = "blockchain.json"
 REPORTE_FILE = "reporte.txt"
+# Bytes de la cadena que verifica cada tarea del pool
+TRAMO_BYTES = 16 << 20
+# Prefijo ya verificado de la cadena, junto al archivo (blockchain.jsonl.checkpoint)
+CHECKPOINT_SUFIJO = ".checkpoint"
 
-def cargar_blockchain():
+def cargar_legacy():
+    # Formato anterior: una lista JSON con toda la cadena
     try:
-        with open(BLOCKCHAIN_FILE, "r") as f:
+        with open(LEGACY_FILE, "r") as f:
             return json.load(f)
     except FileNotFoundError:
-        print("Error: El archivo blockchain.json no existe.")
+        print(f"Error: No existe {CADENA_FILE} ni {LEGACY_FILE}.")
         return []
     except json.JSONDecodeError:
         print("Error: El archivo blockchain.json está corrupto.")
         return []
 
+def hash_valido(bloque):
+    """Hash del bloque según su prev_hash y, en bloques de Merkle, raíz de sus muestras"""
+    esperado = calcular_hash(bloque["datos"], bloque["timestamp"], bloque["prev_hash"])
+    if bloque["hash"] != esperado:
+        return False
+    return not es_bloque_merkle(bloque) or verificar_bloque_merkle(bloque)
+
 def verificar_integridad(bloques):
     corruptos = []
-    prev_hash = "0" * 64
+    prev_hash = GENESIS_HASH
 
     for i, bloque in enumerate(bloques):
-        datos = bloque["datos"]
-        timestamp = bloque["timestamp"]
-        esperado = hashlib.sha256((json.dumps(datos, sort_keys=True) + timestamp + prev_hash).encode()).hexdigest()
-        
-        if bloque["hash"] != esperado or bloque["prev_hash"] != prev_hash:
+        if not hash_valido(bloque) or bloque["prev_hash"] != prev_hash:
             corruptos.append(i)
 
         prev_hash = bloque["hash"]
     
     return corruptos
 
-def generar_reporte(bloques, corruptos):
-    total = len(bloques)
-    alertas = sum(1 for b in bloques if b.get("alerta", False))
+def nuevo_resumen():
+    return {"total": 0, "alertas": 0, "muestras": 0, "suma_frec": 0, "suma_pres": 0, "suma_oxi": 0}
+
+def acumular(resumen, bloque):
+    """Suma un bloque a los totales del reporte (los promedios son por muestra)"""
+    resumen["total"] += 1
+    resumen["alertas"] += 1 if bloque.get("alerta", False) else 0
+    for muestra in bloque["registros"] if es_bloque_merkle(bloque) else [bloque]:
+        resumen["muestras"] += 1
+        resumen["suma_frec"] += muestra["datos"]["frecuencia"]["media"]
+        resumen["suma_pres"] += muestra["datos"]["presion"]["media"]
+        resumen["suma_oxi"] += muestra["datos"]["oxigeno"]["media"]
+
+def _verificar_tramo(tarea):
+    """
+    Verifica los bloques cuya línea empieza en [inicio, fin) del archivo
+    - El hash de cada bloque depende solo de sus datos y del prev_hash que
+      guarda, así que cada tramo se verifica por separado
+    - El enlace con el tramo anterior lo comprueba el proceso principal con
+      el primer prev_hash y el último hash que se devuelven
+    """
+    ruta, inicio, fin = tarea
+    resultado = {"bloques": 0, "corruptos": [], "primer_prev": None, "ultimo_hash": None,
+                 "truncado": False, "resumen": nuevo_resumen()}
+    with open(ruta, "rb") as f:
+        if inicio:
+            # La línea que cruza el borde pertenece al tramo anterior
+            f.seek(inicio - 1)
+            f.readline()
+        resultado["fin"] = f.tell()  # Byte siguiente a la última línea completa
+        resultado["ultima_linea"] = None  # Byte donde empieza esa línea
+        prev_hash = None
+        while f.tell() < fin:
+            comienzo = f.tell()
+            linea = f.readline()
+            if not linea:
+                break
+            i = resultado["bloques"]
+            try:
+                bloque = json.loads(linea)
+            except json.JSONDecodeError:
+                if not linea.endswith(b"\n") and not f.read(1):
+                    resultado["truncado"] = True  # Corte durante una escritura
+                    break
+                # Línea ilegible: bloque corrupto que además corta el enlace
+                resultado["bloques"] += 1
+                resultado["corruptos"].append(i)
+                resultado["fin"] = f.tell()
+                resultado["ultima_linea"] = comienzo
+                prev_hash = None
+                continue
+
+            resultado["bloques"] += 1
+            if i == 0:
+                resultado["primer_prev"] = bloque["prev_hash"]
+            if not hash_valido(bloque) or (i > 0 and bloque["prev_hash"] != prev_hash):
+                resultado["corruptos"].append(i)
+            prev_hash = bloque["hash"]
+            acumular(resultado["resumen"], bloque)
+            resultado["fin"] = f.tell()
+            resultado["ultima_linea"] = comienzo
+        resultado["ultimo_hash"] = prev_hash
+    return resultado
+
+def tramos(ruta, tamano=TRAMO_BYTES, desde=0):
+    total = os.path.getsize(ruta)
+    for inicio in range(desde, total, tamano):
+        yield ruta, inicio, min(total, inicio + tamano)
 
-    suma_frec = 0
-    suma_pres = 0
-    suma_oxi = 0
+def checkpoint_inicial():
+    """Punto de partida sin nada verificado: el génesis"""
+    return {"bloques": 0, "hash": GENESIS_HASH, "offset": 0, "ultima_linea": 0, "resumen": nuevo_resumen()}
 
-    for b in bloques:
-        suma_frec += b["datos"]["frecuencia"]["media"]
-        suma_pres += b["datos"]["presion"]["media"]
-        suma_oxi += b["datos"]["oxigeno"]["media"]
+def leer_checkpoint(ruta=CADENA_FILE):
+    """
+    Prefijo verificado guardado junto a la cadena, o None si no hay o si ya no
+    corresponde al archivo (se reescribió o se truncó)
+    - Se comprueba que la última línea verificada siga ocupando los bytes
+      [ultima_linea, offset) y tenga el hash guardado; se lee solo esa línea,
+      sin importar su largo (los bloques de Merkle pueden ocupar cientos de KB)
+    """
+    try:
+        with open(ruta + CHECKPOINT_SUFIJO) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if (checkpoint.get("resumen", {}).keys() != nuevo_resumen().keys() or
+            "ultima_linea" not in checkpoint):
+        return None  # Checkpoint de una versión anterior
+    offset = checkpoint["offset"]
+    if offset == 0:
+        return checkpoint
+    if os.path.getsize(ruta) < offset:
+        return None
+    with open(ruta, "rb") as f:
+        f.seek(checkpoint["ultima_linea"])
+        linea = f.read(offset - checkpoint["ultima_linea"])
+    if not linea.endswith(b"\n") or b"\n" in linea[:-1]:
+        return None
+    try:
+        ultimo = json.loads(linea)
+    except json.JSONDecodeError:
+        return None
+    return checkpoint if ultimo.get("hash") == checkpoint["hash"] else None
 
-    promedio_frec = suma_frec / total if total else 0
-    promedio_pres = suma_pres / total if total else 0
-    promedio_oxi = suma_oxi / total if total else 0
+def guardar_checkpoint(checkpoint, ruta=CADENA_FILE):
+    # Se escribe aparte y se reemplaza: un corte nunca deja un checkpoint a medias
+    temporal = ruta + CHECKPOINT_SUFIJO + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporal, ruta + CHECKPOINT_SUFIJO)
+
+def verificar_archivo(ruta=CADENA_FILE, procesos=None, tamano_tramo=TRAMO_BYTES, desde=None):
+    """
+    Verifica una cadena JSON Lines en paralelo y sin cargarla en memoria
+    - Cada tarea del pool recalcula los hashes de un tramo de bytes del archivo
+    - Los tramos se combinan en orden comprobando el enlace entre ellos
+    - Un bloque es corrupto si su hash no coincide o si su prev_hash no es el
+      hash del bloque anterior (el mismo criterio que verificar_integridad)
+    - desde: checkpoint de un prefijo ya verificado; solo se verifica lo que
+      viene después de su offset
+    Devuelve (índices corruptos, resumen para el reporte, checkpoint nuevo)
+    El checkpoint nuevo cubre el prefijo sin corrupciones, hasta el último
+    tramo completo antes del primer bloque corrupto
+    """
+    procesos = procesos or os.cpu_count() or 1
+    inicio = desde or checkpoint_inicial()
+    corruptos = []
+    resumen = dict(inicio["resumen"])
+    desplazamiento = inicio["bloques"]
+    prev_hash = inicio["hash"]
+    checkpoint = {**inicio, "resumen": dict(inicio["resumen"])}
+
+    def combinar(resultados):
+        nonlocal desplazamiento, prev_hash
+        for r in resultados:
+            if r["truncado"]:
+                print(f"Aviso: se ignora el último bloque incompleto de {ruta}")
+            if not r["bloques"]:
+                continue
+            locales = r["corruptos"]
+            # El primer bloque del tramo se enlaza con el último del anterior
+            if r["primer_prev"] != prev_hash and (not locales or locales[0] != 0):
+                locales = [0] + locales
+            corruptos.extend(desplazamiento + i for i in locales)
+            desplazamiento += r["bloques"]
+            prev_hash = r["ultimo_hash"]
+            for clave, valor in r["resumen"].items():
+                resumen[clave] += valor
+            if not corruptos:
+                checkpoint.update(bloques=desplazamiento, hash=prev_hash, offset=r["fin"],
+                                  ultima_linea=r["ultima_linea"], resumen=dict(resumen))
+
+    tareas = tramos(ruta, tamano_tramo, inicio["offset"])
+    if procesos == 1:
+        combinar(map(_verificar_tramo, tareas))
+    else:
+        with multiprocessing.Pool(procesos) as pool:
+            # imap entrega los tramos en orden y de a uno: la memoria no depende del largo de la cadena
+            combinar(pool.imap(_verificar_tramo, tareas))
+    return corruptos, resumen, checkpoint
+
+def generar_reporte(resumen, corruptos):
+    total = resumen["total"]
+    alertas = resumen["alertas"]
+    muestras = resumen["muestras"]
+
+    promedio_frec = resumen["suma_frec"] / muestras if muestras else 0
+    promedio_pres = resumen["suma_pres"] / muestras if muestras else 0
+    promedio_oxi = resumen["suma_oxi"] / muestras if muestras else 0
 
     with open(REPORTE_FILE, "w") as f:
         f.write("REPORTE FINAL\n")
         f.write("====================\n")
         f.write(f"Bloques totales: {total}\n")
+        if muestras != total:
+            f.write(f"Muestras totales: {muestras}\n")
         f.write(f"Bloques con alerta: {alertas}\n")
         f.write(f"Bloques corruptos: {len(corruptos)}\n")
         if corruptos:
@@ -63,18 +230,48 @@ def generar_reporte(bloques, corruptos):
 
     print("Reporte generado en reporte.txt")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Verifica la cadena de bloques y genera el reporte")
+    parser.add_argument("--exportar-json", action="store_true",
+                        help=f"Exporta {CADENA_FILE} al formato de {LEGACY_FILE} y termina")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos que recalculan hashes en paralelo (default: uno por núcleo)")
+    parser.add_argument("--full", action="store_true",
+                        help="Verifica la cadena completa aunque haya un checkpoint")
+    return parser.parse_args()
+
 def main():
-    bloques = cargar_blockchain()
-    if not bloques:
+    args = parse_args()
+    if args.exportar_json:
+        total = exportar_json(CADENA_FILE, LEGACY_FILE)
+        print(f"{total} bloques exportados a {LEGACY_FILE}")
+        return
+
+    if os.path.exists(CADENA_FILE):
+        desde = None if args.full else leer_checkpoint(CADENA_FILE)
+        if desde and desde["bloques"]:
+            print(f"Checkpoint: {desde['bloques']} bloques ya verificados, "
+                  f"se verifica desde el byte {desde['offset']}")
+        elif not args.full and os.path.exists(CADENA_FILE + CHECKPOINT_SUFIJO):
+            print("Aviso: el checkpoint no corresponde a la cadena actual, se verifica completa")
+        corruptos, resumen, checkpoint = verificar_archivo(CADENA_FILE, args.procesos, desde=desde)
+        guardar_checkpoint(checkpoint, CADENA_FILE)
+    else:
+        bloques = cargar_legacy()
+        corruptos = verificar_integridad(bloques)
+        resumen = nuevo_resumen()
+        for bloque in bloques:
+            acumular(resumen, bloque)
+    if not resumen["total"]:
+        print("Error: la cadena está vacía.")
         return
 
-    corruptos = verificar_integridad(bloques)
     if corruptos:
         print(f"Se detectaron bloques corruptos en los índices: {corruptos}")
     else:
         print("Cadena íntegra. No se detectaron corrupciones.")
 
-    generar_reporte(bloques, corruptos)
+    generar_reporte(resumen, corruptos)
 
 if __name__ == "__main__":
     main()
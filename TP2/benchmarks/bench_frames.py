@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TP2_DIR)
+
+from common.protocol import (
+    ProtocolMessage, send_message_sync, send_message_async, receive_message_sync,
+    receive_message_async, decode_header, HEADER_SIZE, PROTOCOL_V1, PROTOCOL_V2, MSG_TYPE_RESPONSE
+)
+
+
+def legacy_receive_sync(sock) -> ProtocolMessage:
+    # Lectura anterior: concatenación de bytes y decode a str antes de json.loads
+    header = b''
+    while len(header) < HEADER_SIZE:
+        header += sock.recv(HEADER_SIZE - len(header))
+    payload_size = decode_header(header)
+    payload = b''
+    while len(payload) < payload_size:
+        chunk = sock.recv(payload_size - len(payload))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el peer")
+        payload += chunk
+    return ProtocolMessage.from_bytes(payload.decode('utf-8'))
+
+
+def measure_sync(receive, data, version: int, iterations: int) -> float:
+    left, right = socket.socketpair()
+    
+    def sender():
+        for _ in range(iterations):
+            send_message_sync(left, MSG_TYPE_RESPONSE, data, version, "json")
+    
+    thread = threading.Thread(target=sender)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(iterations):
+        receive(right)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    left.close()
+    right.close()
+    return elapsed / iterations
+
+
+async def measure_async(data, version: int, iterations: int) -> float:
+    received = asyncio.Event()
+    
+    async def handle(reader, writer):
+        for _ in range(iterations):
+            await receive_message_async(reader)
+        received.set()
+        writer.close()
+    
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    _, writer = await asyncio.open_connection('127.0.0.1', port)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await send_message_async(writer, MSG_TYPE_RESPONSE, data, version, "json")
+    await received.wait()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return elapsed / iterations
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Throughput de recepción de frames grandes')
+    parser.add_argument('--sizes', default='1,4,16', help='Tamaños en MB separados por coma (default: 1,4,16)')
+    parser.add_argument('--iterations', type=int, default=5, help='Frames por medición (default: 5)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    print(f"{'MB':>4} {'método':<22} {'ms/frame':>9} {'MB/s':>8}")
+    for mb in (int(x) for x in args.sizes.split(',')):
+        blob = os.urandom(mb * 1024 * 1024)
+        # v1 con el binario en base64 dentro del JSON, como antes de v2
+        v1_data = {"screenshot": blob}
+        rows = [
+            ("sync v1 (bytes +=)", lambda: measure_sync(legacy_receive_sync, v1_data, PROTOCOL_V1, args.iterations)),
+            ("sync v1 (recv_into)", lambda: measure_sync(receive_message_sync, v1_data, PROTOCOL_V1, args.iterations)),
+            ("sync v2 (recv_into)", lambda: measure_sync(receive_message_sync, v1_data, PROTOCOL_V2, args.iterations)),
+            ("async v1", lambda: asyncio.run(measure_async(v1_data, PROTOCOL_V1, args.iterations))),
+            ("async v2", lambda: asyncio.run(measure_async(v1_data, PROTOCOL_V2, args.iterations))),
+        ]
+        for label, run in rows:
+            elapsed = run()
+            print(f"{mb:>4} {label:<22} {elapsed * 1000:>9.1f} {mb / elapsed:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
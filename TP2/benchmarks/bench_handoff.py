@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import base64
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TP2_DIR)
+
+from PIL import Image
+
+from common.protocol import (
+    send_message_async, receive_message_async, discard_attachments,
+    PROTOCOL_V1, PROTOCOL_V2, MSG_TYPE_RESPONSE
+)
+from processor import processing_server
+from processor.worker_pool import SupervisedWorkerPool
+
+# base64: comportamiento original (string base64 por el pipe y JSON v1)
+MODES = ["base64", "pipe", "file", "shm"]
+
+# PNG que devuelve el worker (se carga en init_bench_worker)
+_png: bytes = b''
+
+
+def make_screenshot_png(path: str):
+    # Captura 1920x1080 sintética: ruido en la parte superior (fotos) y color
+    # plano en el resto, para que el PNG pese lo que una página real (~2.5 MB)
+    rng = random.Random(42)
+    noisy_rows = 420
+    pixels = bytes(rng.getrandbits(8) for _ in range(1920 * noisy_rows * 3))
+    pixels += b'\xf0' * (1920 * (1080 - noisy_rows) * 3)
+    image = Image.frombytes('RGB', (1920, 1080), pixels)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    with open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+def init_bench_worker(png_path: str, spool_dir: str, mode: str):
+    global _png
+    with open(png_path, 'rb') as f:
+        _png = f.read()
+    handoff = mode if mode in processing_server.HANDOFF_MODES else processing_server.HANDOFF_PIPE
+    processing_server.init_worker(spool_dir, handoff)
+
+
+def screenshot_job(mode: str):
+    if mode == "base64":
+        return {"screenshot": base64.b64encode(_png).decode('utf-8'), "success": True}
+    return {"screenshot": processing_server.spool_artifact(_png, '.png'), "success": True}
+
+
+class DiscardSink:
+
+    async def write(self, chunk):
+        pass
+    
+    async def close(self):
+        return None
+    
+    async def abort(self):
+        pass
+
+
+def run_sink_server(port_queue):
+    # Receptor en otro proceso para no sumar su CPU a la del padre medido
+    async def handle(reader, writer):
+        try:
+            while True:
+                await receive_message_async(reader, sink_factory=lambda index: DiscardSink())
+        except asyncio.IncompleteReadError:
+            writer.close()
+    
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+    
+    asyncio.run(main())
+
+
+async def measure(mode: str, png_path: str, spool_dir: str, port: int, jobs: int):
+    pool = SupervisedWorkerPool(1, name=mode, initializer=init_bench_worker,
+                                initargs=(png_path, spool_dir, mode))
+    await pool.start()
+    _, writer = await asyncio.open_connection('127.0.0.1', port)
+    version = PROTOCOL_V1 if mode == "base64" else PROTOCOL_V2
+    try:
+        # Una tarea de calentamiento para que el worker ya esté listo
+        discard_attachments(await pool.submit(screenshot_job, mode))
+        
+        latencies = []
+        cpu_start = time.process_time()
+        for _ in range(jobs):
+            start = time.perf_counter()
+            result = await pool.submit(screenshot_job, mode)
+            try:
+                await send_message_async(writer, MSG_TYPE_RESPONSE, result, version, "json")
+            finally:
+                discard_attachments(result)
+            latencies.append(time.perf_counter() - start)
+        cpu = (time.process_time() - cpu_start) / jobs
+    finally:
+        writer.close()
+        await pool.shutdown()
+    
+    latencies.sort()
+    return cpu, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95) - 1]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='CPU del proceso padre y latencia al devolver screenshots 1080p')
+    parser.add_argument('--jobs', type=int, default=30, help='Screenshots por modo (default: 30)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    spool_dir = tempfile.mkdtemp(prefix='tp2-bench-')
+    png_path = os.path.join(spool_dir, 'screenshot.png')
+    make_screenshot_png(png_path)
+    print(f"Screenshot de prueba: {os.path.getsize(png_path) / 1024 / 1024:.2f} MB")
+    
+    port_queue = mp.Queue()
+    sink = mp.Process(target=run_sink_server, args=(port_queue,), daemon=True)
+    sink.start()
+    port = port_queue.get()
+    
+    print(f"{'modo':<8} {'CPU padre ms':>13} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for mode in MODES:
+            cpu, p50, p95 = asyncio.run(measure(mode, png_path, spool_dir, port, args.jobs))
+            print(f"{mode:<8} {cpu * 1000:>13.2f} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f}")
+    finally:
+        sink.terminate()
+        os.remove(png_path)
+        os.rmdir(spool_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TP2_DIR)
+
+from processor.http_performance import analyze_http_performance
+from processor.performance import analyze_performance
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Páginas por segundo y CPU por página: modo HTTP contra Chrome')
+    parser.add_argument('urls', nargs='+', help='URLs a medir')
+    parser.add_argument('--repeat', type=int, default=10, help='Veces que se analiza cada URL en modo HTTP (default: 10)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Análisis HTTP simultáneos (default: 50)')
+    parser.add_argument('--browser', action='store_true', help='Medir también el modo con Chrome (una vez por URL)')
+    parser.add_argument('--timeout', type=int, default=30, help='Timeout por página en segundos (default: 30)')
+    return parser.parse_args()
+
+
+async def run_http(urls, concurrency, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(url):
+        async with semaphore:
+            return await analyze_http_performance(url, timeout)
+    
+    return await asyncio.gather(*(one(url) for url in urls))
+
+
+def report(name, results, wall, cpu):
+    ok = [r for r in results if r and 'error' not in r]
+    print(f"{name:<8} {len(results):>6} {len(ok):>6} {len(results) / wall:>10.1f} {cpu * 1000 / len(results):>12.1f}")
+
+
+def main():
+    args = parse_arguments()
+    print(f"{'modo':<8} {'páginas':>6} {'ok':>6} {'páginas/s':>10} {'CPU ms/pág':>12}")
+    
+    urls = args.urls * args.repeat
+    wall, cpu = time.perf_counter(), time.process_time()
+    results = asyncio.run(run_http(urls, args.concurrency, args.timeout))
+    report('http', results, time.perf_counter() - wall, time.process_time() - cpu)
+    
+    if args.browser:
+        # process_time no incluye a Chrome: se informa solo el tiempo de pared
+        wall = time.perf_counter()
+        results = [analyze_performance(url, args.timeout) for url in args.urls]
+        elapsed = time.perf_counter() - wall
+        print(f"{'browser':<8} {len(results):>6} {sum(1 for r in results if r):>6} "
+              f"{len(results) / elapsed:>10.1f} {'-':>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TP2_DIR)
+
+from common.protocol import (
+    ProtocolMessage, receive_message_async, available_codecs,
+    PROTOCOL_V1, PROTOCOL_V2, MSG_TYPE_RESPONSE
+)
+
+# Tamaños típicos de un screenshot PNG a 1920x1080 y de los thumbnails JPEG
+PAYLOADS = {
+    "screenshot 1.5MB": {"screenshot": os.urandom(1_500_000), "success": True},
+    "screenshot 4MB": {"screenshot": os.urandom(4_000_000), "success": True},
+    "5 thumbnails": {"thumbnails": [os.urandom(12_000) for _ in range(5)], "count": 5, "success": True},
+}
+
+
+async def roundtrip(message: ProtocolMessage) -> int:
+    # Codificar, pasar por un StreamReader y decodificar como lo haría el receptor
+    parts = message.to_parts()
+    reader = asyncio.StreamReader(limit=2 ** 32)
+    size = 0
+    for part in parts:
+        reader.feed_data(part)
+        size += len(part)
+    reader.feed_eof()
+    await receive_message_async(reader)
+    return size
+
+
+async def measure(data, version: int, codec: str, iterations: int):
+    message = ProtocolMessage(MSG_TYPE_RESPONSE, data, version, codec)
+    size = await roundtrip(message)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await roundtrip(message)
+    elapsed = (time.perf_counter() - start) / iterations
+    return size, elapsed
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compara protocolo v1 (JSON+base64) contra v2 (adjuntos binarios)')
+    parser.add_argument('--iterations', type=int, default=20, help='Repeticiones por medición (default: 20)')
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_arguments()
+    formats = [(PROTOCOL_V1, "json")] + [(PROTOCOL_V2, codec) for codec in available_codecs()]
+    
+    print(f"{'payload':<18} {'formato':<12} {'bytes':>11} {'ms/msg':>8} {'MB/s':>8}")
+    for name, data in PAYLOADS.items():
+        for version, codec in formats:
+            size, elapsed = await measure(data, version, codec, args.iterations)
+            label = f"v{version}/{codec}"
+            print(f"{name:<18} {label:<12} {size:>11} {elapsed * 1000:>8.2f} {size / elapsed / 1e6:>8.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import argparse
+import os
+import sys
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TP2_DIR)
+
+from processor.browser import parse_resource_policy, RESOURCE_POLICIES
+from processor.performance import analyze_performance
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Tiempo de carga y bytes descargados por política de recursos')
+    parser.add_argument('urls', nargs='+', help='URLs a medir (conviene usar sitios con publicidad)')
+    parser.add_argument('--runs', type=int, default=3, help='Cargas por URL y política (default: 3)')
+    parser.add_argument('--timeout', type=int, default=30, help='Timeout de carga en segundos (default: 30)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    print(f"{'url':<40} {'política':<9} {'carga ms':>9} {'requests':>9} {'KB':>8}")
+    for url in args.urls:
+        for name in RESOURCE_POLICIES:
+            policy = parse_resource_policy(name)
+            runs = [analyze_performance(url, args.timeout, policy) for _ in range(args.runs)]
+            runs = [r for r in runs if r and 'error' not in r]
+            if not runs:
+                print(f"{url[:40]:<40} {name:<9} {'error':>9}")
+                continue
+            load = sorted(r['load_time_ms'] for r in runs)[len(runs) // 2]
+            requests = sorted(r['num_requests'] for r in runs)[len(runs) // 2]
+            size = sorted(r['total_size_kb'] for r in runs)[len(runs) // 2]
+            print(f"{url[:40]:<40} {name:<9} {load:>9} {requests:>9} {size:>8}")
+
+
+if __name__ == '__main__':
+    main()
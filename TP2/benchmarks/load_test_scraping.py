@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+TP2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Página de prueba servida localmente: suficiente HTML para que el parseo
+# (BeautifulSoup + metadatos) tenga un costo de CPU realista
+TEST_PAGE = "<html><head><title>Load test</title>{meta}</head><body>{body}</body></html>".format(
+    meta="".join(f'<meta name="k{i}" content="v{i}">' for i in range(50)),
+    body="".join(f'<h2>Sección {i}</h2><p><a href="/link/{i}">link {i}</a><img src="/img/{i}.png"></p>'
+                 for i in range(300))
+)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_target_server(port: int):
+    async def handle(request):
+        return web.Response(text=TEST_PAGE, content_type='text/html')
+    
+    app = web.Application()
+    app.router.add_get('/', handle)
+    web.run_app(app, host='127.0.0.1', port=port, print=None)
+
+
+async def wait_until_ready(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {url}")
+
+
+async def load_client(server_url: str, target_url: str, concurrency: int, duration: float,
+                      poll_interval: float) -> Tuple[int, int]:
+    # Cada conexión tiene una sola tarea en curso: envía /scrape y consulta
+    # /status hasta que la tarea termina. Así se mide el scraping completo
+    # (descarga, parseo y armado del JSON) y no solo la aceptación de la
+    # tarea, y las tareas en background no se acumulan sin límite.
+    completed = failed = 0
+    deadline = time.monotonic() + duration
+    
+    async def run_task(session) -> Optional[str]:
+        async with session.get(f"{server_url}/scrape", params={"url": target_url}) as resp:
+            if resp.status != 200:
+                await resp.read()
+                return None
+            task_id = (await resp.json())["task_id"]
+        while True:
+            async with session.get(f"{server_url}/status/{task_id}") as resp:
+                if resp.status == 200:
+                    status = (await resp.json())["status"]
+                    if status in ("completed", "failed"):
+                        return status
+                else:
+                    await resp.read()
+            await asyncio.sleep(poll_interval)
+    
+    async def worker(session):
+        nonlocal completed, failed
+        while time.monotonic() < deadline:
+            status = await run_task(session)
+            # Solo cuentan las tareas que terminaron dentro de la medición
+            if time.monotonic() > deadline:
+                break
+            if status == "completed":
+                completed += 1
+            else:
+                failed += 1
+    
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return completed, failed
+
+
+def _client_process(server_url, target_url, concurrency, duration, poll_interval, results):
+    results.put(asyncio.run(load_client(server_url, target_url, concurrency, duration, poll_interval)))
+
+
+def measure(server_url: str, target_url: str, client_processes: int, concurrency: int, duration: float,
+            poll_interval: float) -> Tuple[float, int]:
+    # El generador de carga también usa varios procesos para no ser el cuello de botella
+    results = mp.Queue()
+    procs = [
+        mp.Process(target=_client_process,
+                   args=(server_url, target_url, concurrency, duration, poll_interval, results))
+        for _ in range(client_processes)
+    ]
+    for p in procs:
+        p.start()
+    counts = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    completed = sum(c for c, _ in counts)
+    failed = sum(f for _, f in counts)
+    return completed / duration, failed
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Tareas de scraping completadas por segundo con distinta cantidad de procesos del servidor'
+    )
+    parser.add_argument('--workers', default='1,2,4', help='Cantidades de procesos a probar (default: 1,2,4)')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='Segundos por medición (default: 10)')
+    parser.add_argument('-c', '--concurrency', type=int, default=32, help='Conexiones por proceso cliente (default: 32)')
+    parser.add_argument('--poll-interval', type=float, default=0.02,
+                        help='Segundos entre consultas a /status (default: 0.02)')
+    parser.add_argument('--client-processes', type=int, default=max(1, mp.cpu_count() // 2),
+                        help='Procesos generadores de carga (default: CPU/2)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    worker_counts = [int(n) for n in args.workers.split(',')]
+    
+    target_port = free_port()
+    target = mp.Process(target=run_target_server, args=(target_port,), daemon=True)
+    target.start()
+    target_url = f"http://127.0.0.1:{target_port}/"
+    asyncio.run(wait_until_ready(target_url))
+    
+    print(f"{'procesos':>9} {'tareas/s':>10} {'speedup':>8} {'fallidas':>9}")
+    baseline = None
+    
+    for n in worker_counts:
+        port = free_port()
+        # El servidor de procesamiento no está corriendo: la fase de
+        # procesamiento falla enseguida (conexión rechazada) y la tarea se
+        # completa igual, así que se mide el trabajo de Servidor A: descargar
+        # y parsear el HTML, extraer metadatos y guardar el resultado
+        server = subprocess.Popen(
+            [sys.executable, 'server_scraping.py', '-i', '127.0.0.1', '-p', str(port),
+             '-n', str(n), '-pp', str(free_port())],
+            cwd=TP2_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            server_url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_until_ready(f"{server_url}/"))
+            rate, failed = measure(server_url, target_url, args.client_processes, args.concurrency,
+                                   args.duration, args.poll_interval)
+            baseline = baseline or rate
+            print(f"{n:>9} {rate:>10.1f} {rate / baseline:>7.2f}x {failed:>9}")
+        finally:
+            server.terminate()
+            server.wait()
+    
+    target.terminate()
+
+
+if __name__ == "__main__":
+    main()
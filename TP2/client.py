@@ -124,7 +124,7 @@ async def test_scraping(server_url: str, test_url: str):
                     print(f"  - Tamaño total: {perf.get('total_size_kb', 'N/A')} KB")
                     print(f"  - Requests: {perf.get('num_requests', 'N/A')}")
                 
-                print(f"  - Screenshot: {'✓' if proc.get('screenshot') else '✗'}")
+                print(f"  - Screenshot: {'✓' if proc.get('screenshot') or proc.get('screenshot_url') else '✗'}")
                 print(f"  - Thumbnails: {len(proc.get('thumbnails', []))}")
     else:
         print("\nNo se pudo obtener resultado")
@@ -1,41 +1,351 @@
+import asyncio
 import struct
 import json
-from typing import Dict, Any
+import base64
+import os
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+
+import aiofiles
+
+# Codecs opcionales para el protocolo v2
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 
 # Constantes del protocolo
 HEADER_SIZE = 4
 BYTE_ORDER = 'big'
 
+# Protocolo v2: [magic][versión][codec][flags][largo meta][cant. adjuntos]
+# seguido de la metadata codificada y de cada adjunto binario como
+# [4 bytes largo][bytes crudos]. El primer byte de un header v1 es el byte
+# más alto del largo y nunca llega a 0xB2 (~2.9 GB), así que ambos formatos
+# conviven en la misma conexión.
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+V2_MAGIC = 0xB2
+V2_HEADER = struct.Struct('>BBBBII')
+ATTACHMENT_HEADER = struct.Struct('>I')
+ATTACHMENT_KEY = "__attachment__"
+# Envuelve los dicts del usuario que usan alguna de las claves reservadas, para
+# que no se confundan con una referencia a un adjunto
+ESCAPE_KEY = "__escaped__"
+RESERVED_KEYS = (ATTACHMENT_KEY, ESCAPE_KEY)
+
+# Tamaño máximo de un frame (metadata + adjuntos): evita reservar memoria
+# según un largo anunciado arbitrario
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# Un adjunto con este largo se envía por partes: [4 bytes largo][bytes]
+# repetido y un largo 0 al final
+CHUNKED_ATTACHMENT = 0xFFFFFFFF
+STREAM_CHUNK_SIZE = 256 * 1024
+# Por debajo de este tamaño se usa readexactly; por encima se lee por partes
+# sobre un buffer preasignado para no duplicar el frame en el StreamReader
+STREAM_CHUNK_THRESHOLD = 256 * 1024
+
 # Tipos de mensajes
 MSG_TYPE_SCREENSHOT = "screenshot"
 MSG_TYPE_PERFORMANCE = "performance"
 MSG_TYPE_IMAGE_PROCESSING = "image_processing"
+MSG_TYPE_PING = "ping"
+MSG_TYPE_STATS = "stats"
+MSG_TYPE_HELLO = "hello"
 MSG_TYPE_RESPONSE = "response"
 MSG_TYPE_ERROR = "error"
 
-class ProtocolMessage:
+# Formatos de screenshot que acepta MSG_TYPE_SCREENSHOT
+SCREENSHOT_FORMATS = ("png", "jpeg", "webp")
+# Modos de MSG_TYPE_PERFORMANCE: Chrome completo o solo HTTP (sin navegador)
+PERFORMANCE_MODES = ("browser", "http")
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class FrameTooLargeError(ValueError):
+    pass
+
+
+class FileAttachment:
+    # Adjunto que está en disco: se transmite por partes sin cargarlo entero.
+    # Es pickleable, así que un worker puede devolverlo en lugar de los bytes
+    
+    def __init__(self, path: str, delete: bool = True):
+        self.path = path
+        self.delete = delete
+    
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+    
+    def read(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+    
+    def discard(self):
+        if self.delete:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+    
+    def __repr__(self):
+        return f"FileAttachment({self.path!r})"
+
+
+class SharedMemoryAttachment:
+    # Adjunto en un segmento de memoria compartida creado por un worker: por
+    # el pipe solo viaja el nombre y el padre envía directo desde el buffer
+    
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._shm: Optional[shared_memory.SharedMemory] = None
+    
+    @classmethod
+    def create(cls, content: BytesLike) -> 'SharedMemoryAttachment':
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(content)))
+        shm.buf[:len(content)] = content
+        attachment = cls(shm.name, len(content))
+        # El worker deja de mapearlo; el segmento vive hasta que el padre lo libere
+        shm.close()
+        return attachment
+    
+    def view(self) -> memoryview:
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return self._shm.buf[:self.size]
+    
+    def read(self) -> bytes:
+        return bytes(self.view())
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def discard(self):
+        try:
+            if self._shm is None:
+                self._shm = shared_memory.SharedMemory(name=self.name)
+            try:
+                self._shm.close()
+            except BufferError:
+                # El transporte todavía referencia partes del buffer: se
+                # desmapea cuando se liberen, el nombre se borra igual
+                pass
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+    
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size, "_shm": None}
     
-    def __init__(self, msg_type: str, data: Dict[str, Any]):
+    def __repr__(self):
+        return f"SharedMemoryAttachment({self.name!r}, {self.size})"
+
+
+def discard_attachments(obj: Any):
+    # Libera los archivos temporales y segmentos de memoria compartida
+    # referenciados en una respuesta ya enviada
+    if isinstance(obj, (FileAttachment, SharedMemoryAttachment)):
+        obj.discard()
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            discard_attachments(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            discard_attachments(value)
+
+
+class MemorySink:
+    # Destino por defecto de un adjunto por partes: lo junta en memoria
+    
+    def __init__(self):
+        self.buffer = bytearray()
+    
+    async def write(self, chunk: BytesLike):
+        self.buffer += chunk
+    
+    async def close(self) -> bytearray:
+        return self.buffer
+    
+    async def abort(self):
+        self.buffer = bytearray()
+
+
+class FileSink:
+    # Escribe el adjunto en disco a medida que llega; el valor resultante es
+    # un FileAttachment que apunta al archivo
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    async def write(self, chunk: BytesLike):
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, 'wb')
+        await self._file.write(chunk)
+    
+    async def close(self) -> FileAttachment:
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, 'wb')
+        await self._file.close()
+        return FileAttachment(self.path, delete=False)
+    
+    async def abort(self):
+        if self._file is not None:
+            await self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# Recibe el índice del adjunto y devuelve el destino de sus partes
+SinkFactory = Callable[[int], Any]
+
+
+def check_frame_size(size: int, max_size: int = MAX_FRAME_SIZE):
+    if size > max_size:
+        raise FrameTooLargeError(f"Frame de {size} bytes excede el máximo de {max_size}")
+
+
+def _json_default(o):
+    # En v1 los binarios viajan como base64 dentro del JSON
+    if isinstance(o, (bytes, bytearray, memoryview)):
+        return base64.b64encode(o).decode('utf-8')
+    if isinstance(o, (FileAttachment, SharedMemoryAttachment)):
+        return base64.b64encode(o.read()).decode('utf-8')
+    raise TypeError(f"Tipo no serializable: {type(o).__name__}")
+
+
+class Codec:
+
+    def __init__(self, name: str, codec_id: int, encode, decode):
+        self.name = name
+        self.codec_id = codec_id
+        self.encode = encode
+        self.decode = decode
+
+
+CODECS: Dict[str, Codec] = {
+    "json": Codec(
+        "json", 0,
+        lambda obj: json.dumps(obj, default=_json_default).encode('utf-8'),
+        json.loads
+    )
+}
+
+if msgpack is not None:
+    CODECS["msgpack"] = Codec(
+        "msgpack", 1,
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    )
+
+if cbor2 is not None:
+    CODECS["cbor"] = Codec("cbor", 2, cbor2.dumps, cbor2.loads)
+
+CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+
+# Orden de preferencia al negociar
+CODEC_PREFERENCE = ["msgpack", "cbor", "json"]
+
+
+def available_codecs() -> List[str]:
+    return [name for name in CODEC_PREFERENCE if name in CODECS]
+
+
+def _extract_attachments(obj: Any, attachments: List[BytesLike]) -> Any:
+    # Reemplaza cada valor binario por una referencia al adjunto
+    if isinstance(obj, (bytes, bytearray, memoryview, FileAttachment, SharedMemoryAttachment)):
+        attachments.append(obj)
+        return {ATTACHMENT_KEY: len(attachments) - 1}
+    if isinstance(obj, dict):
+        data = {k: _extract_attachments(v, attachments) for k, v in obj.items()}
+        if any(key in obj for key in RESERVED_KEYS):
+            return {ESCAPE_KEY: data}
+        return data
+    if isinstance(obj, (list, tuple)):
+        return [_extract_attachments(v, attachments) for v in obj]
+    return obj
+
+
+def _restore_attachments(obj: Any, attachments: List[BytesLike]) -> Any:
+    if isinstance(obj, dict):
+        if len(obj) == 1 and ATTACHMENT_KEY in obj:
+            return attachments[obj[ATTACHMENT_KEY]]
+        if len(obj) == 1 and ESCAPE_KEY in obj:
+            obj = obj[ESCAPE_KEY]
+        return {k: _restore_attachments(v, attachments) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_restore_attachments(v, attachments) for v in obj]
+    return obj
+
+
+class ProtocolMessage:
+
+    def __init__(self, msg_type: str, data: Dict[str, Any],
+                 version: int = PROTOCOL_V1, codec: str = "json"):
         self.msg_type = msg_type
         self.data = data
+        self.version = version
+        self.codec = codec
+    
+    def to_parts(self) -> List[Union[BytesLike, FileAttachment, SharedMemoryAttachment]]:
+        # Buffers a enviar en orden; los adjuntos no se copian ni se codifican.
+        # FileAttachment y SharedMemoryAttachment quedan en la lista para que
+        # el emisor los envíe por partes
+        if self.version == PROTOCOL_V1:
+            return [self.to_bytes()]
+        
+        codec = CODECS[self.codec]
+        attachments: List[BytesLike] = []
+        meta = codec.encode({
+            "type": self.msg_type,
+            "data": _extract_attachments(self.data, attachments)
+        })
+        parts = [V2_HEADER.pack(V2_MAGIC, PROTOCOL_V2, codec.codec_id, 0, len(meta), len(attachments)), meta]
+        for attachment in attachments:
+            if isinstance(attachment, (FileAttachment, SharedMemoryAttachment)):
+                parts.append(ATTACHMENT_HEADER.pack(CHUNKED_ATTACHMENT))
+            else:
+                parts.append(ATTACHMENT_HEADER.pack(len(attachment)))
+            parts.append(attachment)
+        return parts
     
     def to_bytes(self) -> bytes:
+        if self.version != PROTOCOL_V1:
+            return b''.join(
+                b''.join(_attachment_chunks_sync(part))
+                if isinstance(part, (FileAttachment, SharedMemoryAttachment)) else part
+                for part in self.to_parts()
+            )
+        
         payload = {
             "type": self.msg_type,
             "data": self.data
         }
-        json_bytes = json.dumps(payload).encode('utf-8')
+        json_bytes = json.dumps(payload, default=_json_default).encode('utf-8')
         header = struct.pack('>I', len(json_bytes))  # >I = unsigned int big-endian
         return header + json_bytes
     
     @staticmethod
-    def from_bytes(data: bytes) -> 'ProtocolMessage':
-        payload = json.loads(data.decode('utf-8'))
+    def from_bytes(data: BytesLike) -> 'ProtocolMessage':
+        # json.loads acepta bytes/bytearray directamente (detecta UTF-8)
+        payload = json.loads(data)
         return ProtocolMessage(payload["type"], payload["data"])
 
 
-def encode_message(msg_type: str, data: Dict[str, Any]) -> bytes:
-    message = ProtocolMessage(msg_type, data)
+def encode_message(msg_type: str, data: Dict[str, Any],
+                   version: int = PROTOCOL_V1, codec: str = "json") -> bytes:
+    message = ProtocolMessage(msg_type, data, version, codec)
     return message.to_bytes()
 
 
@@ -45,48 +355,223 @@ def decode_header(header: bytes) -> int:
     return struct.unpack('>I', header)[0]
 
 
-def decode_message(data: bytes) -> ProtocolMessage:
+def is_v2_header(header: bytes) -> bool:
+    return header[0] == V2_MAGIC
+
+
+def decode_v2_header(header: bytes) -> Tuple[Codec, int, int]:
+    magic, version, codec_id, _flags, meta_size, num_attachments = V2_HEADER.unpack(header)
+    if magic != V2_MAGIC or version != PROTOCOL_V2:
+        raise ValueError(f"Versión de protocolo no soportada: {version}")
+    codec = CODECS_BY_ID.get(codec_id)
+    if codec is None:
+        raise ValueError(f"Codec no disponible: {codec_id}")
+    return codec, meta_size, num_attachments
+
+
+def decode_message(data: BytesLike) -> ProtocolMessage:
     return ProtocolMessage.from_bytes(data)
 
 
-async def send_message_async(writer, msg_type: str, data: Dict[str, Any]):
-    message_bytes = encode_message(msg_type, data)
-    writer.write(message_bytes)
+def decode_v2_message(codec: Codec, meta: BytesLike, attachments: List[BytesLike]) -> ProtocolMessage:
+    payload = codec.decode(meta)
+    data = _restore_attachments(payload["data"], attachments)
+    return ProtocolMessage(payload["type"], data, PROTOCOL_V2, codec.name)
+
+
+def build_hello() -> Dict[str, Any]:
+    return {"versions": [PROTOCOL_V2, PROTOCOL_V1], "codecs": available_codecs()}
+
+
+def negotiate(offer: Dict[str, Any]) -> Dict[str, Any]:
+    # Respuesta del servidor a un hello: la versión más alta común y el
+    # primer codec de la lista del cliente que el servidor también tenga
+    versions = offer.get("versions", [PROTOCOL_V1])
+    version = PROTOCOL_V2 if PROTOCOL_V2 in versions else PROTOCOL_V1
+    codec = next((c for c in offer.get("codecs", []) if c in CODECS), "json")
+    return {"version": version, "codec": codec, "success": True}
+
+
+def _attachment_chunks_sync(attachment, chunk_size: int = STREAM_CHUNK_SIZE):
+    if isinstance(attachment, SharedMemoryAttachment):
+        view = attachment.view()
+        for offset in range(0, len(view), chunk_size):
+            chunk = view[offset:offset + chunk_size]
+            yield ATTACHMENT_HEADER.pack(len(chunk))
+            yield chunk
+    else:
+        with open(attachment.path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield ATTACHMENT_HEADER.pack(len(chunk))
+                yield chunk
+    yield ATTACHMENT_HEADER.pack(0)
+
+
+async def _stream_file_async(writer, attachment: FileAttachment, chunk_size: int):
+    async with aiofiles.open(attachment.path, 'rb') as f:
+        while True:
+            chunk = await f.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(ATTACHMENT_HEADER.pack(len(chunk)))
+            writer.write(chunk)
+            # Si el receptor no consume, se espera acá: nunca hay más de
+            # unas pocas partes en el buffer de salida
+            await writer.drain()
+    writer.write(ATTACHMENT_HEADER.pack(0))
+
+
+async def _stream_buffer_async(writer, view: memoryview, chunk_size: int):
+    # Las partes salen directo del segmento compartido, sin copias previas
+    for offset in range(0, len(view), chunk_size):
+        chunk = view[offset:offset + chunk_size]
+        writer.write(ATTACHMENT_HEADER.pack(len(chunk)))
+        writer.write(chunk)
+        await writer.drain()
+    writer.write(ATTACHMENT_HEADER.pack(0))
+
+
+async def send_message_async(writer, msg_type: str, data: Dict[str, Any],
+                             version: int = PROTOCOL_V1, codec: str = "json",
+                             chunk_size: int = STREAM_CHUNK_SIZE):
+    message = ProtocolMessage(msg_type, data, version, codec)
+    for part in message.to_parts():
+        if isinstance(part, FileAttachment):
+            await _stream_file_async(writer, part, chunk_size)
+        elif isinstance(part, SharedMemoryAttachment):
+            await _stream_buffer_async(writer, part.view(), chunk_size)
+        else:
+            writer.write(part)
     await writer.drain()
 
 
-async def receive_message_async(reader) -> ProtocolMessage:
+async def _read_exactly_async(reader, size: int) -> BytesLike:
+    if size <= STREAM_CHUNK_THRESHOLD:
+        return await reader.readexactly(size)
+    
+    # Frames grandes: se copian por partes a un buffer del tamaño anunciado,
+    # así el StreamReader nunca acumula el frame completo
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        chunk = await reader.read(size - received)
+        if not chunk:
+            raise asyncio.IncompleteReadError(bytes(view[:received]), size)
+        view[received:received + len(chunk)] = chunk
+        received += len(chunk)
+    return buffer
+
+
+async def _read_chunked_async(reader, sink, total: int, max_size: int) -> Tuple[Any, int]:
+    # Cada parte se entrega al sink antes de leer la siguiente: si el sink
+    # (disco) es lento, el socket deja de leerse y el emisor se frena en drain()
+    try:
+        while True:
+            size = ATTACHMENT_HEADER.unpack(await reader.readexactly(ATTACHMENT_HEADER.size))[0]
+            if size == 0:
+                return await sink.close(), total
+            total += size
+            check_frame_size(total, max_size)
+            await sink.write(await _read_exactly_async(reader, size))
+    except BaseException:
+        await sink.abort()
+        raise
+
+
+async def receive_message_async(reader, max_size: int = MAX_FRAME_SIZE,
+                                sink_factory: Optional[SinkFactory] = None) -> ProtocolMessage:
     # Leer header
     header = await reader.readexactly(HEADER_SIZE)
+    
+    if is_v2_header(header):
+        header += await reader.readexactly(V2_HEADER.size - HEADER_SIZE)
+        codec, meta_size, num_attachments = decode_v2_header(header)
+        total = meta_size
+        check_frame_size(total, max_size)
+        meta = await _read_exactly_async(reader, meta_size)
+        attachments = []
+        for index in range(num_attachments):
+            size = ATTACHMENT_HEADER.unpack(await reader.readexactly(ATTACHMENT_HEADER.size))[0]
+            if size == CHUNKED_ATTACHMENT:
+                sink = sink_factory(index) if sink_factory else MemorySink()
+                value, total = await _read_chunked_async(reader, sink, total, max_size)
+                attachments.append(value)
+                continue
+            total += size
+            check_frame_size(total, max_size)
+            attachments.append(await _read_exactly_async(reader, size))
+        return decode_v2_message(codec, meta, attachments)
+    
     payload_size = decode_header(header)
+    check_frame_size(payload_size, max_size)
     
     # Leer payload
-    payload = await reader.readexactly(payload_size)
+    payload = await _read_exactly_async(reader, payload_size)
     return decode_message(payload)
 
 
-def send_message_sync(sock, msg_type: str, data: Dict[str, Any]):
-    message_bytes = encode_message(msg_type, data)
-    sock.sendall(message_bytes)
+def send_message_sync(sock, msg_type: str, data: Dict[str, Any],
+                      version: int = PROTOCOL_V1, codec: str = "json",
+                      chunk_size: int = STREAM_CHUNK_SIZE):
+    message = ProtocolMessage(msg_type, data, version, codec)
+    for part in message.to_parts():
+        if isinstance(part, (FileAttachment, SharedMemoryAttachment)):
+            for chunk in _attachment_chunks_sync(part, chunk_size):
+                sock.sendall(chunk)
+        else:
+            sock.sendall(part)
 
 
-def receive_message_sync(sock) -> ProtocolMessage:
-    # Leer header
-    header = b''
-    while len(header) < HEADER_SIZE:
-        chunk = sock.recv(HEADER_SIZE - len(header))
-        if not chunk:
+def _recv_exactly_sync(sock, size: int) -> bytearray:
+    # Buffer preasignado y recv_into: sin concatenaciones ni copias intermedias
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
             raise ConnectionError("Conexión cerrada por el peer")
-        header += chunk
+        received += n
+    return buffer
+
+
+def receive_message_sync(sock, max_size: int = MAX_FRAME_SIZE) -> ProtocolMessage:
+    # Leer header
+    header = bytes(_recv_exactly_sync(sock, HEADER_SIZE))
+    
+    if is_v2_header(header):
+        header += _recv_exactly_sync(sock, V2_HEADER.size - HEADER_SIZE)
+        codec, meta_size, num_attachments = decode_v2_header(header)
+        total = meta_size
+        check_frame_size(total, max_size)
+        meta = _recv_exactly_sync(sock, meta_size)
+        attachments = []
+        for _ in range(num_attachments):
+            size = ATTACHMENT_HEADER.unpack(_recv_exactly_sync(sock, ATTACHMENT_HEADER.size))[0]
+            if size == CHUNKED_ATTACHMENT:
+                # En modo bloqueante los adjuntos por partes se juntan en memoria
+                buffer = bytearray()
+                while True:
+                    size = ATTACHMENT_HEADER.unpack(_recv_exactly_sync(sock, ATTACHMENT_HEADER.size))[0]
+                    if size == 0:
+                        break
+                    total += size
+                    check_frame_size(total, max_size)
+                    buffer += _recv_exactly_sync(sock, size)
+                attachments.append(buffer)
+                continue
+            total += size
+            check_frame_size(total, max_size)
+            attachments.append(_recv_exactly_sync(sock, size))
+        return decode_v2_message(codec, meta, attachments)
     
     payload_size = decode_header(header)
+    check_frame_size(payload_size, max_size)
     
     # Leer payload
-    payload = b''
-    while len(payload) < payload_size:
-        chunk = sock.recv(payload_size - len(payload))
-        if not chunk:
-            raise ConnectionError("Conexión cerrada por el peer")
-        payload += chunk
-    
-    return decode_message(payload)
\ No newline at end of file
+    payload = _recv_exactly_sync(sock, payload_size)
+    return decode_message(payload)
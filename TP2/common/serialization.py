@@ -9,6 +9,14 @@ def image_to_base64(image_data: bytes, format: str = "PNG") -> str:
     return base64.b64encode(image_data).decode('utf-8')
 
 
+def ensure_base64(value: Any) -> Any:
+    # Los binarios que llegan por protocolo v2 se pasan a base64 para JSON;
+    # los que ya vienen en base64 (v1) quedan igual
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('utf-8')
+    return value
+
+
 def base64_to_image(base64_str: str) -> bytes:
     return base64.b64decode(base64_str)
 
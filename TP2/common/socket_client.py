@@ -1,20 +1,30 @@
 import asyncio
 import logging
 from typing import Dict, Any, Optional
-from .protocol import send_message_async, receive_message_async, MSG_TYPE_ERROR
+from .protocol import (
+    send_message_async, receive_message_async, build_hello, SinkFactory,
+    MSG_TYPE_ERROR, MSG_TYPE_HELLO, PROTOCOL_V1, PROTOCOL_V2
+)
 
 logger = logging.getLogger(__name__)
 
 
 class AsyncSocketClient:
     
-    def __init__(self, host: str, port: int, max_retries: int = 3, timeout: float = 30.0):
+    def __init__(self, host: str, port: int, max_retries: int = 3, timeout: float = 30.0,
+                 protocol_version: int = PROTOCOL_V2, codec: Optional[str] = None):
         self.host = host
         self.port = port
         self.max_retries = max_retries
         self.timeout = timeout
+        # Con v2 se negocia el codec al conectar, salvo que ya se conozca
+        self.protocol_version = protocol_version
+        self.codec = codec if protocol_version >= PROTOCOL_V2 else "json"
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
+        # True si la última solicitud venció esperando al servidor (conexión
+        # establecida pero sin respuesta a tiempo), no por un fallo de red
+        self.timed_out = False
     
     async def connect(self) -> bool:
         for attempt in range(self.max_retries):
@@ -25,6 +35,8 @@ class AsyncSocketClient:
                     timeout=self.timeout
                 )
                 logger.info(f"Conectado exitosamente a {self.host}:{self.port}")
+                if self.protocol_version >= PROTOCOL_V2 and self.codec is None:
+                    await self._negotiate()
                 return True
             except asyncio.TimeoutError:
                 logger.warning(f"Timeout al conectar (intento {attempt + 1}/{self.max_retries})")
@@ -39,7 +51,36 @@ class AsyncSocketClient:
         logger.error(f"No se pudo conectar después de {self.max_retries} intentos")
         return False
     
-    async def send_request(self, msg_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def _negotiate(self):
+        # El hello viaja siempre en v1: un servidor viejo lo rechaza como
+        # tarea desconocida y cierra la conexión, en ese caso se sigue en v1
+        await send_message_async(self.writer, MSG_TYPE_HELLO, build_hello())
+        try:
+            response = await asyncio.wait_for(receive_message_async(self.reader), timeout=self.timeout)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            response = None
+        
+        if response and response.msg_type != MSG_TYPE_ERROR and response.data.get('version') == PROTOCOL_V2:
+            self.codec = response.data.get('codec', 'json')
+            logger.debug(f"Protocolo v2 negociado con {self.host}:{self.port} (codec {self.codec})")
+            return
+        
+        logger.info(f"{self.host}:{self.port} no soporta protocolo v2, se usa v1")
+        self.protocol_version = PROTOCOL_V1
+        self.codec = "json"
+        if response is None or response.msg_type == MSG_TYPE_ERROR or 'version' not in response.data:
+            # Reabrir la conexión por si el servidor la cerró tras el hello
+            self.writer.close()
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port),
+                timeout=self.timeout
+            )
+    
+    async def send_request(self, msg_type: str, data: Dict[str, Any],
+                           sink_factory: Optional[SinkFactory] = None) -> Optional[Dict[str, Any]]:
+        # sink_factory decide dónde van los adjuntos que llegan por partes
+        # (por defecto, a memoria)
+        self.timed_out = False
         if not self.writer or not self.reader:
             if not await self.connect():
                 return None
@@ -48,14 +89,14 @@ class AsyncSocketClient:
             # Enviar solicitud
             logger.debug(f"Enviando solicitud de tipo: {msg_type}")
             await asyncio.wait_for(
-                send_message_async(self.writer, msg_type, data),
+                send_message_async(self.writer, msg_type, data, self.protocol_version, self.codec),
                 timeout=self.timeout
             )
             
             # Recibir respuesta
             logger.debug("Esperando respuesta del servidor de procesamiento")
             response = await asyncio.wait_for(
-                receive_message_async(self.reader),
+                receive_message_async(self.reader, sink_factory=sink_factory),
                 timeout=self.timeout
             )
             
@@ -68,6 +109,7 @@ class AsyncSocketClient:
             
         except asyncio.TimeoutError:
             logger.error(f"Timeout al comunicarse con servidor de procesamiento")
+            self.timed_out = True
             await self.close()
             return None
         except ConnectionError as e:
@@ -0,0 +1,174 @@
+import logging
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple, Union
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+logger = logging.getLogger(__name__)
+
+# Dominios de publicidad y tracking que se bloquean con block_trackers
+DEFAULT_BLOCKED_DOMAINS = [
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com",
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com",
+    "adservice.google.com", "connect.facebook.net", "facebook.net",
+    "amazon-adsystem.com", "adnxs.com", "adsrvr.org", "criteo.com", "criteo.net",
+    "taboola.com", "outbrain.com", "scorecardresearch.com", "quantserve.com",
+    "moatads.com", "rubiconproject.com", "pubmatic.com", "openx.net",
+    "hotjar.com", "clarity.ms", "mixpanel.com", "segment.io", "segment.com",
+    "nr-data.net", "ads-twitter.com", "analytics.tiktok.com", "bat.bing.com"
+]
+
+# Ruta al chromedriver para hosts sin acceso a internet
+CHROMEDRIVER_ENV = "CHROMEDRIVER_PATH"
+# Tiempo máximo del chequeo "chromedriver --version" al arrancar
+CHROMEDRIVER_CHECK_TIMEOUT = 10
+
+# Ruta del chromedriver resuelta en este proceso (la fija el servidor al
+# iniciar el worker, o se resuelve una vez con el primer navegador)
+_chromedriver_path: Optional[str] = None
+
+# Extensiones de cada tipo de recurso para Network.setBlockedURLs
+MEDIA_EXTENSIONS = ["mp4", "webm", "ogg", "ogv", "mp3", "m4a", "m4s", "m3u8", "mpd", "wav", "mov"]
+FONT_EXTENSIONS = ["woff", "woff2", "ttf", "otf", "eot"]
+
+# Políticas predefinidas; "none" mantiene la carga completa de la página
+RESOURCE_POLICIES = {
+    "none": {},
+    "lean": {"block_trackers": True, "block_media": True, "block_fonts": True},
+    # Para mediciones de rendimiento donde las imágenes no interesan
+    "minimal": {"block_trackers": True, "block_media": True, "block_fonts": True, "block_images": True}
+}
+
+
+def parse_resource_policy(policy: Union[None, str, Dict[str, Any]]) -> Dict[str, Any]:
+    # Acepta el nombre de una política predefinida o un dict con las opciones
+    if policy is None or isinstance(policy, str):
+        name = policy or "none"
+        if name not in RESOURCE_POLICIES:
+            raise ValueError(f"Política de recursos desconocida: {name}")
+        options = dict(RESOURCE_POLICIES[name])
+    elif isinstance(policy, dict):
+        base = policy.get('preset')
+        if base is not None and base not in RESOURCE_POLICIES:
+            raise ValueError(f"Política de recursos desconocida: {base}")
+        name = base or "custom"
+        options = dict(RESOURCE_POLICIES.get(base, {}))
+        options.update({k: v for k, v in policy.items() if k != 'preset'})
+    else:
+        raise ValueError(f"Política de recursos inválida: {policy!r}")
+    
+    block_domains = options.get('block_domains') or []
+    if isinstance(block_domains, str):
+        block_domains = block_domains.split(',')
+    return {
+        "name": name,
+        "block_trackers": bool(options.get('block_trackers', False)),
+        "block_media": bool(options.get('block_media', False)),
+        "block_fonts": bool(options.get('block_fonts', False)),
+        "block_images": bool(options.get('block_images', False)),
+        "block_domains": [d.strip().lower() for d in block_domains if d.strip()]
+    }
+
+
+def blocked_url_patterns(policy: Dict[str, Any]) -> List[str]:
+    domains = list(policy['block_domains'])
+    if policy['block_trackers']:
+        domains += DEFAULT_BLOCKED_DOMAINS
+    
+    patterns = []
+    for domain in dict.fromkeys(domains):
+        # El dominio y todos sus subdominios, por http o https
+        patterns.append(f"*://{domain}/*")
+        patterns.append(f"*://*.{domain}/*")
+    
+    extensions = []
+    if policy['block_media']:
+        extensions += MEDIA_EXTENSIONS
+    if policy['block_fonts']:
+        extensions += FONT_EXTENSIONS
+    for extension in extensions:
+        patterns.append(f"*.{extension}")
+        patterns.append(f"*.{extension}?*")
+    return patterns
+
+
+def apply_resource_policy(driver, policy: Dict[str, Any]):
+    # Bloqueo por DevTools: Chrome descarta las requests que coinciden antes
+    # de enviarlas, sin que el driver tenga que interceptar cada una
+    patterns = blocked_url_patterns(policy)
+    if not patterns:
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": patterns})
+    logger.debug(f"Política de recursos {policy['name']}: {len(patterns)} patrones bloqueados")
+
+
+def resolve_chromedriver(path: Optional[str] = None, allow_download: bool = True) -> str:
+    # Orden: ruta explícita, variable de entorno, PATH y, por último,
+    # webdriver-manager (que consulta versiones y puede descargar)
+    candidate = path or os.environ.get(CHROMEDRIVER_ENV) or shutil.which('chromedriver')
+    if candidate:
+        if not (os.path.isfile(candidate) and os.access(candidate, os.X_OK)):
+            raise FileNotFoundError(f"chromedriver no encontrado o no ejecutable: {candidate}")
+        return os.path.abspath(candidate)
+    if not allow_download:
+        raise FileNotFoundError(f"chromedriver no está en el PATH ni en {CHROMEDRIVER_ENV}")
+    return ChromeDriverManager().install()
+
+
+def check_chromedriver(path: str) -> str:
+    # Verifica que el binario arranque y devuelve su versión
+    try:
+        result = subprocess.run([path, '--version'], capture_output=True, text=True,
+                                timeout=CHROMEDRIVER_CHECK_TIMEOUT, check=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise RuntimeError(f"chromedriver no responde ({path}): {e}")
+    return result.stdout.strip()
+
+
+def set_chromedriver_path(path: Optional[str]):
+    global _chromedriver_path
+    _chromedriver_path = path
+
+
+def get_chromedriver_path() -> str:
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        _chromedriver_path = resolve_chromedriver()
+        logger.info(f"chromedriver resuelto en el worker: {_chromedriver_path}")
+    return _chromedriver_path
+
+
+def create_chrome_driver(timeout: int, window_size: Optional[Tuple[int, int]] = None,
+                         policy: Optional[Dict[str, Any]] = None) -> webdriver.Chrome:
+    policy = policy or parse_resource_policy(None)
+    
+    # Configurar Chrome en modo headless
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-popup-blocking")
+    if window_size:
+        chrome_options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+    if policy['block_images']:
+        # Las imágenes no se descargan ni se decodifican
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    if policy['block_media']:
+        chrome_options.add_argument("--autoplay-policy=user-gesture-required")
+    
+    service = Service(get_chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver.set_page_load_timeout(timeout)
+    try:
+        apply_resource_policy(driver, policy)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
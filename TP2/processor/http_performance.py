@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+# Subrecursos propios que se descargan como máximo por página
+MAX_SUBRESOURCES = 50
+# Descargas simultáneas por página (lo que abre un navegador por host)
+SUBRESOURCE_CONCURRENCY = 6
+
+# Solo se recorren las etiquetas que cargan recursos
+_RESOURCE_TAGS = SoupStrainer(['img', 'script', 'link'])
+
+
+async def _on_request_start(session, ctx, params):
+    ctx.trace_request_ctx.start = time.perf_counter()
+
+
+async def _on_dns_start(session, ctx, params):
+    ctx.trace_request_ctx.dns_start = time.perf_counter()
+
+
+async def _on_dns_end(session, ctx, params):
+    timing = ctx.trace_request_ctx
+    timing.dns += time.perf_counter() - timing.dns_start
+
+
+async def _on_connection_start(session, ctx, params):
+    ctx.trace_request_ctx.connect_start = time.perf_counter()
+
+
+async def _on_connection_end(session, ctx, params):
+    # Incluye DNS y, en https, el handshake TLS
+    timing = ctx.trace_request_ctx
+    timing.connect += time.perf_counter() - timing.connect_start
+
+
+async def _on_request_end(session, ctx, params):
+    # aiohttp avisa al recibir los headers de la respuesta
+    ctx.trace_request_ctx.headers = time.perf_counter()
+
+
+def build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_end)
+    trace_config.on_connection_create_start.append(_on_connection_start)
+    trace_config.on_connection_create_end.append(_on_connection_end)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
+
+
+def new_timing() -> SimpleNamespace:
+    return SimpleNamespace(start=0.0, dns_start=0.0, dns=0.0, connect_start=0.0,
+                           connect=0.0, headers=0.0, end=0.0)
+
+
+def timing_breakdown(timing: SimpleNamespace) -> Dict[str, int]:
+    def ms(seconds):
+        return int(round(seconds * 1000))
+    
+    # El connect de aiohttp contiene la resolución DNS; se informa por separado
+    connect = max(timing.connect - timing.dns, 0.0)
+    return {
+        "dns_ms": ms(timing.dns),
+        "connect_ms": ms(connect),
+        "ttfb_ms": ms(timing.headers - timing.start - timing.connect) if timing.headers else 0,
+        "download_ms": ms(timing.end - timing.headers) if timing.headers else 0,
+        "total_ms": ms(timing.end - timing.start)
+    }
+
+
+def is_first_party(url: str, host: str) -> bool:
+    other = urlparse(url).hostname or ''
+    return other == host or other.endswith('.' + host) or host.endswith('.' + other)
+
+
+def extract_subresources(html: str, base_url: str) -> List[Tuple[str, str]]:
+    soup = BeautifulSoup(html, 'lxml', parse_only=_RESOURCE_TAGS)
+    resources = []
+    for tag in soup.find_all(['img', 'script', 'link']):
+        if tag.name == 'img':
+            src, kind = tag.get('src'), 'img'
+        elif tag.name == 'script':
+            src, kind = tag.get('src'), 'script'
+        elif 'stylesheet' in (tag.get('rel') or []):
+            src, kind = tag.get('href'), 'css'
+        else:
+            continue
+        if src and not src.startswith('data:'):
+            resources.append((urljoin(base_url, src), kind))
+    # Sin repetidos, en orden de aparición
+    return list(dict.fromkeys(resources))
+
+
+async def _fetch(session: aiohttp.ClientSession, url: str) -> Tuple[Optional[int], int, SimpleNamespace]:
+    timing = new_timing()
+    try:
+        async with session.get(url, trace_request_ctx=timing) as response:
+            body = await response.read()
+            timing.end = time.perf_counter()
+            return response.status, len(body), timing
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.debug(f"No se pudo descargar {url}: {e}")
+        timing.end = time.perf_counter()
+        return None, 0, timing
+
+
+async def analyze_http_performance(url: str, timeout: int = 30,
+                                   max_subresources: int = MAX_SUBRESOURCES) -> Optional[Dict]:
+    # Sin navegador: el HTML y sus subrecursos propios por aiohttp, con los
+    # tiempos de cada fase tomados de los trace hooks
+    session = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={'User-Agent': DEFAULT_USER_AGENT},
+        trace_configs=[build_trace_config()]
+    )
+    try:
+        logger.info(f"Analizando rendimiento HTTP para: {url}")
+        timing = new_timing()
+        async with session.get(url, trace_request_ctx=timing) as response:
+            body = await response.read()
+            timing.end = time.perf_counter()
+            status = response.status
+            final_url = str(response.url)
+            protocol = f"HTTP/{response.version.major}.{response.version.minor}"
+            html = body.decode(response.get_encoding(), errors='replace') if 'html' in response.content_type else ''
+        
+        host = urlparse(final_url).hostname or ''
+        # El parseo con lxml bloquea: se hace en el executor para que el
+        # event loop siga atendiendo conexiones y los demás análisis
+        resources = await asyncio.get_running_loop().run_in_executor(
+            None, extract_subresources, html, final_url
+        )
+        own = [r for r in resources if is_first_party(r[0], host)]
+        first_party = own[:max_subresources]
+        
+        semaphore = asyncio.Semaphore(SUBRESOURCE_CONCURRENCY)
+        
+        async def fetch_limited(resource_url):
+            async with semaphore:
+                return await _fetch(session, resource_url)
+        
+        results = await asyncio.gather(*(fetch_limited(r[0]) for r in first_party))
+        page_end = max([timing.end] + [t.end for _, _, t in results])
+        
+        counts: Dict[str, int] = {}
+        sizes: Dict[str, int] = {}
+        failed = 0
+        for (_, kind), (resource_status, size, _) in zip(first_party, results):
+            if resource_status is None or resource_status >= 400:
+                failed += 1
+            counts[kind] = counts.get(kind, 0) + 1
+            sizes[kind] = sizes.get(kind, 0) + size
+        
+        performance_data = {
+            "mode": "http",
+            "load_time_ms": int(round((page_end - timing.start) * 1000)),
+            **timing_breakdown(timing),
+            "total_size_kb": int((len(body) + sum(sizes.values())) / 1024),
+            "num_requests": len(first_party) + 1,
+            "resource_types": counts,
+            "bytes_by_type_kb": {kind: round(size / 1024, 1) for kind, size in sizes.items()},
+            "num_images": sum(1 for _, kind in resources if kind == 'img'),
+            "num_scripts": sum(1 for _, kind in resources if kind == 'script'),
+            "num_stylesheets": sum(1 for _, kind in resources if kind == 'css'),
+            "third_party_skipped": len(resources) - len(own),
+            "failed_requests": failed,
+            "status_code": status,
+            "protocol": protocol
+        }
+        logger.info(f"Análisis HTTP completado: {performance_data['load_time_ms']}ms, "
+                    f"{performance_data['num_requests']} requests")
+        return performance_data
+        
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout al analizar rendimiento HTTP: {url}")
+        return {
+            "mode": "http",
+            "load_time_ms": timeout * 1000,
+            "error": "timeout",
+            "num_requests": 0,
+            "total_size_kb": 0
+        }
+    except aiohttp.ClientError as e:
+        logger.error(f"Error HTTP al analizar rendimiento: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error inesperado al analizar rendimiento HTTP: {e}")
+        return None
+    finally:
+        await session.close()
@@ -43,6 +43,13 @@ def download_image(url: str, timeout: int = IMAGE_TIMEOUT) -> Optional[bytes]:
 
 
 def create_thumbnail(image_bytes: bytes, size: tuple = THUMBNAIL_SIZE) -> Optional[str]:
+    thumbnail_bytes = create_thumbnail_bytes(image_bytes, size)
+    if thumbnail_bytes is None:
+        return None
+    return base64.b64encode(thumbnail_bytes).decode('utf-8')
+
+
+def create_thumbnail_bytes(image_bytes: bytes, size: tuple = THUMBNAIL_SIZE) -> Optional[bytes]:
     try:
         # Abrir imagen
         image = Image.open(BytesIO(image_bytes))
@@ -58,13 +65,10 @@ def create_thumbnail(image_bytes: bytes, size: tuple = THUMBNAIL_SIZE) -> Option
         # Crear thumbnail manteniendo aspect ratio
         image.thumbnail(size, Image.Resampling.LANCZOS)
         
-        # Convertir a base64
+        # Codificar como JPEG
         buffer = BytesIO()
         image.save(buffer, format='JPEG', quality=85, optimize=True)
-        buffer.seek(0)
-        thumbnail_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        
-        return thumbnail_base64
+        return buffer.getvalue()
         
     except Exception as e:
         logger.error(f"Error al crear thumbnail: {e}")
@@ -99,7 +103,9 @@ def extract_image_urls(html_content: str, base_url: str, max_images: int = MAX_I
         return []
 
 
-def process_images(url: str, html_content: str, max_images: int = MAX_IMAGES_TO_PROCESS) -> List[str]:
+def process_images(url: str, html_content: str, max_images: int = MAX_IMAGES_TO_PROCESS,
+                   raw: bool = False) -> List:
+    # raw=True devuelve los thumbnails como bytes JPEG en lugar de base64
     thumbnails = []
     
     try:
@@ -120,7 +126,7 @@ def process_images(url: str, html_content: str, max_images: int = MAX_IMAGES_TO_
                 continue
             
             # Crear thumbnail
-            thumbnail = create_thumbnail(image_bytes)
+            thumbnail = create_thumbnail_bytes(image_bytes) if raw else create_thumbnail(image_bytes)
             if thumbnail:
                 thumbnails.append(thumbnail)
             
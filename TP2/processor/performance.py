@@ -1,89 +1,171 @@
 import logging
 import time
 from typing import Dict, Optional
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import WebDriverException, TimeoutException
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+from processor.browser import create_chrome_driver
 
 logger = logging.getLogger(__name__)
 
 
-def analyze_performance(url: str, timeout: int = 30) -> Optional[Dict]:
+# Se inyecta antes de que cargue la página (Page.addScriptToEvaluateOnNewDocument)
+# para que los observers vean LCP, layout shifts y long tasks desde el inicio
+PERFORMANCE_OBSERVER_SCRIPT = """
+(function() {
+    var state = window.__tp2perf = {lcp: null, lcpElement: null, shifts: [], longTasks: []};
+    function observe(type, callback) {
+        try {
+            new PerformanceObserver(function(list) { list.getEntries().forEach(callback); })
+                .observe({type: type, buffered: true});
+        } catch (e) {}
+    }
+    observe('largest-contentful-paint', function(entry) {
+        state.lcp = entry.renderTime || entry.loadTime || entry.startTime;
+        state.lcpElement = entry.element ? entry.element.tagName.toLowerCase() : null;
+    });
+    observe('layout-shift', function(entry) {
+        if (!entry.hadRecentInput) {
+            state.shifts.push([entry.startTime, entry.value]);
+        }
+    });
+    observe('longtask', function(entry) {
+        state.longTasks.push([entry.startTime, entry.duration]);
+    });
+})();
+"""
+
+# Una sola llamada a execute_script junta todas las métricas
+COLLECT_METRICS_SCRIPT = """
+var state = window.__tp2perf || {lcp: null, lcpElement: null, shifts: [], longTasks: []};
+var nav = performance.getEntriesByType('navigation')[0] || null;
+var paints = {};
+performance.getEntriesByType('paint').forEach(function(entry) { paints[entry.name] = entry.startTime; });
+
+var resources = performance.getEntriesByType('resource');
+var byType = {};
+resources.forEach(function(entry) {
+    var type = entry.initiatorType || 'other';
+    var bucket = byType[type] = byType[type] || {count: 0, transferSize: 0, encodedBodySize: 0};
+    bucket.count += 1;
+    bucket.transferSize += entry.transferSize || 0;
+    bucket.encodedBodySize += entry.encodedBodySize || 0;
+});
+
+return {
+    navigation: nav && {
+        type: nav.type,
+        protocol: nav.nextHopProtocol,
+        requestStart: nav.requestStart,
+        responseStart: nav.responseStart,
+        responseEnd: nav.responseEnd,
+        domInteractive: nav.domInteractive,
+        domContentLoadedEventEnd: nav.domContentLoadedEventEnd,
+        loadEventEnd: nav.loadEventEnd,
+        transferSize: nav.transferSize,
+        encodedBodySize: nav.encodedBodySize
+    },
+    paint: paints,
+    lcp: state.lcp,
+    lcpElement: state.lcpElement,
+    shifts: state.shifts,
+    longTasks: state.longTasks,
+    resources: byType,
+    elements: {
+        images: document.images.length,
+        scripts: document.scripts.length,
+        stylesheets: document.querySelectorAll('link[rel~="stylesheet"]').length
+    }
+};
+"""
+
+# Ventanas de CLS: shifts a menos de 1 s entre sí y de 5 s como máximo
+CLS_SESSION_GAP_MS = 1000
+CLS_SESSION_MAX_MS = 5000
+# Parte de una long task que cuenta como bloqueo (Total Blocking Time)
+LONG_TASK_THRESHOLD_MS = 50
+
+
+def cumulative_layout_shift(shifts) -> float:
+    # CLS = la ventana de sesión con mayor suma de shifts
+    best = current = 0.0
+    window_start = previous = None
+    for start, value in sorted(shifts):
+        if previous is None or start - previous > CLS_SESSION_GAP_MS or start - window_start > CLS_SESSION_MAX_MS:
+            window_start = start
+            current = 0.0
+        current += value
+        previous = start
+        best = max(best, current)
+    return round(best, 4)
+
+
+def build_performance_data(raw: Dict, load_time: float) -> Dict:
+    nav = raw.get('navigation') or {}
+    paint = raw.get('paint') or {}
+    resources = raw.get('resources') or {}
+    elements = raw.get('elements') or {}
+    long_tasks = raw.get('longTasks') or []
+    fcp = paint.get('first-contentful-paint')
+    
+    def ms(value):
+        return int(round(value)) if value else 0
+    
+    # Total Blocking Time: lo que excede 50 ms de cada long task posterior al FCP
+    blocking = sum(
+        duration - LONG_TASK_THRESHOLD_MS for start, duration in long_tasks
+        if duration > LONG_TASK_THRESHOLD_MS and (fcp is None or start >= fcp)
+    )
+    total_transfer = nav.get('transferSize', 0) + sum(r['transferSize'] for r in resources.values())
+    
+    return {
+        # Claves históricas (ahora medidas con Navigation Timing Level 2)
+        "load_time_ms": ms(nav.get('loadEventEnd')) or int(load_time),
+        "dom_content_loaded_ms": ms(nav.get('domContentLoadedEventEnd')),
+        "response_time_ms": ms(nav.get('responseEnd', 0) - nav.get('requestStart', 0)),
+        "dom_interactive_ms": ms(nav.get('domInteractive')),
+        "total_size_kb": int(total_transfer / 1024),
+        "num_requests": sum(r['count'] for r in resources.values()) + (1 if nav else 0),
+        "resource_types": {t: r['count'] for t, r in resources.items()},
+        "num_images": elements.get('images', 0),
+        "num_scripts": elements.get('scripts', 0),
+        "num_stylesheets": elements.get('stylesheets', 0),
+        # Métricas nuevas
+        "ttfb_ms": ms(nav.get('responseStart')),
+        "first_paint_ms": ms(paint.get('first-paint')),
+        "first_contentful_paint_ms": ms(fcp),
+        "largest_contentful_paint_ms": ms(raw.get('lcp')),
+        "lcp_element": raw.get('lcpElement'),
+        "cumulative_layout_shift": cumulative_layout_shift(raw.get('shifts') or []),
+        "long_tasks": {
+            "count": len(long_tasks),
+            "total_ms": ms(sum(duration for _, duration in long_tasks))
+        },
+        "total_blocking_time_ms": ms(blocking),
+        "bytes_by_type_kb": {
+            t: round(r['transferSize'] / 1024, 1) for t, r in resources.items()
+        },
+        "protocol": nav.get('protocol')
+    }
+
+
+def analyze_performance(url: str, timeout: int = 30, policy: Optional[Dict] = None) -> Optional[Dict]:
     driver = None
     try:
         logger.info(f"Analizando rendimiento para: {url}")
         
-        # Configurar Chrome headless
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(timeout)
+        # Chrome headless con la política de recursos del pedido
+        driver = create_chrome_driver(timeout, policy=policy)
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {"source": PERFORMANCE_OBSERVER_SCRIPT})
         
         # Medir tiempo de carga
         start_time = time.time()
         driver.get(url)
         load_time = (time.time() - start_time) * 1000  # Convertir a milisegundos
         
-        # Obtener métricas de rendimiento usando Navigation Timing API
-        navigation_timing = driver.execute_script("""
-            var timing = window.performance.timing;
-            return {
-                'loadTime': timing.loadEventEnd - timing.navigationStart,
-                'domContentLoaded': timing.domContentLoadedEventEnd - timing.navigationStart,
-                'responseTime': timing.responseEnd - timing.requestStart,
-                'domInteractive': timing.domInteractive - timing.navigationStart
-            };
-        """)
-        
-        # Obtener información de recursos
-        resources = driver.execute_script("""
-            var resources = window.performance.getEntriesByType('resource');
-            var totalSize = 0;
-            var resourceTypes = {};
-            
-            resources.forEach(function(resource) {
-                if (resource.transferSize) {
-                    totalSize += resource.transferSize;
-                }
-                var type = resource.initiatorType || 'other';
-                resourceTypes[type] = (resourceTypes[type] || 0) + 1;
-            });
-            
-            return {
-                'numRequests': resources.length,
-                'totalSize': totalSize,
-                'resourceTypes': resourceTypes
-            };
-        """)
-        
-        # Contar elementos de la página
-        try:
-            num_images = len(driver.find_elements(By.TAG_NAME, "img"))
-            num_scripts = len(driver.find_elements(By.TAG_NAME, "script"))
-            num_stylesheets = len(driver.find_elements(By.TAG_NAME, "link"))
-        except Exception:
-            num_images = num_scripts = num_stylesheets = 0
-        
-        performance_data = {
-            "load_time_ms": int(navigation_timing.get('loadTime', load_time)),
-            "dom_content_loaded_ms": navigation_timing.get('domContentLoaded', 0),
-            "response_time_ms": navigation_timing.get('responseTime', 0),
-            "dom_interactive_ms": navigation_timing.get('domInteractive', 0),
-            "total_size_kb": int(resources.get('totalSize', 0) / 1024),
-            "num_requests": resources.get('numRequests', 0),
-            "resource_types": resources.get('resourceTypes', {}),
-            "num_images": num_images,
-            "num_scripts": num_scripts,
-            "num_stylesheets": num_stylesheets
-        }
+        # Navigation Timing Level 2, paint, LCP, CLS, long tasks, bytes por
+        # tipo de recurso y cantidad de elementos en un solo round trip
+        raw = driver.execute_script(COLLECT_METRICS_SCRIPT)
+        performance_data = build_performance_data(raw or {}, load_time)
+        performance_data["resource_policy"] = policy['name'] if policy else "none"
         
         logger.info(f"Análisis de rendimiento completado: {load_time:.2f}ms, {performance_data['num_requests']} requests")
         return performance_data
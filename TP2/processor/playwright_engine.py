@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from processor.browser import blocked_url_patterns, parse_resource_policy
+from processor.screenshot import capture_params, parse_screenshot_options
+from processor.performance import PERFORMANCE_OBSERVER_SCRIPT, COLLECT_METRICS_SCRIPT, build_performance_data
+
+logger = logging.getLogger(__name__)
+
+# Páginas simultáneas por worker: cada una en su propio contexto (cookies,
+# caché y almacenamiento aislados) dentro del mismo Chromium
+DEFAULT_PAGES_PER_WORKER = 4
+
+CHROMIUM_ARGS = ["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu", "--disable-extensions"]
+
+
+class PlaywrightEngine:
+    
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+    
+    async def _get_browser(self):
+        # Un solo Chromium por worker, lanzado con la primera página
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                logger.info(f"Chromium iniciado (Playwright {self._browser.version})")
+        return self._browser
+    
+    @asynccontextmanager
+    async def _page(self, policy: Dict[str, Any], viewport: Optional[Dict[str, int]] = None):
+        browser = await self._get_browser()
+        context = await browser.new_context(viewport=viewport)
+        try:
+            page = await context.new_page()
+            cdp = await context.new_cdp_session(page)
+            # Misma política de recursos que con Selenium: bloqueo por DevTools
+            patterns = blocked_url_patterns(policy)
+            if patterns:
+                await cdp.send('Network.enable')
+                await cdp.send('Network.setBlockedURLs', {"urls": patterns})
+            if policy['block_images']:
+                await context.route('**/*', _abort_images)
+            yield page, cdp
+        finally:
+            await context.close()
+    
+    async def capture_screenshot(self, url: str, timeout: int = 30,
+                                 options: Optional[Dict[str, Any]] = None,
+                                 policy: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+        options = options or parse_screenshot_options()
+        policy = policy or parse_resource_policy(None)
+        try:
+            logger.info(f"Generando screenshot (Playwright) para: {url}")
+            viewport = {"width": options['width'], "height": options['height']}
+            async with self._page(policy, viewport) as (page, cdp):
+                await page.goto(url, timeout=timeout * 1000, wait_until='load')
+                
+                content_height = 0
+                if options['full_page']:
+                    metrics = await cdp.send('Page.getLayoutMetrics')
+                    content_height = int(metrics.get('cssContentSize', metrics['contentSize'])['height'])
+                result = await cdp.send('Page.captureScreenshot', capture_params(options, content_height))
+                screenshot_bytes = base64.b64decode(result['data'])
+            
+            logger.info(f"Screenshot {options['format']} generado exitosamente para: {url} "
+                        f"({len(screenshot_bytes) / 1024:.0f} KB)")
+            return screenshot_bytes
+            
+        except PlaywrightTimeoutError:
+            logger.error(f"Timeout al cargar la página: {url}")
+            return None
+        except PlaywrightError as e:
+            logger.error(f"Error de Playwright al generar screenshot: {e}")
+            return None
+    
+    async def analyze_performance(self, url: str, timeout: int = 30,
+                                  policy: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        policy = policy or parse_resource_policy(None)
+        try:
+            logger.info(f"Analizando rendimiento (Playwright) para: {url}")
+            async with self._page(policy) as (page, cdp):
+                await page.add_init_script(PERFORMANCE_OBSERVER_SCRIPT)
+                
+                start_time = time.time()
+                await page.goto(url, timeout=timeout * 1000, wait_until='load')
+                load_time = (time.time() - start_time) * 1000
+                
+                # El script de Selenium termina con return: se envuelve en una función
+                raw = await page.evaluate("() => {" + COLLECT_METRICS_SCRIPT + "}")
+            
+            performance_data = build_performance_data(raw or {}, load_time)
+            performance_data["resource_policy"] = policy['name']
+            logger.info(f"Análisis de rendimiento completado: {load_time:.2f}ms, "
+                        f"{performance_data['num_requests']} requests")
+            return performance_data
+            
+        except PlaywrightTimeoutError:
+            logger.error(f"Timeout al analizar rendimiento: {url}")
+            return {
+                "load_time_ms": timeout * 1000,
+                "error": "timeout",
+                "num_requests": 0,
+                "total_size_kb": 0
+            }
+        except PlaywrightError as e:
+            logger.error(f"Error de Playwright al analizar rendimiento: {e}")
+            return None
+    
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+async def _abort_images(route):
+    if route.request.resource_type == 'image':
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# Motor del worker (un proceso, un navegador)
+_engine: Optional[PlaywrightEngine] = None
+
+
+def get_engine() -> PlaywrightEngine:
+    global _engine
+    if _engine is None:
+        _engine = PlaywrightEngine()
+    return _engine
+
+
+async def close_engine():
+    global _engine
+    if _engine is not None:
+        try:
+            await _engine.close()
+        except Exception as e:
+            logger.error(f"Error al cerrar Playwright: {e}")
+        _engine = None
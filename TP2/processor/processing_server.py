@@ -1,50 +1,174 @@
-import socketserver
+import asyncio
 import logging
 import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
-from typing import Dict, Any
+import shutil
+import signal
+import tempfile
+from typing import Dict, Any, Optional, Set, Tuple
 import sys
 import os
 
 # Importar módulos comunes
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from common.protocol import (
-    receive_message_sync, send_message_sync,
+    receive_message_async, send_message_async,
     MSG_TYPE_SCREENSHOT, MSG_TYPE_PERFORMANCE, MSG_TYPE_IMAGE_PROCESSING,
-    MSG_TYPE_RESPONSE, MSG_TYPE_ERROR
+    MSG_TYPE_PING, MSG_TYPE_STATS, MSG_TYPE_HELLO, MSG_TYPE_RESPONSE, MSG_TYPE_ERROR,
+    negotiate, FileAttachment, SharedMemoryAttachment, discard_attachments, PERFORMANCE_MODES
+)
+from processor.screenshot import capture_screenshot, parse_screenshot_options
+from processor.browser import (
+    parse_resource_policy, resolve_chromedriver, check_chromedriver, set_chromedriver_path
 )
-from processor.screenshot import generate_screenshot
 from processor.performance import analyze_performance
+from processor.http_performance import analyze_http_performance
+from processor.playwright_engine import get_engine, close_engine, DEFAULT_PAGES_PER_WORKER
 from processor.image_processor import process_images
+from processor.worker_pool import SupervisedWorkerPool
 
 logger = logging.getLogger(__name__)
 
-# Pool global de procesos
-process_pool: ProcessPoolExecutor = None
+# Frames leídos por conexión que pueden esperar a ser procesados
+CONNECTION_QUEUE_SIZE = 8
+# Tiempo máximo para terminar las tareas en curso al apagar el servidor
+DRAIN_TIMEOUT = 60.0
+# Reparto por defecto de los procesos entre clases de tarea: los navegadores
+# no pueden dejar sin workers a los thumbnails
+DEFAULT_POOL_SHARES = {
+    MSG_TYPE_SCREENSHOT: 0.4,
+    MSG_TYPE_PERFORMANCE: 0.4,
+    MSG_TYPE_IMAGE_PROCESSING: 0.2
+}
+# Artefactos a partir de este tamaño no vuelven por el pipe del worker:
+# se dejan en memoria compartida (o en disco) y se transmiten por partes
+SPOOL_THRESHOLD = 256 * 1024
+# Cómo devuelve el worker los artefactos grandes al proceso padre
+HANDOFF_SHM = "shm"      # multiprocessing.shared_memory (/dev/shm)
+HANDOFF_FILE = "file"    # archivo en el directorio de spool
+HANDOFF_PIPE = "pipe"    # bytes pickleados por el pipe
+HANDOFF_MODES = [HANDOFF_SHM, HANDOFF_FILE, HANDOFF_PIPE]
+# Motor de navegador para screenshots y rendimiento
+ENGINE_SELENIUM = "selenium"      # un Chrome bloqueante por tarea
+ENGINE_PLAYWRIGHT = "playwright"  # un Chromium por worker, varias páginas a la vez
+ENGINES = [ENGINE_SELENIUM, ENGINE_PLAYWRIGHT]
+# Análisis de rendimiento en modo HTTP simultáneos: corren en el event loop
+# del servidor, sin navegador ni worker
+HTTP_PERFORMANCE_CONCURRENCY = 256
+
+# Configuración del worker (la fija init_worker)
+_spool_dir: Optional[str] = None
+_handoff = HANDOFF_PIPE
+
+
+def init_worker(spool_dir: Optional[str], handoff: str = HANDOFF_SHM, chromedriver: Optional[str] = None):
+    global _spool_dir, _handoff
+    _spool_dir = spool_dir
+    _handoff = handoff
+    if chromedriver:
+        set_chromedriver_path(chromedriver)
+
+
+def prepare_chromedriver(path: Optional[str] = None, offline: bool = False) -> Optional[str]:
+    # Se resuelve una sola vez al arrancar y los workers reciben la ruta, así
+    # ningún screenshot paga la verificación de versiones de webdriver-manager
+    try:
+        resolved = resolve_chromedriver(path, allow_download=not offline)
+        version = check_chromedriver(resolved)
+    except Exception as e:
+        if path or offline:
+            raise
+        logger.warning(f"No se pudo preparar chromedriver, cada worker lo resolverá al usarlo: {e}")
+        return None
+    logger.info(f"chromedriver: {resolved} ({version})")
+    return resolved
+
+
+def spool_artifact(content: Optional[bytes], suffix: str = '') -> Any:
+    if content is None or _handoff == HANDOFF_PIPE or len(content) < SPOOL_THRESHOLD:
+        return content
+    if _handoff == HANDOFF_SHM:
+        try:
+            # Al proceso padre solo vuelve el nombre del segmento
+            return SharedMemoryAttachment.create(content)
+        except OSError as e:
+            # /dev/shm lleno o no disponible (p. ej. 64 MB en Docker)
+            logger.warning(f"No se pudo usar memoria compartida, se usa disco: {e}")
+    if _spool_dir is None:
+        return content
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=_spool_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    # Al proceso padre solo vuelve la ruta
+    return FileAttachment(path)
+
+
+def _screenshot_response(screenshot: Optional[bytes], options: Dict[str, Any]) -> Dict[str, Any]:
+    # Bytes crudos: en v2 viajan como adjunto binario, en v1 se codifican en base64
+    return {
+        "screenshot": spool_artifact(screenshot, '.' + options['format']),
+        "format": options['format'],
+        "success": screenshot is not None
+    }
+
+
+def _performance_response(performance_data: Optional[Dict]) -> Dict[str, Any]:
+    return {
+        "performance": performance_data,
+        "success": performance_data is not None
+    }
 
 
 def process_screenshot_task(data: Dict[str, Any]) -> Dict[str, Any]:
     url = data.get('url')
     timeout = data.get('timeout', 30)
     
-    screenshot = generate_screenshot(url, timeout)
+    try:
+        options = parse_screenshot_options(data)
+        policy = parse_resource_policy(data.get('resource_policy'))
+    except (TypeError, ValueError) as e:
+        return {"error": f"Opciones de screenshot inválidas: {e}", "success": False}
     
-    return {
-        "screenshot": screenshot,
-        "success": screenshot is not None
-    }
+    screenshot = capture_screenshot(url, timeout, options, policy)
+    return _screenshot_response(screenshot, options)
 
 
 def process_performance_task(data: Dict[str, Any]) -> Dict[str, Any]:
     url = data.get('url')
     timeout = data.get('timeout', 30)
     
-    performance_data = analyze_performance(url, timeout)
+    try:
+        policy = parse_resource_policy(data.get('resource_policy'))
+    except (TypeError, ValueError) as e:
+        return {"error": str(e), "success": False}
     
-    return {
-        "performance": performance_data,
-        "success": performance_data is not None
-    }
+    return _performance_response(analyze_performance(url, timeout, policy))
+
+
+async def process_screenshot_task_async(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Variante Playwright: corre en el event loop del worker junto a otras páginas
+    url = data.get('url')
+    timeout = data.get('timeout', 30)
+    
+    try:
+        options = parse_screenshot_options(data)
+        policy = parse_resource_policy(data.get('resource_policy'))
+    except (TypeError, ValueError) as e:
+        return {"error": f"Opciones de screenshot inválidas: {e}", "success": False}
+    
+    screenshot = await get_engine().capture_screenshot(url, timeout, options, policy)
+    return _screenshot_response(screenshot, options)
+
+
+async def process_performance_task_async(data: Dict[str, Any]) -> Dict[str, Any]:
+    url = data.get('url')
+    timeout = data.get('timeout', 30)
+    
+    try:
+        policy = parse_resource_policy(data.get('resource_policy'))
+    except (TypeError, ValueError) as e:
+        return {"error": str(e), "success": False}
+    
+    return _performance_response(await get_engine().analyze_performance(url, timeout, policy))
 
 
 def process_images_task(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -52,7 +176,7 @@ def process_images_task(data: Dict[str, Any]) -> Dict[str, Any]:
     html_content = data.get('html_content', '')
     max_images = data.get('max_images', 5)
     
-    thumbnails = process_images(url, html_content, max_images)
+    thumbnails = process_images(url, html_content, max_images, raw=True)
     
     return {
         "thumbnails": thumbnails,
@@ -61,76 +185,309 @@ def process_images_task(data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-class ProcessingRequestHandler(socketserver.BaseRequestHandler):
+TASK_FUNCTIONS = {
+    MSG_TYPE_SCREENSHOT: process_screenshot_task,
+    MSG_TYPE_PERFORMANCE: process_performance_task,
+    MSG_TYPE_IMAGE_PROCESSING: process_images_task
+}
+
+# Con Playwright, las tareas de navegador son corrutinas
+PLAYWRIGHT_TASK_FUNCTIONS = {
+    MSG_TYPE_SCREENSHOT: process_screenshot_task_async,
+    MSG_TYPE_PERFORMANCE: process_performance_task_async
+}
+
+
+def default_pool_sizes(num_processes: int) -> Dict[str, int]:
+    # Reparte -n según DEFAULT_POOL_SHARES por mayores restos, así los tamaños
+    # suman -n. Cada pool tiene al menos un worker: con -n menor que la
+    # cantidad de pools, el total es uno por pool.
+    total = max(num_processes, len(DEFAULT_POOL_SHARES))
+    exact = {msg_type: total * share for msg_type, share in DEFAULT_POOL_SHARES.items()}
+    sizes = {msg_type: max(1, int(value)) for msg_type, value in exact.items()}
+    by_remainder = sorted(exact, key=lambda msg_type: exact[msg_type] - sizes[msg_type], reverse=True)
+    for msg_type in by_remainder[:total - sum(sizes.values())]:
+        sizes[msg_type] += 1
+    return sizes
+
+
+class ClientConnection:
+    # Una conexión puede enviar varios frames; se leen en una tarea aparte
+    # y se procesan en orden, respondiendo en el mismo orden
+    
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')
+        self.frames: asyncio.Queue = asyncio.Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        self.reader_task: Optional[asyncio.Task] = None
+        # Se activa cuando el cliente cierra la conexión (no en el apagado)
+        self.disconnected = asyncio.Event()
+
+
+class ProcessingServer:
     
-    def handle(self):
-        """Maneja una conexión entrante."""
-        client_address = self.client_address
-        logger.info(f"Nueva conexión desde {client_address}")
+    def __init__(self, host: str, port: int, num_processes: int = None,
+                 max_in_flight: int = None, drain_timeout: float = DRAIN_TIMEOUT,
+                 pool_sizes: Optional[Dict[str, int]] = None,
+                 handoff: str = HANDOFF_SHM, chromedriver: Optional[str] = None,
+                 engine: str = ENGINE_SELENIUM, pages_per_worker: int = DEFAULT_PAGES_PER_WORKER):
+        self.host = host
+        self.port = port
+        self.num_processes = num_processes or mp.cpu_count()
+        # Un pool independiente por clase de tarea; los tamaños no indicados
+        # se toman del reparto por defecto
+        self.pool_sizes = default_pool_sizes(self.num_processes)
+        self.pool_sizes.update({k: v for k, v in (pool_sizes or {}).items() if v})
+        # Límite de tareas en vuelo por clase (default: 2 x workers de la clase)
+        self.max_in_flight = max_in_flight
+        self.drain_timeout = drain_timeout
+        self.pools: Dict[str, SupervisedWorkerPool] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._in_flight: Dict[str, asyncio.Semaphore] = {}
+        self._connections: Set[ClientConnection] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._stop_event: Optional[asyncio.Event] = None
+        self.spool_dir: Optional[str] = None
+        self.handoff = handoff
+        self.chromedriver = chromedriver
+        self.engine = engine
+        self.pages_per_worker = pages_per_worker
+        self._http_in_flight: Optional[asyncio.Semaphore] = None
+    
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = ClientConnection(reader, writer)
+        logger.info(f"Nueva conexión desde {conn.peer}")
+        
+        self._connections.add(conn)
+        self._handlers.add(asyncio.current_task())
+        conn.reader_task = asyncio.create_task(self._read_frames(conn))
         
         try:
-            # Recibir mensaje
-            message = receive_message_sync(self.request)
-            msg_type = message.msg_type
-            data = message.data
-            
-            logger.info(f"Recibido mensaje de tipo: {msg_type}")
-            
-            # Procesar según el tipo
-            result = self.process_task(msg_type, data)
-            
-            # Enviar respuesta
-            send_message_sync(self.request, MSG_TYPE_RESPONSE, result)
-            logger.info(f"Respuesta enviada a {client_address}")
-            
+            while True:
+                message = await conn.frames.get()
+                if message is None:
+                    break
+                
+                logger.info(f"Recibido mensaje de tipo: {message.msg_type}")
+                response = await self._run_until_disconnect(conn, message.msg_type, message.data)
+                if response is None:
+                    logger.warning(f"Cliente {conn.peer} desconectado, tarea {message.msg_type} cancelada")
+                    break
+                response_type, result = response
+                # Se responde con la misma versión y codec del pedido; los
+                # artefactos del worker se transmiten por partes y después se liberan
+                try:
+                    await send_message_async(writer, response_type, result, message.version, message.codec)
+                finally:
+                    discard_attachments(result)
+                logger.info(f"Respuesta enviada a {conn.peer}")
+        except ConnectionError as e:
+            logger.warning(f"Conexión con {conn.peer} interrumpida: {e}")
         except Exception as e:
             logger.error(f"Error al procesar request: {e}")
+        finally:
+            conn.reader_task.cancel()
+            self._connections.discard(conn)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
             try:
-                error_data = {"error": str(e), "success": False}
-                send_message_sync(self.request, MSG_TYPE_ERROR, error_data)
+                await writer.wait_closed()
             except Exception:
                 pass
     
-    def process_task(self, msg_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        global process_pool
+    async def _run_until_disconnect(self, conn: ClientConnection, msg_type: str,
+                                    data: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        # Si el cliente se va mientras la tarea corre, se cancela: el pool
+        # mata al worker para no seguir gastando un proceso en una respuesta
+        # que nadie va a leer
+        job = asyncio.create_task(self.handle_message(msg_type, data))
+        disconnected = asyncio.create_task(conn.disconnected.wait())
+        try:
+            await asyncio.wait({job, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
         
-        # Seleccionar función según tipo
-        task_functions = {
-            MSG_TYPE_SCREENSHOT: process_screenshot_task,
-            MSG_TYPE_PERFORMANCE: process_performance_task,
-            MSG_TYPE_IMAGE_PROCESSING: process_images_task
-        }
+        if job.done():
+            return job.result()
+        
+        job.cancel()
+        await asyncio.gather(job, return_exceptions=True)
+        return None
+    
+    async def _read_frames(self, conn: ClientConnection):
+        try:
+            while True:
+                message = await receive_message_async(conn.reader)
+                await conn.frames.put(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # EOF o conexión cerrada por el cliente
+            conn.disconnected.set()
+        except asyncio.CancelledError:
+            # Apagado del servidor: no se leen más frames
+            pass
+        except Exception as e:
+            logger.error(f"Frame inválido desde {conn.peer}: {e}")
+        finally:
+            # El procesador termina lo encolado y cierra la conexión
+            await conn.frames.put(None)
+    
+    async def handle_message(self, msg_type: str, data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        # Health check del balanceador: se responde sin pasar por el pool
+        if msg_type == MSG_TYPE_PING:
+            return MSG_TYPE_RESPONSE, {"status": "ok", "success": True}
         
-        task_function = task_functions.get(msg_type)
+        if msg_type == MSG_TYPE_HELLO:
+            return MSG_TYPE_RESPONSE, negotiate(data)
+        
+        if msg_type == MSG_TYPE_STATS:
+            return MSG_TYPE_RESPONSE, {"pools": self.get_metrics(), "success": True}
+        
+        try:
+            result = await self.process_task(msg_type, data)
+            return MSG_TYPE_RESPONSE, result
+        except Exception as e:
+            logger.error(f"Error al procesar request: {e}")
+            return MSG_TYPE_ERROR, {"error": str(e), "success": False}
+    
+    async def process_task(self, msg_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        task_function = self.task_function(msg_type)
         if not task_function:
             logger.error(f"Tipo de tarea desconocido: {msg_type}")
             return {"error": f"Unknown task type: {msg_type}", "success": False}
         
+        if msg_type == MSG_TYPE_PERFORMANCE and data.get('mode', 'browser') != 'browser':
+            return await self.process_http_performance(data)
+        
+        timeout = data.get('timeout', 30) + 10  # +10 segundos de margen
+        
+        # Límite de tareas en vuelo: el resto espera acá sin ocupar threads
+        async with self._in_flight[msg_type]:
+            try:
+                # Si se vence el plazo, el pool mata al worker y lanza otro
+                result = await self.pools[msg_type].submit(task_function, data, timeout=timeout)
+                logger.info(f"Tarea {msg_type} completada exitosamente")
+                return result
+                
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout al procesar tarea {msg_type}")
+                return {"error": "Task timeout", "success": False}
+            except Exception as e:
+                logger.error(f"Error al ejecutar tarea {msg_type}: {e}")
+                return {"error": str(e), "success": False}
+    
+    def task_function(self, msg_type: str):
+        if self.engine == ENGINE_PLAYWRIGHT and msg_type in PLAYWRIGHT_TASK_FUNCTIONS:
+            return PLAYWRIGHT_TASK_FUNCTIONS[msg_type]
+        return TASK_FUNCTIONS.get(msg_type)
+    
+    def pool_concurrency(self, msg_type: str) -> int:
+        # Con Playwright cada worker atiende varias páginas a la vez
+        if self.engine == ENGINE_PLAYWRIGHT and msg_type in PLAYWRIGHT_TASK_FUNCTIONS:
+            return self.pages_per_worker
+        return 1
+    
+    async def process_http_performance(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        mode = data.get('mode')
+        if mode not in PERFORMANCE_MODES:
+            return {"error": f"Modo de rendimiento desconocido: {mode}", "success": False}
+        
+        # Solo I/O: no ocupa un worker del pool de navegadores
+        async with self._http_in_flight:
+            performance_data = await analyze_http_performance(data.get('url'), data.get('timeout', 30))
+        
+        return {
+            "performance": performance_data,
+            "success": performance_data is not None
+        }
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        # Métricas de cada pool y, por worker, su PID, tareas en curso,
+        # completadas, fallidas, timeouts, cancelaciones, caídas y reinicios
+        return {
+            msg_type: {**pool.get_metrics(), "worker_stats": pool.get_stats()}
+            for msg_type, pool in self.pools.items()
+        }
+    
+    def request_stop(self):
+        if not self._stop_event.is_set():
+            logger.info("Señal de apagado recibida, drenando tareas en curso...")
+            self._stop_event.set()
+    
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.spool_dir = tempfile.mkdtemp(prefix='tp2-spool-')
+        self._http_in_flight = asyncio.Semaphore(HTTP_PERFORMANCE_CONCURRENCY)
+        for msg_type, size in self.pool_sizes.items():
+            concurrency = self.pool_concurrency(msg_type)
+            self._in_flight[msg_type] = asyncio.Semaphore(self.max_in_flight or size * concurrency * 2)
+            self.pools[msg_type] = SupervisedWorkerPool(
+                size, name=msg_type, initializer=init_worker, initargs=(self.spool_dir, self.handoff, self.chromedriver),
+                concurrency=concurrency, finalizer=close_engine if concurrency > 1 else None
+            )
+        # Los pools arrancan a la vez; cada start() espera a que sus workers estén listos
+        await asyncio.gather(*(pool.start() for pool in self.pools.values()))
+        
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows o loop fuera del thread principal
+                pass
+        
         try:
-            # Ejecutar en el pool con timeout
-            timeout = data.get('timeout', 30) + 10  # +10 segundos de margen
-            future = process_pool.submit(task_function, data)
-            result = future.result(timeout=timeout)
-            
-            logger.info(f"Tarea {msg_type} completada exitosamente")
-            return result
-            
-        except FuturesTimeoutError:
-            logger.error(f"Timeout al procesar tarea {msg_type}")
-            return {"error": "Task timeout", "success": False}
-        except Exception as e:
-            logger.error(f"Error al ejecutar tarea {msg_type}: {e}")
-            return {"error": str(e), "success": False}
-
-
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    allow_reuse_address = True
-    daemon_threads = True
+            self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+            logger.info(f"Servidor de procesamiento escuchando en {self.host}:{self.port}")
+            await self._stop_event.wait()
+        finally:
+            await self.shutdown()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError):
+                    pass
+    
+    async def shutdown(self):
+        logger.info("Cerrando servidor de procesamiento...")
+        
+        # 1. Dejar de aceptar conexiones y de leer nuevos frames
+        if self.server:
+            self.server.close()
+        for conn in list(self._connections):
+            if conn.reader_task:
+                conn.reader_task.cancel()
+        
+        # 2. Esperar a que terminen las tareas ya recibidas
+        if self._handlers:
+            _, pending = await asyncio.wait(set(self._handlers), timeout=self.drain_timeout)
+            if pending:
+                logger.warning(f"{len(pending)} conexiones no terminaron a tiempo, se cancelan")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        # 3. Liberar los pools de procesos
+        for msg_type, pool in self.pools.items():
+            metrics = pool.get_metrics()
+            logger.info(f"Pool {msg_type}: {metrics['completed']} tareas, "
+                        f"{metrics['restarts']} reinicios, latencia {metrics['latency_ms']}")
+            await pool.shutdown()
+        
+        # 4. Borrar artefactos que no llegaron a enviarse
+        if self.spool_dir:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        logger.info("Servidor cerrado")
 
 
-def start_processing_server(host: str, port: int, num_processes: int = None):
-    global process_pool
-    
+def start_processing_server(host: str, port: int, num_processes: int = None,
+                            max_in_flight: int = None,
+                            pool_sizes: Optional[Dict[str, int]] = None,
+                            handoff: str = HANDOFF_SHM,
+                            chromedriver: Optional[str] = None,
+                            offline: bool = False,
+                            engine: str = ENGINE_SELENIUM,
+                            pages_per_worker: int = DEFAULT_PAGES_PER_WORKER):
     # Configurar logging
     logging.basicConfig(
         level=logging.INFO,
@@ -138,31 +495,21 @@ def start_processing_server(host: str, port: int, num_processes: int = None):
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
-    # Determinar número de procesos
-    if num_processes is None:
-        num_processes = mp.cpu_count()
+    # Chequeo de arranque: con una ruta explícita o --offline, un chromedriver
+    # inválido impide iniciar el servidor (Playwright usa su propio Chromium)
+    driver_path = prepare_chromedriver(chromedriver, offline) if engine == ENGINE_SELENIUM else None
     
-    logger.info(f"Iniciando servidor de procesamiento en {host}:{port}")
-    logger.info(f"Pool de procesos: {num_processes} workers")
+    server = ProcessingServer(host, port, num_processes, max_in_flight,
+                              pool_sizes=pool_sizes, handoff=handoff, chromedriver=driver_path,
+                              engine=engine, pages_per_worker=pages_per_worker)
     
-    # Crear pool de procesos
-    process_pool = ProcessPoolExecutor(max_workers=num_processes)
+    logger.info(f"Iniciando servidor de procesamiento en {host}:{port} (motor: {engine})")
+    for msg_type, size in server.pool_sizes.items():
+        logger.info(f"Pool {msg_type}: {size} workers x {server.pool_concurrency(msg_type)} tareas")
     
     try:
-        # Crear y arrancar servidor
-        server = ThreadedTCPServer((host, port), ProcessingRequestHandler)
-        logger.info(f"Servidor de procesamiento escuchando en {host}:{port}")
-        
-        # Ejecutar servidor
-        server.serve_forever()
-        
+        asyncio.run(server.serve())
     except KeyboardInterrupt:
         logger.info("Servidor interrumpido por el usuario")
     except Exception as e:
         logger.error(f"Error en el servidor: {e}")
-    finally:
-        # Cleanup
-        logger.info("Cerrando servidor de procesamiento...")
-        if process_pool:
-            process_pool.shutdown(wait=True)
-        logger.info("Servidor cerrado")
\ No newline at end of file
@@ -1,45 +1,100 @@
 import base64
 import logging
 from io import BytesIO
-from typing import Optional
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from typing import Any, Dict, Optional
 from selenium.common.exceptions import WebDriverException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
+from common.protocol import SCREENSHOT_FORMATS
+from processor.browser import create_chrome_driver
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_VIEWPORT = (1920, 1080)
+DEFAULT_QUALITY = 80
+# Límite de alto para capturas de página completa (WebP admite hasta 16383 px)
+MAX_CAPTURE_HEIGHT = 16000
+
+
+def parse_screenshot_options(data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Normaliza las opciones del pedido; sin opciones se obtiene el PNG
+    # 1920x1080 de siempre
+    data = data or {}
+    image_format = str(data.get('format') or 'png').lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in SCREENSHOT_FORMATS:
+        raise ValueError(f"Formato de screenshot no soportado: {image_format}")
+    
+    preview_width = data.get('preview_width')
+    preview_height = data.get('preview_height')
+    return {
+        "format": image_format,
+        "quality": max(1, min(100, int(data.get('quality') or DEFAULT_QUALITY))),
+        "width": int(data.get('width') or DEFAULT_VIEWPORT[0]),
+        "height": int(data.get('height') or DEFAULT_VIEWPORT[1]),
+        "preview_width": int(preview_width) if preview_width else None,
+        "preview_height": int(preview_height) if preview_height else None,
+        "full_page": bool(data.get('full_page', False))
+    }
+
+
+def capture_params(options: Dict[str, Any], content_height: int) -> Dict[str, Any]:
+    # Parámetros de Page.captureScreenshot: Chrome recorta, escala y codifica
+    # en el formato pedido, sin pasar por un PNG intermedio
+    width = options['width']
+    if options['full_page']:
+        height = max(1, min(content_height, MAX_CAPTURE_HEIGHT))
+    else:
+        # Solo lo visible sin scroll (above the fold)
+        height = options['height']
+    
+    scale = 1.0
+    if options['preview_width']:
+        scale = min(scale, options['preview_width'] / width)
+    if options['preview_height']:
+        scale = min(scale, options['preview_height'] / height)
+    
+    params = {
+        "format": options['format'],
+        "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": scale},
+        "captureBeyondViewport": options['full_page']
+    }
+    if options['format'] != 'png':
+        params['quality'] = options['quality']
+    return params
+
 
 def generate_screenshot(url: str, timeout: int = 30) -> Optional[str]:
+    screenshot_bytes = capture_screenshot(url, timeout)
+    if screenshot_bytes is None:
+        return None
+    return base64.b64encode(screenshot_bytes).decode('utf-8')
+
+
+def capture_screenshot(url: str, timeout: int = 30,
+                       options: Optional[Dict[str, Any]] = None,
+                       policy: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+    options = options or parse_screenshot_options()
     driver = None
     try:
         logger.info(f"Generando screenshot para: {url}")
         
-        # Configurar opciones de Chrome en modo headless
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-popup-blocking")
-        
-        # Inicializar el driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(timeout)
+        # Inicializar el driver (con la política de recursos del pedido)
+        driver = create_chrome_driver(timeout, (options['width'], options['height']), policy)
         
         # Cargar la página
         driver.get(url)
         
         # Tomar screenshot
-        screenshot_bytes = driver.get_screenshot_as_png()
-        screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
+        content_height = 0
+        if options['full_page']:
+            metrics = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})
+            content_height = int(metrics.get('cssContentSize', metrics['contentSize'])['height'])
+        result = driver.execute_cdp_cmd('Page.captureScreenshot', capture_params(options, content_height))
+        screenshot_bytes = base64.b64decode(result['data'])
         
-        logger.info(f"Screenshot generado exitosamente para: {url}")
-        return screenshot_base64
+        logger.info(f"Screenshot {options['format']} generado exitosamente para: {url} "
+                    f"({len(screenshot_bytes) / 1024:.0f} KB)")
+        return screenshot_bytes
         
     except TimeoutException:
         logger.error(f"Timeout al cargar la página: {url}")
@@ -59,34 +114,8 @@ def generate_screenshot(url: str, timeout: int = 30) -> Optional[str]:
 
 
 def generate_screenshot_with_dimensions(url: str, width: int = 1920, height: int = 1080, timeout: int = 30) -> Optional[str]:
-    driver = None
-    try:
-        logger.info(f"Generando screenshot personalizado para: {url} ({width}x{height})")
-        
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument(f"--window-size={width},{height}")
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(timeout)
-        
-        driver.get(url)
-        screenshot_bytes = driver.get_screenshot_as_png()
-        screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-        
-        logger.info(f"Screenshot personalizado generado exitosamente")
-        return screenshot_base64
-        
-    except Exception as e:
-        logger.error(f"Error al generar screenshot personalizado: {e}")
+    logger.info(f"Generando screenshot personalizado para: {url} ({width}x{height})")
+    screenshot_bytes = capture_screenshot(url, timeout, parse_screenshot_options({"width": width, "height": height}))
+    if screenshot_bytes is None:
         return None
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception as e:
-                logger.error(f"Error al cerrar driver: {e}")
\ No newline at end of file
+    return base64.b64encode(screenshot_bytes).decode('utf-8')
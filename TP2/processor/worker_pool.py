@@ -0,0 +1,503 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import signal
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from common.protocol import discard_attachments
+
+logger = logging.getLogger(__name__)
+
+# Tiempo de espera para que un worker termine al apagar el pool
+SHUTDOWN_TIMEOUT = 5.0
+# Cantidad de tareas recientes usadas para las métricas de latencia
+LATENCY_WINDOW = 500
+# Mensaje del padre para cancelar una tarea en un worker concurrente; el
+# worker lo devuelve cuando la tarea ya no corre
+CANCEL_JOB = "cancel"
+# Espera máxima por esa confirmación antes de matar al worker (su event loop
+# está bloqueado y no puede cancelar nada)
+CANCEL_GRACE = 2.0
+# Mensaje del worker cuando terminó de arrancar (imports e initializer)
+WORKER_READY = "ready"
+# Espera máxima por ese aviso al iniciar el pool
+STARTUP_TIMEOUT = 30.0
+# Un worker que muere antes de avisar se relanza con espera exponencial
+# (0,5 s, 1 s, 2 s...); tras MAX_STARTUP_FAILURES seguidas la posición queda
+# fuera del pool
+RESPAWN_BACKOFF = 0.5
+RESPAWN_BACKOFF_MAX = 30.0
+MAX_STARTUP_FAILURES = 5
+
+
+class WorkerCrashedError(RuntimeError):
+    pass
+
+
+def _latency_summary(samples) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"avg": None, "p50": None, "p95": None}
+    ordered = sorted(samples)
+    return {
+        "avg": round(sum(ordered) / len(ordered) * 1000, 1),
+        "p50": round(ordered[len(ordered) // 2] * 1000, 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1)
+    }
+
+
+async def _run_async_worker(conn):
+    # Worker concurrente: las tareas son corrutinas que comparten un event
+    # loop (p. ej. varias páginas de un mismo navegador)
+    loop = asyncio.get_running_loop()
+    tasks: Dict[int, asyncio.Task] = {}
+    closed = loop.create_future()
+    
+    async def run(job_id, func, data):
+        try:
+            result = func(data)
+            if inspect.isawaitable(result):
+                result = await result
+            conn.send((job_id, True, result))
+        except asyncio.CancelledError:
+            # El padre ya no espera el resultado
+            pass
+        except Exception as e:
+            conn.send((job_id, False, f"{type(e).__name__}: {e}"))
+        finally:
+            tasks.pop(job_id, None)
+    
+    def confirm_cancel(job_id):
+        try:
+            conn.send((CANCEL_JOB, job_id))
+        except (BrokenPipeError, OSError):
+            pass
+    
+    def stop():
+        loop.remove_reader(conn.fileno())
+        if not closed.done():
+            closed.set_result(None)
+    
+    def on_message():
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message is None:
+                    return stop()
+                if message[0] == CANCEL_JOB:
+                    job_id = message[1]
+                    task = tasks.get(job_id)
+                    if task:
+                        task.cancel()
+                        task.add_done_callback(lambda _, job_id=job_id: confirm_cancel(job_id))
+                    else:
+                        # Ya había terminado
+                        confirm_cancel(job_id)
+                    continue
+                job_id, func, data = message
+                tasks[job_id] = loop.create_task(run(job_id, func, data))
+        except (EOFError, OSError):
+            stop()
+    
+    loop.add_reader(conn.fileno(), on_message)
+    await closed
+    # Al apagar se terminan las tareas ya recibidas
+    if tasks:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+def _worker_main(conn, initializer: Optional[Callable], initargs: Tuple,
+                 concurrency: int = 1, finalizer: Optional[Callable] = None):
+    # Cada worker es líder de su propio grupo de procesos: así el supervisor
+    # puede matar también a los hijos que lance (chromedriver, Chrome)
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    # Ctrl+C lo maneja el proceso padre, que drena y apaga el pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    if initializer:
+        initializer(*initargs)
+    conn.send(WORKER_READY)
+    
+    if concurrency > 1:
+        async def serve():
+            await _run_async_worker(conn)
+            if finalizer:
+                await finalizer()
+        
+        asyncio.run(serve())
+        conn.close()
+        return
+    
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        
+        job_id, func, data = message
+        try:
+            conn.send((job_id, True, func(data)))
+        except Exception as e:
+            conn.send((job_id, False, f"{type(e).__name__}: {e}"))
+    
+    conn.close()
+
+
+class Worker:
+
+    def __init__(self, slot: int, process, conn):
+        self.slot = slot
+        self.process = process
+        self.conn = conn
+        self.dead = False
+        # True desde el aviso WORKER_READY
+        self.started = False
+        # True cuando ya se lo mató y su reemplazo está lanzado o programado
+        self.replaced = False
+        # Tareas en curso: job_id -> (future, inicio)
+        self.jobs: Dict[int, Tuple[asyncio.Future, float]] = {}
+        # Tareas canceladas cuya confirmación todavía no llegó
+        self.cancelling: Set[int] = set()
+    
+    @property
+    def busy(self) -> bool:
+        return bool(self.jobs)
+
+
+class WorkerSlotStats:
+    # Estadísticas por posición del pool; sobreviven a los reinicios del worker
+    
+    def __init__(self):
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.timeouts = 0
+        self.cancellations = 0
+        self.crashes = 0
+        self.restarts = 0
+        # Caídas seguidas antes de WORKER_READY; vuelve a 0 cuando un worker arranca
+        self.startup_failures = 0
+
+
+class SupervisedWorkerPool:
+
+    def __init__(self, num_workers: int, name: str = "pool",
+                 initializer: Optional[Callable] = None, initargs: Tuple = (),
+                 mp_context: str = "spawn", concurrency: int = 1,
+                 finalizer: Optional[Callable] = None):
+        self.num_workers = num_workers
+        self.name = name
+        self.initializer = initializer
+        self.initargs = initargs
+        # Tareas simultáneas por worker; con más de una, las funciones pueden
+        # ser corrutinas y el worker las corre en un event loop propio
+        self.concurrency = max(1, concurrency)
+        self.finalizer = finalizer
+        # spawn evita que cada worker herede los pipes de los demás y los
+        # sockets del servidor
+        self._ctx = mp.get_context(mp_context)
+        self._workers: List[Optional[Worker]] = [None] * num_workers
+        self._stats = [WorkerSlotStats() for _ in range(num_workers)]
+        self._idle: Optional[asyncio.Queue] = None
+        self._job_ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+        # Por posición: se resuelve cuando un worker arranca, o con error si
+        # la posición queda fuera del pool
+        self._slot_ready: List[asyncio.Future] = []
+        # Métricas del pool completo
+        self._waiting = 0
+        self._queue_waits = deque(maxlen=LATENCY_WINDOW)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+    
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        self._slot_ready = [self._loop.create_future() for _ in range(self.num_workers)]
+        workers = [self._spawn(slot, enqueue=False) for slot in range(self.num_workers)]
+        # Lugares intercalados: las primeras tareas se reparten entre workers
+        for _ in range(self.concurrency):
+            for worker in workers:
+                self._idle.put_nowait(worker)
+        # El pool queda listo cuando todos los workers arrancaron: la primera
+        # tarea no paga el arranque en frío. Un worker que muere al arrancar
+        # se relanza con espera (_replace) hasta MAX_STARTUP_FAILURES veces.
+        done, pending = await asyncio.wait(self._slot_ready, timeout=STARTUP_TIMEOUT)
+        failed = [f.exception() for f in done if f.exception()]
+        if failed:
+            await self.shutdown(wait=False)
+            raise failed[0]
+        if pending:
+            logger.warning(f"Pool {self.name}: {len(pending)} workers no terminaron de arrancar en {STARTUP_TIMEOUT}s")
+        logger.info(f"Pool {self.name}: {self.num_workers} workers iniciados")
+    
+    def _spawn(self, slot: int, enqueue: bool = True) -> Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.initializer, self.initargs, self.concurrency, self.finalizer),
+            name=f"{self.name}-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        
+        worker = Worker(slot, process, parent_conn)
+        self._workers[slot] = worker
+        self._loop.add_reader(parent_conn.fileno(), self._on_readable, worker)
+        # Un lugar libre en la cola por cada tarea que acepta el worker
+        if enqueue:
+            for _ in range(self.concurrency):
+                self._idle.put_nowait(worker)
+        return worker
+    
+    def _on_readable(self, worker: Worker):
+        try:
+            while worker.conn.poll():
+                message = worker.conn.recv()
+                if message == WORKER_READY:
+                    worker.started = True
+                    self._stats[worker.slot].startup_failures = 0
+                    if not self._slot_ready[worker.slot].done():
+                        self._slot_ready[worker.slot].set_result(None)
+                    continue
+                if message[0] == CANCEL_JOB:
+                    worker.cancelling.discard(message[1])
+                    continue
+                job_id, ok, payload = message
+                future = worker.jobs.get(job_id, (None, 0))[0]
+                if future is None or future.done():
+                    # Resultado tardío (timeout o cancelación): nadie va a
+                    # enviar sus adjuntos, se liberan acá
+                    if ok:
+                        discard_attachments(payload)
+                    continue
+                if ok:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload))
+        except (EOFError, OSError):
+            # El proceso murió (segfault, OOM killer, kill externo)
+            self._loop.remove_reader(worker.conn.fileno())
+            worker.dead = True
+            self._stats[worker.slot].crashes += 1
+            logger.error(f"Pool {self.name}: worker {worker.slot} (PID {worker.process.pid}) terminó inesperadamente")
+            if worker.jobs:
+                self._fail_jobs(worker, "Worker process died")
+            elif not self._closed:
+                # Estaba libre: se reemplaza directamente
+                self._replace(worker)
+    
+    def _fail_jobs(self, worker: Worker, reason: str):
+        for future, _ in worker.jobs.values():
+            if not future.done():
+                future.set_exception(WorkerCrashedError(reason))
+    
+    def _kill(self, worker: Worker):
+        worker.dead = True
+        # Las demás tareas del worker se pierden con él
+        self._fail_jobs(worker, "Worker process restarted")
+        try:
+            self._loop.remove_reader(worker.conn.fileno())
+        except (ValueError, OSError):
+            pass
+        try:
+            os.killpg(worker.process.pid, signal.SIGKILL)
+        except (AttributeError, ProcessLookupError, PermissionError, OSError):
+            worker.process.kill()
+        worker.process.join(timeout=1)
+        worker.conn.close()
+    
+    def _replace(self, worker: Worker):
+        # Mata al worker (con todo su grupo de procesos) y lanza uno nuevo en su lugar
+        if self._workers[worker.slot] is not worker or worker.replaced:
+            # Ya lo reemplazó otra de sus tareas
+            return
+        worker.replaced = True
+        self._kill(worker)
+        if self._closed:
+            return
+        stats = self._stats[worker.slot]
+        if worker.started:
+            self._respawn(worker.slot)
+            return
+        # Murió al arrancar (import o initializer que falla, OOM): relanzarlo
+        # enseguida lo haría fallar en un bucle sin fin
+        stats.startup_failures += 1
+        if stats.startup_failures >= MAX_STARTUP_FAILURES:
+            self._fail_slot(worker.slot)
+            return
+        delay = min(RESPAWN_BACKOFF_MAX, RESPAWN_BACKOFF * 2 ** (stats.startup_failures - 1))
+        logger.warning(f"Pool {self.name}: worker {worker.slot} murió al arrancar "
+                       f"({stats.startup_failures} veces seguidas), se relanza en {delay:g}s")
+        self._loop.call_later(delay, self._respawn, worker.slot)
+    
+    def _respawn(self, slot: int):
+        if self._closed:
+            return
+        self._stats[slot].restarts += 1
+        new_worker = self._spawn(slot)
+        logger.info(f"Pool {self.name}: worker {slot} reiniciado (PID {new_worker.process.pid})")
+    
+    def _fail_slot(self, slot: int):
+        error = WorkerCrashedError(f"Pool {self.name}: worker {slot} murió {MAX_STARTUP_FAILURES} veces al arrancar")
+        logger.error(f"{error}, queda fuera del pool")
+        if not self._slot_ready[slot].done():
+            self._slot_ready[slot].set_exception(error)
+            # Lo lee start(); después del arranque nadie más lo espera
+            self._slot_ready[slot].exception()
+    
+    async def _acquire(self) -> Worker:
+        while True:
+            worker = await self._idle.get()
+            if not worker.dead:
+                return worker
+    
+    async def submit(self, func: Callable, data: Any, timeout: Optional[float] = None) -> Any:
+        if self._closed:
+            raise RuntimeError(f"Pool {self.name} cerrado")
+        if all(s.startup_failures >= MAX_STARTUP_FAILURES for s in self._stats):
+            raise WorkerCrashedError(f"Pool {self.name}: ningún worker pudo arrancar")
+        
+        submitted = time.monotonic()
+        self._waiting += 1
+        try:
+            worker = await self._acquire()
+        finally:
+            self._waiting -= 1
+        self._queue_waits.append(time.monotonic() - submitted)
+        stats = self._stats[worker.slot]
+        
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        worker.jobs[job_id] = (future, time.monotonic())
+        healthy = False
+        
+        try:
+            worker.conn.send((job_id, func, data))
+            result = await asyncio.wait_for(future, timeout=timeout)
+            healthy = True
+            stats.jobs_completed += 1
+            return result
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            if self.concurrency > 1 and not worker.dead:
+                # Como una cancelación: solo esa tarea, las demás del worker siguen
+                healthy = self._cancel_job(worker, job_id)
+            if healthy:
+                logger.warning(f"Pool {self.name}: tarea excedió {timeout}s en worker {worker.slot}, se cancela")
+            else:
+                logger.error(f"Pool {self.name}: worker {worker.slot} excedió {timeout}s, se reinicia")
+            raise
+        except asyncio.CancelledError:
+            # El cliente se desconectó o el servidor cancela la tarea
+            stats.cancellations += 1
+            if self.concurrency > 1 and not worker.dead:
+                # Se cancela solo esa tarea; las demás del worker siguen
+                healthy = self._cancel_job(worker, job_id)
+            if not healthy:
+                logger.warning(f"Pool {self.name}: tarea cancelada en worker {worker.slot}, se reinicia")
+            raise
+        except WorkerCrashedError:
+            stats.jobs_failed += 1
+            raise
+        except RuntimeError:
+            # Excepción dentro de la función: el worker sigue sano
+            healthy = True
+            stats.jobs_failed += 1
+            raise
+        finally:
+            self._latencies.append(time.monotonic() - submitted)
+            worker.jobs.pop(job_id, None)
+            if healthy and not worker.dead:
+                self._idle.put_nowait(worker)
+            else:
+                self._replace(worker)
+    
+    def _cancel_job(self, worker: Worker, job_id: int) -> bool:
+        # Pide al worker que cancele la tarea; si no lo confirma en
+        # CANCEL_GRACE segundos, su event loop está bloqueado y se reinicia
+        try:
+            worker.conn.send((CANCEL_JOB, job_id))
+        except (BrokenPipeError, OSError):
+            return False
+        worker.cancelling.add(job_id)
+        self._loop.call_later(CANCEL_GRACE, self._check_cancel, worker, job_id)
+        return True
+    
+    def _check_cancel(self, worker: Worker, job_id: int):
+        if job_id not in worker.cancelling or worker.dead or self._closed:
+            return
+        logger.error(f"Pool {self.name}: worker {worker.slot} no confirmó la cancelación en {CANCEL_GRACE}s, se reinicia")
+        self._replace(worker)
+    
+    def get_stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        stats = []
+        for worker, slot_stats in zip(self._workers, self._stats):
+            if worker is None:
+                continue
+            stats.append({
+                "slot": worker.slot,
+                "pid": worker.process.pid,
+                "alive": worker.process.is_alive(),
+                "busy": worker.busy,
+                "jobs_running": len(worker.jobs),
+                "job_runtime_s": round(now - min(started for _, started in worker.jobs.values()), 3)
+                if worker.jobs else None,
+                "jobs_completed": slot_stats.jobs_completed,
+                "jobs_failed": slot_stats.jobs_failed,
+                "timeouts": slot_stats.timeouts,
+                "cancellations": slot_stats.cancellations,
+                "crashes": slot_stats.crashes,
+                "restarts": slot_stats.restarts,
+                "startup_failures": slot_stats.startup_failures,
+                "failed": slot_stats.startup_failures >= MAX_STARTUP_FAILURES
+            })
+        return stats
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        busy = sum(1 for w in self._workers if w is not None and w.busy)
+        return {
+            "workers": self.num_workers,
+            "concurrency": self.concurrency,
+            "busy": busy,
+            "running": sum(len(w.jobs) for w in self._workers if w is not None),
+            "queued": self._waiting,
+            "completed": sum(s.jobs_completed for s in self._stats),
+            "failed": sum(s.jobs_failed + s.timeouts for s in self._stats),
+            "restarts": sum(s.restarts for s in self._stats),
+            "queue_wait_ms": _latency_summary(self._queue_waits),
+            "latency_ms": _latency_summary(self._latencies)
+        }
+    
+    async def shutdown(self, wait: bool = True):
+        self._closed = True
+        for worker in self._workers:
+            if worker is None or worker.dead:
+                continue
+            try:
+                self._loop.remove_reader(worker.conn.fileno())
+            except (ValueError, OSError):
+                pass
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        
+        for worker in self._workers:
+            if worker is None or worker.dead:
+                continue
+            if wait:
+                await self._loop.run_in_executor(None, worker.process.join, SHUTDOWN_TIMEOUT)
+            if worker.process.is_alive():
+                self._kill(worker)
+            else:
+                worker.conn.close()
+        logger.info(f"Pool {self.name} cerrado")
@@ -1,8 +1,13 @@
 import asyncio
 import logging
 import json
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import sys
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from aiohttp import web
 from urllib.parse import urlparse
 
@@ -10,21 +15,40 @@ from urllib.parse import urlparse
 from .async_http import download_page_with_metadata
 from .html_parser import parse_html
 from .metadata_extractor import get_all_metadata
-from .task_manager import TaskManager, TaskStatus
-from common.socket_client import AsyncSocketClient
-from common.protocol import MSG_TYPE_SCREENSHOT, MSG_TYPE_PERFORMANCE, MSG_TYPE_IMAGE_PROCESSING
+from .task_manager import TaskManager, TaskStatus, create_shared_task_store
+from .backend_pool import ProcessingBackendPool
+from common.serialization import ensure_base64
+from common.protocol import (
+    MSG_TYPE_SCREENSHOT, MSG_TYPE_PERFORMANCE, MSG_TYPE_IMAGE_PROCESSING, SCREENSHOT_FORMATS,
+    PERFORMANCE_MODES, FileAttachment, FileSink
+)
 
 logger = logging.getLogger(__name__)
 
 
 class ScrapingServer:
-    def __init__(self, host: str, port: int, processing_host: str, processing_port: int):
+    def __init__(self, host: str, port: int, processing_host: str, processing_port: int,
+                 task_store=None, reuse_port: bool = False,
+                 processing_backends: Optional[List[Tuple[str, int]]] = None,
+                 artifacts_dir: Optional[str] = None):
         self.host = host
         self.port = port
         self.processing_host = processing_host
         self.processing_port = processing_port
+        self.reuse_port = reuse_port
         self.app = web.Application()
-        self.task_manager = TaskManager()
+        self.task_manager = TaskManager(store=task_store)
+        
+        # Sin lista explícita se usa un único servidor de procesamiento
+        if not processing_backends:
+            processing_backends = [(processing_host, processing_port)]
+        self.backend_pool = ProcessingBackendPool(processing_backends)
+        
+        # Con un directorio de artefactos los screenshots se escriben a disco
+        # a medida que llegan y /result devuelve la URL en lugar del base64
+        self.artifacts_dir = artifacts_dir
+        if artifacts_dir:
+            os.makedirs(artifacts_dir, exist_ok=True)
         
         # Configurar rutas
         self._setup_routes()
@@ -35,6 +59,9 @@ class ScrapingServer:
         self.app.router.add_get('/status/{task_id}', self.handle_status)
         self.app.router.add_get('/result/{task_id}', self.handle_result)
         self.app.router.add_get('/tasks', self.handle_tasks)
+        self.app.router.add_get('/backends', self.handle_backends)
+        if self.artifacts_dir:
+            self.app.router.add_get('/artifacts/{name}', self.handle_artifact)
     
     async def handle_root(self, request: web.Request) -> web.Response:
         info = {
@@ -42,9 +69,17 @@ class ScrapingServer:
             "version": "1.0.0",
             "endpoints": {
                 "/scrape?url=<URL>": "Iniciar scraping de una URL (devuelve task_id)",
+                "/scrape?url=<URL>&screenshot_format=webp&screenshot_quality=70&preview_width=480&full_page=1":
+                    "Opciones del screenshot: formato, calidad, preview reducido y página completa",
+                "/scrape?url=<URL>&resource_policy=lean&block_domains=a.com,b.com":
+                    "Recursos que no descargan los navegadores (none, lean, minimal)",
+                "/scrape?url=<URL>&performance_mode=http":
+                    "Rendimiento sin navegador (solo HTTP), más barato que Chrome",
                 "/status/<task_id>": "Consultar estado de una tarea",
                 "/result/<task_id>": "Obtener resultado de una tarea completada",
-                "/tasks": "Listar todas las tareas"
+                "/tasks": "Listar todas las tareas",
+                "/backends": "Estado de los servidores de procesamiento",
+                "/artifacts/<nombre>": "Screenshot guardado en disco (con --artifacts-dir)"
             }
         }
         return web.json_response(info)
@@ -65,11 +100,30 @@ class ScrapingServer:
                 status=400
             )
         
+        try:
+            screenshot_options = self._parse_screenshot_options(request.query)
+        except ValueError as e:
+            return web.json_response(
+                {"error": f"Invalid screenshot options: {e}"},
+                status=400
+            )
+        
+        resource_policy = self._parse_resource_policy(request.query)
+        
+        performance_mode = request.query.get('performance_mode') or None
+        if performance_mode and performance_mode not in PERFORMANCE_MODES:
+            return web.json_response(
+                {"error": f"Invalid performance_mode (use {', '.join(PERFORMANCE_MODES)})"},
+                status=400
+            )
+        
         # Crear tarea
         task_id = await self.task_manager.create_task(url)
         
         # Iniciar procesamiento en background
-        asyncio.create_task(self._process_scraping_task(task_id, url))
+        asyncio.create_task(self._process_scraping_task(
+            task_id, url, screenshot_options, resource_policy, performance_mode
+        ))
         
         # Devolver task_id inmediatamente
         return web.json_response({
@@ -122,7 +176,13 @@ class ScrapingServer:
             "by_status": counts
         })
     
-    async def _process_scraping_task(self, task_id: str, url: str):
+    async def handle_backends(self, request: web.Request) -> web.Response:
+        return web.json_response({"backends": self.backend_pool.get_stats()})
+    
+    async def _process_scraping_task(self, task_id: str, url: str,
+                                     screenshot_options: Optional[Dict[str, Any]] = None,
+                                     resource_policy: Any = None,
+                                     performance_mode: Optional[str] = None):
         try:
             logger.info(f"Iniciando procesamiento de tarea {task_id}")
             
@@ -136,7 +196,10 @@ class ScrapingServer:
             
             # Fase 2: Procesamiento
             await self.task_manager.update_task_status(task_id, TaskStatus.PROCESSING)
-            processing_data = await self._do_processing(url, scraping_data.get('html_content', ''))
+            processing_data = await self._do_processing(
+                task_id, url, scraping_data.get('html_content', ''), screenshot_options, resource_policy,
+                performance_mode
+            )
             
             # Consolidar resultado
             result = {
@@ -191,7 +254,56 @@ class ScrapingServer:
             logger.error(f"Error in scraping: {e}")
             return None
     
-    async def _do_processing(self, url: str, html_content: str) -> Dict[str, Any]:
+    async def handle_artifact(self, request: web.Request) -> web.StreamResponse:
+        name = os.path.basename(request.match_info['name'])
+        path = os.path.join(self.artifacts_dir, name)
+        if not os.path.isfile(path):
+            return web.json_response({"error": "Artifact not found"}, status=404)
+        # FileResponse lo envía desde disco (sendfile) sin cargarlo en memoria
+        return web.FileResponse(path)
+    
+    def _parse_screenshot_options(self, query) -> Dict[str, Any]:
+        # Opciones que se reenvían al Servidor B (que las valida del todo)
+        options = {}
+        image_format = query.get('screenshot_format')
+        if image_format:
+            image_format = image_format.lower().replace('jpg', 'jpeg')
+            if image_format not in SCREENSHOT_FORMATS:
+                raise ValueError(f"format must be one of {', '.join(SCREENSHOT_FORMATS)}")
+            options['format'] = image_format
+        for param, key in (('screenshot_quality', 'quality'), ('preview_width', 'preview_width'),
+                           ('preview_height', 'preview_height')):
+            if query.get(param):
+                value = int(query[param])
+                if value <= 0:
+                    raise ValueError(f"{param} must be positive")
+                options[key] = value
+        if query.get('full_page', '').lower() in ('1', 'true', 'yes'):
+            options['full_page'] = True
+        return options
+    
+    def _parse_resource_policy(self, query) -> Any:
+        # Política de recursos para los navegadores del Servidor B: el nombre
+        # de una predefinida, opcionalmente con dominios extra a bloquear
+        preset = query.get('resource_policy') or None
+        block_domains = [d for d in query.get('block_domains', '').split(',') if d.strip()]
+        if not block_domains:
+            return preset
+        return {"preset": preset or "none", "block_domains": block_domains}
+    
+    def _screenshot_sink(self, task_id: str, image_format: str):
+        if not self.artifacts_dir:
+            return None
+        path = os.path.join(self.artifacts_dir, f"{task_id}-screenshot.{image_format}")
+        return lambda index: FileSink(path)
+    
+    async def _do_processing(self, task_id: str, url: str, html_content: str,
+                             screenshot_options: Optional[Dict[str, Any]] = None,
+                             resource_policy: Any = None,
+                             performance_mode: Optional[str] = None) -> Dict[str, Any]:
+        screenshot_options = screenshot_options or {}
+        browser_options = {"resource_policy": resource_policy} if resource_policy else {}
+        performance_options = {"mode": performance_mode} if performance_mode else {}
         processing_data = {
             "screenshot": None,
             "performance": None,
@@ -199,34 +311,39 @@ class ScrapingServer:
         }
         
         try:
-            # Crear cliente socket
-            client = AsyncSocketClient(self.processing_host, self.processing_port)
-            
-            # Screenshot
-            screenshot_result = await client.send_request(
-                MSG_TYPE_SCREENSHOT,
-                {"url": url, "timeout": 30}
+            # Las tres tareas son independientes: se despachan en paralelo y el
+            # pool elige un servidor de procesamiento para cada una
+            screenshot_result, performance_result, image_result = await asyncio.gather(
+                self.backend_pool.send_request(
+                    MSG_TYPE_SCREENSHOT,
+                    {"url": url, "timeout": 30, **screenshot_options, **browser_options},
+                    self._screenshot_sink(task_id, screenshot_options.get('format', 'png'))
+                ),
+                self.backend_pool.send_request(
+                    MSG_TYPE_PERFORMANCE,
+                    {"url": url, "timeout": 30, **browser_options, **performance_options}
+                ),
+                self.backend_pool.send_request(
+                    MSG_TYPE_IMAGE_PROCESSING,
+                    {"url": url, "html_content": html_content, "max_images": 5}
+                )
             )
+            
             if screenshot_result and screenshot_result.get('success'):
-                processing_data['screenshot'] = screenshot_result.get('screenshot')
+                screenshot = screenshot_result.get('screenshot')
+                processing_data['screenshot_format'] = screenshot_result.get('format', 'png')
+                if isinstance(screenshot, FileAttachment):
+                    processing_data['screenshot_url'] = f"/artifacts/{os.path.basename(screenshot.path)}"
+                else:
+                    processing_data['screenshot'] = ensure_base64(screenshot)
             
-            # Performance
-            performance_result = await client.send_request(
-                MSG_TYPE_PERFORMANCE,
-                {"url": url, "timeout": 30}
-            )
             if performance_result and performance_result.get('success'):
                 processing_data['performance'] = performance_result.get('performance')
             
-            # Image processing
-            image_result = await client.send_request(
-                MSG_TYPE_IMAGE_PROCESSING,
-                {"url": url, "html_content": html_content, "max_images": 5}
-            )
             if image_result and image_result.get('success'):
-                processing_data['thumbnails'] = image_result.get('thumbnails', [])
-            
-            await client.close()
+                processing_data['thumbnails'] = [
+                    ensure_base64(t) for t in image_result.get('thumbnails', [])
+                ]
             
         except Exception as e:
             logger.error(f"Error in processing: {e}")
@@ -243,20 +360,82 @@ class ScrapingServer:
     async def start(self):
         runner = web.AppRunner(self.app)
         await runner.setup()
-        site = web.TCPSite(runner, self.host, self.port)
+        # Con reuse_port varios procesos escuchan en el mismo puerto (SO_REUSEPORT)
+        # y el kernel reparte las conexiones entre ellos
+        site = web.TCPSite(runner, self.host, self.port, reuse_port=self.reuse_port or None)
         await site.start()
+        self.backend_pool.start_health_checks()
         logger.info(f"Servidor de scraping iniciado en http://{self.host}:{self.port}")
     
     def run(self):
         web.run_app(self.app, host=self.host, port=self.port)
 
 
-async def start_scraping_server(host: str, port: int, processing_host: str, processing_port: int):
-    server = ScrapingServer(host, port, processing_host, processing_port)
+async def start_scraping_server(host: str, port: int, processing_host: str, processing_port: int,
+                                task_store=None, reuse_port: bool = False,
+                                processing_backends: Optional[List[Tuple[str, int]]] = None,
+                                artifacts_dir: Optional[str] = None):
+    server = ScrapingServer(host, port, processing_host, processing_port,
+                            task_store=task_store, reuse_port=reuse_port,
+                            processing_backends=processing_backends,
+                            artifacts_dir=artifacts_dir)
     await server.start()
     
     # Mantener el servidor corriendo
     try:
         await asyncio.Event().wait()
     except KeyboardInterrupt:
-        logger.info("Servidor detenido por el usuario")
\ No newline at end of file
+        logger.info("Servidor detenido por el usuario")
+
+
+def _scraping_worker(host: str, port: int, processing_host: str, processing_port: int,
+                     task_store, processing_backends, artifacts_dir):
+    try:
+        asyncio.run(start_scraping_server(
+            host, port, processing_host, processing_port,
+            task_store=task_store, reuse_port=True,
+            processing_backends=processing_backends,
+            artifacts_dir=artifacts_dir
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_scraping_workers(host: str, port: int, processing_host: str, processing_port: int,
+                         num_processes: int,
+                         processing_backends: Optional[List[Tuple[str, int]]] = None,
+                         artifacts_dir: Optional[str] = None):
+    # Modo multiproceso: N procesos independientes con su propio event loop,
+    # todos escuchando en host:port con SO_REUSEPORT. El estado de las tareas
+    # vive en un Manager compartido para que /status y /result funcionen
+    # sin importar qué proceso atienda la request; los resultados van a un
+    # directorio temporal que se borra al terminar.
+    manager, task_store = create_shared_task_store()
+    workers = []
+    
+    try:
+        for i in range(num_processes):
+            p = mp.Process(
+                target=_scraping_worker,
+                args=(host, port, processing_host, processing_port, task_store,
+                      processing_backends, artifacts_dir),
+                name=f"scraping-worker-{i + 1}"
+            )
+            p.start()
+            workers.append(p)
+            logger.info(f"Worker de scraping {p.name} iniciado (PID {p.pid})")
+        
+        # SIGTERM en el padre debe bajar también a los workers (ver finally)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        logger.info("Deteniendo workers de scraping...")
+    finally:
+        for p in workers:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+        manager.shutdown()
+        shutil.rmtree(task_store.results_dir, ignore_errors=True)
\ No newline at end of file
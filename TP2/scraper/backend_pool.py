@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from common.socket_client import AsyncSocketClient
+from common.protocol import MSG_TYPE_PING, PROTOCOL_V2, SinkFactory
+
+logger = logging.getLogger(__name__)
+
+# Configuración por defecto
+FAILURE_THRESHOLD = 3          # Fallos consecutivos para abrir el circuito
+CIRCUIT_OPEN_SECONDS = 30.0    # Tiempo que un nodo queda fuera de rotación
+HEALTH_CHECK_INTERVAL = 10.0
+HEALTH_CHECK_TIMEOUT = 2.0
+# Timeout de la tarea si el payload no trae uno (el mismo que usa el servidor)
+DEFAULT_TASK_TIMEOUT = 30
+# El servidor corta la tarea en timeout + 10 s (ProcessingServer.process_task)
+SERVER_TIMEOUT_MARGIN = 10.0
+# Espera extra por la cola del pool y el semáforo de tareas del servidor
+QUEUE_MARGIN = 30.0
+
+
+def parse_backend(address: str, default_port: int = 9000) -> Tuple[str, int]:
+    # Acepta "host:puerto", "host" y "[::1]:puerto" para IPv6
+    address = address.strip()
+    if address.startswith('['):
+        host, _, rest = address[1:].partition(']')
+        port = rest.lstrip(':')
+        return host, int(port) if port else default_port
+    if address.count(':') == 1:
+        host, port = address.split(':')
+        return host, int(port)
+    return address, default_port
+
+
+class ProcessingBackend:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.healthy = True
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_timeouts = 0
+        # Protocolo negociado con el nodo; None hasta la primera conexión
+        self.protocol_version = PROTOCOL_V2
+        self.codec: Optional[str] = None
+    
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+    
+    def is_available(self, now: float) -> bool:
+        return self.healthy and now >= self.circuit_open_until
+    
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.healthy = True
+    
+    def record_failure(self, failure_threshold: int, open_seconds: float):
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        # El nodo puede haberse reiniciado con otra versión: renegociar
+        self.protocol_version = PROTOCOL_V2
+        self.codec = None
+        if self.consecutive_failures >= failure_threshold:
+            self.circuit_open_until = time.monotonic() + open_seconds
+            logger.warning(f"Circuito abierto para {self.address} durante {open_seconds:.0f}s")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "healthy": self.healthy,
+            "circuit_open": time.monotonic() < self.circuit_open_until,
+            "outstanding": self.outstanding,
+            "protocol": self.protocol_version if self.codec else None,
+            "codec": self.codec,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "total_timeouts": self.total_timeouts
+        }
+
+
+class ProcessingBackendPool:
+
+    def __init__(self, backends: List[Tuple[str, int]],
+                 failure_threshold: int = FAILURE_THRESHOLD,
+                 circuit_open_seconds: float = CIRCUIT_OPEN_SECONDS,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL,
+                 queue_margin: float = QUEUE_MARGIN):
+        if not backends:
+            raise ValueError("Se necesita al menos un servidor de procesamiento")
+        
+        self.backends = [ProcessingBackend(host, port) for host, port in backends]
+        self.failure_threshold = failure_threshold
+        self.circuit_open_seconds = circuit_open_seconds
+        self.health_check_interval = health_check_interval
+        self.queue_margin = queue_margin
+        self._health_task: Optional[asyncio.Task] = None
+    
+    def choose_backend(self, exclude: Optional[set] = None) -> Optional[ProcessingBackend]:
+        now = time.monotonic()
+        exclude = exclude or set()
+        candidates = [b for b in self.backends if b not in exclude and b.is_available(now)]
+        
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        
+        # Power of two choices: de dos nodos al azar, el de menos requests en curso
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+    
+    def _client(self, backend: ProcessingBackend, timeout: float) -> AsyncSocketClient:
+        return AsyncSocketClient(backend.host, backend.port, max_retries=1, timeout=timeout,
+                                 protocol_version=backend.protocol_version, codec=backend.codec)
+    
+    def _remember_protocol(self, backend: ProcessingBackend, client: AsyncSocketClient):
+        # Se guarda lo negociado para no repetir el hello en cada conexión
+        if client.codec is not None:
+            backend.protocol_version = client.protocol_version
+            backend.codec = client.codec
+    
+    def request_timeout(self, data: Dict[str, Any]) -> float:
+        # El cliente espera más que el servidor: si la tarea vence, la
+        # respuesta de timeout del servidor llega antes que el corte del cliente
+        return data.get('timeout', DEFAULT_TASK_TIMEOUT) + SERVER_TIMEOUT_MARGIN + self.queue_margin
+    
+    async def send_request(self, msg_type: str, data: Dict[str, Any],
+                           sink_factory: Optional[SinkFactory] = None) -> Optional[Dict[str, Any]]:
+        tried = set()
+        timeout = self.request_timeout(data)
+        
+        while len(tried) < len(self.backends):
+            backend = self.choose_backend(exclude=tried)
+            if backend is None:
+                break
+            tried.add(backend)
+            
+            backend.outstanding += 1
+            backend.total_requests += 1
+            try:
+                client = self._client(backend, timeout)
+                result = await client.send_request(msg_type, data, sink_factory)
+                await client.close()
+                if result is not None:
+                    self._remember_protocol(backend, client)
+            finally:
+                backend.outstanding -= 1
+            
+            # None indica fallo de transporte o error del servidor: se reintenta en otro nodo
+            if result is not None:
+                backend.record_success()
+                return result
+            
+            if client.timed_out:
+                # El nodo respondió a la conexión pero la tarea es lenta: no es
+                # un fallo del nodo, y reintentarla solo ocuparía otro navegador
+                backend.total_timeouts += 1
+                logger.warning(f"{backend.address} no respondió {msg_type} en {timeout:.0f}s, no se reintenta")
+                return None
+            
+            backend.record_failure(self.failure_threshold, self.circuit_open_seconds)
+            logger.warning(f"Fallo en {backend.address} para {msg_type}, reintentando en otro nodo")
+        
+        logger.error(f"Ningún servidor de procesamiento disponible para {msg_type}")
+        return None
+    
+    async def check_backend(self, backend: ProcessingBackend) -> bool:
+        client = self._client(backend, HEALTH_CHECK_TIMEOUT)
+        result = await client.send_request(MSG_TYPE_PING, {})
+        await client.close()
+        if result is not None:
+            self._remember_protocol(backend, client)
+        
+        healthy = result is not None and result.get('success', False)
+        if healthy and not backend.healthy:
+            logger.info(f"Servidor de procesamiento {backend.address} recuperado")
+        elif not healthy and backend.healthy:
+            logger.warning(f"Servidor de procesamiento {backend.address} no responde al health check")
+        
+        backend.healthy = healthy
+        if healthy:
+            # Un ping exitoso cierra el circuito (half-open -> closed)
+            backend.record_success()
+        return healthy
+    
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.gather(
+                *(self.check_backend(b) for b in self.backends),
+                return_exceptions=True
+            )
+            await asyncio.sleep(self.health_check_interval)
+    
+    def start_health_checks(self):
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+    
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+    
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [b.to_dict() for b in self.backends]
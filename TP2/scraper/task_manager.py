@@ -1,8 +1,13 @@
 import asyncio
+import json
+import os
+import tempfile
 import uuid
 import logging
+import multiprocessing as mp
+from collections import deque
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, NamedTuple
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -54,12 +59,90 @@ class Task:
         }
 
 
+class SharedTaskStore(NamedTuple):
+    # tasks: DictProxy con el estado de cada tarea (sin el resultado)
+    # results_dir: directorio con un <task_id>.json por tarea completada
+    tasks: Any
+    results_dir: str
+
+
+def create_shared_task_store(results_dir: Optional[str] = None):
+    # Diccionario compartido entre procesos (servidor Manager). Cada worker
+    # del servidor de scraping recibe el proxy y lo usa como almacén de tareas.
+    # Por el Manager solo pasan registros de estado chicos: los resultados
+    # (que con screenshots pesan varios MB) se escriben en results_dir, que
+    # cualquier worker puede leer para responder /result.
+    manager = mp.Manager()
+    if results_dir is None:
+        results_dir = tempfile.mkdtemp(prefix="tp2-results-")
+    else:
+        os.makedirs(results_dir, exist_ok=True)
+    return manager, SharedTaskStore(manager.dict(), results_dir)
+
+
 class TaskManager:
-    def __init__(self, max_tasks: int = 1000):
-        self.tasks: Dict[str, Task] = {}
+    def __init__(self, max_tasks: int = 1000, store=None):
+        # store puede ser un dict local o un SharedTaskStore compartido entre
+        # procesos. Con el proxy las tareas se leen como copias, por eso toda
+        # mutación se vuelve a escribir en el almacén con _save_task().
+        if isinstance(store, SharedTaskStore):
+            self.tasks: Dict[str, Task] = store.tasks
+            self.results_dir = store.results_dir
+        else:
+            self.tasks = store if store is not None else {}
+            self.results_dir = None
+        self._shared = self.results_dir is not None
+        # Sin almacén compartido los resultados quedan en memoria
+        self._results: Dict[str, Dict] = {}
         self.max_tasks = max_tasks
+        # Tareas creadas por este TaskManager, de la más vieja a la más nueva.
+        # Cada worker limpia solo las suyas (son las que procesa), sacando de
+        # la punta: O(1) por tarea sin recorrer el almacén compartido.
+        self._own_tasks = deque()
         self._lock = asyncio.Lock()
     
+    async def _run(self, func, *args):
+        # Con el almacén compartido cada acceso es una llamada bloqueante al
+        # Manager o a disco: se hace en el executor para no frenar el event loop
+        if not self._shared:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    
+    def _save_task(self, task: Task):
+        self.tasks[task.task_id] = task
+    
+    def _result_path(self, task_id: str) -> str:
+        return os.path.join(self.results_dir, f"{task_id}.json")
+    
+    def _write_result(self, task_id: str, result: Dict):
+        if not self._shared:
+            self._results[task_id] = result
+            return
+        path = self._result_path(task_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+    
+    def _read_result(self, task_id: str) -> Optional[Dict]:
+        if not self._shared:
+            return self._results.get(task_id)
+        try:
+            with open(self._result_path(task_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def _remove_task(self, task_id: str):
+        self.tasks.pop(task_id, None)
+        if not self._shared:
+            self._results.pop(task_id, None)
+            return
+        try:
+            os.remove(self._result_path(task_id))
+        except FileNotFoundError:
+            pass
+    
     def generate_task_id(self) -> str:
         return str(uuid.uuid4())
     
@@ -67,7 +150,8 @@ class TaskManager:
         async with self._lock:
             task_id = self.generate_task_id()
             task = Task(task_id, url)
-            self.tasks[task_id] = task
+            await self._run(self._save_task, task)
+            self._own_tasks.append(task_id)
             
             # Limpiar tareas antiguas si hay demasiadas
             await self._cleanup_old_tasks()
@@ -77,32 +161,37 @@ class TaskManager:
     
     async def get_task(self, task_id: str) -> Optional[Task]:
         async with self._lock:
-            return self.tasks.get(task_id)
+            return await self._run(self.tasks.get, task_id)
     
     async def update_task_status(self, task_id: str, status: TaskStatus):
         async with self._lock:
-            task = self.tasks.get(task_id)
+            task = await self._run(self.tasks.get, task_id)
             if task:
                 task.update_status(status)
+                await self._run(self._save_task, task)
                 logger.info(f"Tarea {task_id} actualizada a estado: {status.value}")
     
     async def set_task_result(self, task_id: str, result: Dict):
         async with self._lock:
-            task = self.tasks.get(task_id)
+            task = await self._run(self.tasks.get, task_id)
             if task:
-                task.set_result(result)
+                # El resultado se guarda aparte; en el almacén queda solo el estado
+                await self._run(self._write_result, task_id, result)
+                task.update_status(TaskStatus.COMPLETED)
+                await self._run(self._save_task, task)
                 logger.info(f"Tarea {task_id} completada exitosamente")
     
     async def set_task_error(self, task_id: str, error: str):
         async with self._lock:
-            task = self.tasks.get(task_id)
+            task = await self._run(self.tasks.get, task_id)
             if task:
                 task.set_error(error)
+                await self._run(self._save_task, task)
                 logger.error(f"Tarea {task_id} falló: {error}")
     
     async def get_task_status(self, task_id: str) -> Optional[Dict]:
         async with self._lock:
-            task = self.tasks.get(task_id)
+            task = await self._run(self.tasks.get, task_id)
             if not task:
                 return None
             
@@ -117,41 +206,34 @@ class TaskManager:
     
     async def get_task_result(self, task_id: str) -> Optional[Dict]:
         async with self._lock:
-            task = self.tasks.get(task_id)
+            task = await self._run(self.tasks.get, task_id)
             if not task:
                 return None
             
             if task.status == TaskStatus.COMPLETED:
-                return task.result
+                return await self._run(self._read_result, task_id)
             elif task.status == TaskStatus.FAILED:
                 return {"error": task.error, "status": "failed"}
             else:
                 return {"status": task.status.value, "message": "Task not completed yet"}
     
     async def _cleanup_old_tasks(self):
-        if len(self.tasks) > self.max_tasks:
-            # Ordenar por fecha de actualización
-            sorted_tasks = sorted(
-                self.tasks.items(),
-                key=lambda x: x[1].updated_at
-            )
-            
-            # Eliminar las más antiguas
-            to_remove = len(self.tasks) - self.max_tasks
-            for task_id, _ in sorted_tasks[:to_remove]:
-                del self.tasks[task_id]
-                logger.debug(f"Tarea antigua eliminada: {task_id}")
+        # Con varios workers cada uno conserva hasta max_tasks tareas propias
+        while len(self._own_tasks) > self.max_tasks:
+            task_id = self._own_tasks.popleft()
+            await self._run(self._remove_task, task_id)
+            logger.debug(f"Tarea antigua eliminada: {task_id}")
     
     async def get_all_tasks(self) -> Dict[str, Dict]:
         async with self._lock:
             return {
                 task_id: task.to_dict()
-                for task_id, task in self.tasks.items()
+                for task_id, task in (await self._run(self.tasks.items))
             }
     
     async def count_tasks_by_status(self) -> Dict[str, int]:
         async with self._lock:
             counts = {status.value: 0 for status in TaskStatus}
-            for task in self.tasks.values():
+            for task in await self._run(self.tasks.values):
                 counts[task.status.value] += 1
             return counts
\ No newline at end of file
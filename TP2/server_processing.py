@@ -1,7 +1,12 @@
 import argparse
 import logging
 import multiprocessing as mp
-from processor.processing_server import start_processing_server
+from processor.processing_server import (
+    start_processing_server, default_pool_sizes, HANDOFF_MODES, HANDOFF_SHM,
+    ENGINES, ENGINE_SELENIUM
+)
+from processor.playwright_engine import DEFAULT_PAGES_PER_WORKER
+from common.protocol import MSG_TYPE_SCREENSHOT, MSG_TYPE_PERFORMANCE, MSG_TYPE_IMAGE_PROCESSING
 
 
 def parse_arguments():
@@ -13,6 +18,9 @@ Ejemplos de uso:
   %(prog)s -i 0.0.0.0 -p 9000
   %(prog)s -i localhost -p 9000 -n 4
   %(prog)s -i :: -p 9000 -n 8  # IPv6
+  %(prog)s -i localhost -p 9000 --screenshot-workers 2 --performance-workers 2 --image-workers 4
+  %(prog)s -i localhost -p 9000 --chromedriver /usr/bin/chromedriver --offline
+  %(prog)s -i localhost -p 9000 --engine playwright --pages-per-worker 8
         """
     )
     
@@ -36,6 +44,69 @@ Ejemplos de uso:
         help=f'Número de procesos en el pool (default: {mp.cpu_count()})'
     )
     
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=None,
+        help='Máximo de tareas enviadas a cada pool a la vez (default: 2 x workers del pool)'
+    )
+    
+    parser.add_argument(
+        '--screenshot-workers',
+        type=int,
+        default=None,
+        help='Workers dedicados a screenshots (default: 40%% de -n)'
+    )
+    
+    parser.add_argument(
+        '--performance-workers',
+        type=int,
+        default=None,
+        help='Workers dedicados a análisis de rendimiento (default: 40%% de -n)'
+    )
+    
+    parser.add_argument(
+        '--image-workers',
+        type=int,
+        default=None,
+        help='Workers dedicados a thumbnails (default: 20%% de -n)'
+    )
+    
+    parser.add_argument(
+        '--handoff',
+        choices=HANDOFF_MODES,
+        default=HANDOFF_SHM,
+        help='Cómo devuelven los workers los screenshots: memoria compartida, '
+             'archivo temporal o pipe (default: shm)'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default=ENGINE_SELENIUM,
+        help='Motor de navegador para screenshots y rendimiento (default: selenium)'
+    )
+    
+    parser.add_argument(
+        '--pages-per-worker',
+        type=int,
+        default=DEFAULT_PAGES_PER_WORKER,
+        help=f'Páginas simultáneas por worker con --engine playwright (default: {DEFAULT_PAGES_PER_WORKER})'
+    )
+    
+    parser.add_argument(
+        '--chromedriver',
+        default=None,
+        metavar='PATH',
+        help='Ruta al chromedriver (default: $CHROMEDRIVER_PATH, el PATH o webdriver-manager)'
+    )
+    
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='No descargar chromedriver: falla al iniciar si no se encuentra uno local'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -63,7 +134,17 @@ def main():
     logger.info("=" * 60)
     logger.info(f"Host: {args.ip}")
     logger.info(f"Puerto: {args.port}")
+    pool_sizes = default_pool_sizes(args.processes or mp.cpu_count())
+    overrides = {
+        MSG_TYPE_SCREENSHOT: args.screenshot_workers,
+        MSG_TYPE_PERFORMANCE: args.performance_workers,
+        MSG_TYPE_IMAGE_PROCESSING: args.image_workers
+    }
+    pool_sizes.update({k: v for k, v in overrides.items() if v})
+    
     logger.info(f"Procesos: {args.processes or mp.cpu_count()}")
+    for msg_type, size in pool_sizes.items():
+        logger.info(f"  {msg_type}: {size} workers")
     logger.info("=" * 60)
     
     try:
@@ -71,7 +152,14 @@ def main():
         start_processing_server(
             host=args.ip,
             port=args.port,
-            num_processes=args.processes
+            num_processes=args.processes,
+            max_in_flight=args.max_in_flight,
+            pool_sizes=pool_sizes,
+            handoff=args.handoff,
+            chromedriver=args.chromedriver,
+            offline=args.offline,
+            engine=args.engine,
+            pages_per_worker=args.pages_per_worker
         )
     except KeyboardInterrupt:
         logger.info("\nServidor detenido por el usuario")
@@ -1,7 +1,8 @@
 import argparse
 import asyncio
 import logging
-from scraper.async_server import start_scraping_server
+from scraper.async_server import start_scraping_server, run_scraping_workers
+from scraper.backend_pool import parse_backend
 
 
 def parse_arguments():
@@ -13,12 +14,16 @@ Ejemplos de uso:
   %(prog)s -i 0.0.0.0 -p 8000 --processing-host localhost --processing-port 9000
   %(prog)s -i localhost -p 8080 -ph 127.0.0.1 -pp 9000 -w 8
   %(prog)s -i :: -p 8000 -ph :: -pp 9000  # IPv6
+  %(prog)s -i 0.0.0.0 -p 8000 -n 4  # 4 procesos con SO_REUSEPORT
+  %(prog)s -i 0.0.0.0 -p 8000 -pb localhost:9000,localhost:9001  # Varios servidores B
   
 Endpoints disponibles:
   GET /scrape?url=<URL>       - Iniciar scraping (devuelve task_id)
   GET /status/<task_id>       - Consultar estado de tarea
   GET /result/<task_id>       - Obtener resultado de tarea
   GET /tasks                  - Listar estadísticas de tareas
+  GET /backends               - Estado de los servidores de procesamiento
+  GET /artifacts/<nombre>     - Screenshot guardado en disco (con --artifacts-dir)
         """
     )
     
@@ -42,6 +47,13 @@ Endpoints disponibles:
         help='Número de workers asíncronos (default: 4)'
     )
     
+    parser.add_argument(
+        '-n', '--processes',
+        type=int,
+        default=1,
+        help='Número de procesos del servidor compartiendo el puerto con SO_REUSEPORT (default: 1)'
+    )
+    
     parser.add_argument(
         '--processing-host', '-ph',
         default='localhost',
@@ -55,6 +67,20 @@ Endpoints disponibles:
         help='Puerto del servidor de procesamiento (default: 9000)'
     )
     
+    parser.add_argument(
+        '--processing-backends', '-pb',
+        default=None,
+        help='Lista de servidores de procesamiento host:puerto separados por coma; '
+             'reemplaza a -ph/-pp y balancea la carga entre ellos'
+    )
+    
+    parser.add_argument(
+        '--artifacts-dir',
+        default=None,
+        help='Directorio donde guardar los screenshots a medida que llegan; '
+             '/result devuelve su URL en lugar del base64'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -73,7 +99,10 @@ async def main_async(args):
     logger.info(f"Host: {args.ip}")
     logger.info(f"Puerto: {args.port}")
     logger.info(f"Workers: {args.workers}")
-    logger.info(f"Servidor de procesamiento: {args.processing_host}:{args.processing_port}")
+    if args.backends:
+        logger.info(f"Servidores de procesamiento: {', '.join(f'{h}:{p}' for h, p in args.backends)}")
+    else:
+        logger.info(f"Servidor de procesamiento: {args.processing_host}:{args.processing_port}")
     logger.info("=" * 60)
     logger.info("Iniciando servidor...")
     
@@ -82,7 +111,9 @@ async def main_async(args):
             host=args.ip,
             port=args.port,
             processing_host=args.processing_host,
-            processing_port=args.processing_port
+            processing_port=args.processing_port,
+            processing_backends=args.backends,
+            artifacts_dir=args.artifacts_dir
         )
     except KeyboardInterrupt:
         logger.info("\nServidor detenido por el usuario")
@@ -93,6 +124,10 @@ async def main_async(args):
 
 def main():
     args = parse_arguments()
+    args.backends = None
+    if args.processing_backends:
+        args.backends = [parse_backend(b, args.processing_port)
+                         for b in args.processing_backends.split(',') if b.strip()]
     
     # Configurar logging
     log_level = logging.DEBUG if args.verbose else logging.INFO
@@ -103,8 +138,21 @@ def main():
     )
     
     try:
-        # Ejecutar servidor asíncrono
-        asyncio.run(main_async(args))
+        if args.processes > 1:
+            # Modo multiproceso: cada proceso corre su propio event loop
+            logging.info(f"Iniciando {args.processes} procesos de scraping en {args.ip}:{args.port}")
+            run_scraping_workers(
+                host=args.ip,
+                port=args.port,
+                processing_host=args.processing_host,
+                processing_port=args.processing_port,
+                num_processes=args.processes,
+                processing_backends=args.backends,
+                artifacts_dir=args.artifacts_dir
+            )
+        else:
+            # Ejecutar servidor asíncrono
+            asyncio.run(main_async(args))
     except KeyboardInterrupt:
         pass
     except Exception as e:
@@ -0,0 +1,292 @@
+import pytest
+import asyncio
+import base64
+import socket
+import threading
+from common.protocol import (
+    ProtocolMessage, receive_message_async, receive_message_sync, send_message_sync,
+    negotiate, available_codecs, build_hello, is_v2_header, send_message_async,
+    FrameTooLargeError, FileAttachment, FileSink, SharedMemoryAttachment, PROTOCOL_V1, PROTOCOL_V2, MSG_TYPE_RESPONSE, MSG_TYPE_PING
+)
+from common.serialization import ensure_base64
+from common.socket_client import AsyncSocketClient
+from tests.test_processor import start_test_server
+
+
+SCREENSHOT = bytes(range(256)) * 4096  # ~1 MB de datos binarios
+
+
+async def decode_parts(parts) -> ProtocolMessage:
+    reader = asyncio.StreamReader()
+    for part in parts:
+        reader.feed_data(bytes(part))
+    reader.feed_eof()
+    return await receive_message_async(reader)
+
+
+class TestProtocol:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("codec", available_codecs())
+    async def test_v2_roundtrip_with_attachments(self, codec):
+        data = {"screenshot": SCREENSHOT, "thumbnails": [b"a", b"bc"], "success": True}
+        message = ProtocolMessage(MSG_TYPE_RESPONSE, data, PROTOCOL_V2, codec)
+        parts = message.to_parts()
+        assert is_v2_header(parts[0])
+        # El adjunto se envía tal cual, sin copiarlo ni codificarlo
+        assert any(part is SCREENSHOT for part in parts)
+        
+        decoded = await decode_parts(parts)
+        assert decoded.version == PROTOCOL_V2
+        assert decoded.codec == codec
+        assert decoded.data["screenshot"] == SCREENSHOT
+        assert decoded.data["thumbnails"] == [b"a", b"bc"]
+        assert decoded.data["success"] is True
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("codec", available_codecs())
+    async def test_v2_user_dicts_with_reserved_keys(self, codec):
+        # Los dicts del usuario con claves reservadas no se toman como adjuntos
+        data = {
+            "fake": {"__attachment__": 0},
+            "escaped": {"__escaped__": {"__attachment__": 1}},
+            "mixed": {"__attachment__": "x", "blob": b"a"},
+            "blob": SCREENSHOT,
+        }
+        message = ProtocolMessage(MSG_TYPE_RESPONSE, data, PROTOCOL_V2, codec)
+        decoded = await decode_parts(message.to_parts())
+        assert decoded.data == data
+    
+    @pytest.mark.asyncio
+    async def test_v1_encodes_bytes_as_base64(self):
+        message = ProtocolMessage(MSG_TYPE_RESPONSE, {"screenshot": b"\x89PNG"})
+        decoded = await decode_parts(message.to_parts())
+        assert decoded.version == PROTOCOL_V1
+        assert base64.b64decode(decoded.data["screenshot"]) == b"\x89PNG"
+        assert ensure_base64(decoded.data["screenshot"]) == decoded.data["screenshot"]
+    
+    def test_sync_roundtrip_v2(self):
+        left, right = socket.socketpair()
+        try:
+            send_message_sync(left, MSG_TYPE_PING, {"blob": b"xyz"}, PROTOCOL_V2, "json")
+            decoded = receive_message_sync(right)
+            assert decoded.data == {"blob": b"xyz"}
+        finally:
+            left.close()
+            right.close()
+    
+    def test_sync_large_v1_frame(self):
+        left, right = socket.socketpair()
+        data = {"screenshot": base64.b64encode(SCREENSHOT * 4).decode('utf-8')}
+        sender = threading.Thread(target=send_message_sync, args=(left, MSG_TYPE_RESPONSE, data))
+        sender.start()
+        try:
+            decoded = receive_message_sync(right)
+            assert decoded.data == data
+        finally:
+            sender.join()
+            left.close()
+            right.close()
+    
+    def test_sync_rejects_oversized_frame(self):
+        left, right = socket.socketpair()
+        try:
+            # Header que anuncia ~1 GB: no se debe reservar esa memoria
+            left.sendall((1 << 30).to_bytes(4, 'big'))
+            with pytest.raises(FrameTooLargeError):
+                receive_message_sync(right)
+        finally:
+            left.close()
+            right.close()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("version", [PROTOCOL_V1, PROTOCOL_V2])
+    async def test_async_large_frame_over_socket(self, version):
+        left, right = socket.socketpair()
+        reader, right_writer = await asyncio.open_connection(sock=right)
+        left_reader, writer = await asyncio.open_connection(sock=left)
+        try:
+            data = {"screenshot": SCREENSHOT * 4}
+            send = asyncio.create_task(send_message_async(writer, MSG_TYPE_RESPONSE, data, version, "json"))
+            decoded = await receive_message_async(reader)
+            await send
+            screenshot = decoded.data["screenshot"]
+            if version == PROTOCOL_V1:
+                screenshot = base64.b64decode(screenshot)
+            assert screenshot == SCREENSHOT * 4
+        finally:
+            writer.close()
+            right_writer.close()
+    
+    @pytest.mark.asyncio
+    async def test_async_rejects_oversized_attachment(self):
+        message = ProtocolMessage(MSG_TYPE_RESPONSE, {"screenshot": b"x" * 2048}, PROTOCOL_V2, "json")
+        reader = asyncio.StreamReader()
+        for part in message.to_parts():
+            reader.feed_data(bytes(part))
+        with pytest.raises(FrameTooLargeError):
+            await receive_message_async(reader, max_size=1024)
+    
+    @pytest.mark.asyncio
+    async def test_file_attachment_streamed_in_chunks(self, tmp_path):
+        source = tmp_path / "source.png"
+        source.write_bytes(SCREENSHOT)
+        left, right = socket.socketpair()
+        reader, right_writer = await asyncio.open_connection(sock=right)
+        left_reader, writer = await asyncio.open_connection(sock=left)
+        target = str(tmp_path / "target.png")
+        try:
+            data = {"screenshot": FileAttachment(str(source)), "success": True}
+            send = asyncio.create_task(
+                send_message_async(writer, MSG_TYPE_RESPONSE, data, PROTOCOL_V2, "json", chunk_size=16 * 1024)
+            )
+            decoded = await receive_message_async(reader, sink_factory=lambda index: FileSink(target))
+            await send
+            assert isinstance(decoded.data["screenshot"], FileAttachment)
+            assert open(target, 'rb').read() == SCREENSHOT
+        finally:
+            writer.close()
+            right_writer.close()
+    
+    @pytest.mark.asyncio
+    async def test_streaming_applies_backpressure(self, tmp_path):
+        source = tmp_path / "source.bin"
+        source.write_bytes(SCREENSHOT * 4)
+        chunk_size = 64 * 1024
+        server_done = asyncio.Event()
+        max_buffered = 0
+        
+        class SlowSink:
+            async def write(self, chunk):
+                await asyncio.sleep(0.002)
+            
+            async def close(self):
+                return None
+            
+            async def abort(self):
+                pass
+        
+        async def handle(reader, writer):
+            await receive_message_async(reader, sink_factory=lambda index: SlowSink())
+            server_done.set()
+            writer.close()
+        
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            send = asyncio.create_task(send_message_async(
+                writer, MSG_TYPE_RESPONSE, {"blob": FileAttachment(str(source), delete=False)},
+                PROTOCOL_V2, "json", chunk_size=chunk_size
+            ))
+            while not send.done():
+                max_buffered = max(max_buffered, writer.transport.get_write_buffer_size())
+                await asyncio.sleep(0.001)
+            await send
+            await server_done.wait()
+            # El emisor nunca acumula más que unas pocas partes en memoria
+            assert max_buffered <= 4 * chunk_size
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+    
+    def test_file_attachment_v1_and_sync(self, tmp_path):
+        source = tmp_path / "source.png"
+        source.write_bytes(b"\x89PNG" * 1000)
+        for version in (PROTOCOL_V1, PROTOCOL_V2):
+            left, right = socket.socketpair()
+            try:
+                data = {"screenshot": FileAttachment(str(source), delete=False)}
+                send_message_sync(left, MSG_TYPE_RESPONSE, data, version, "json", chunk_size=1000)
+                screenshot = receive_message_sync(right).data["screenshot"]
+                if version == PROTOCOL_V1:
+                    screenshot = base64.b64decode(screenshot)
+                assert screenshot == b"\x89PNG" * 1000
+            finally:
+                left.close()
+                right.close()
+    
+    def test_shared_memory_attachment(self):
+        import pickle
+        attachment = pickle.loads(pickle.dumps(SharedMemoryAttachment.create(SCREENSHOT)))
+        for version in (PROTOCOL_V1, PROTOCOL_V2):
+            left, right = socket.socketpair()
+            try:
+                sender = threading.Thread(
+                    target=send_message_sync,
+                    args=(left, MSG_TYPE_RESPONSE, {"screenshot": attachment}, version, "json")
+                )
+                sender.start()
+                screenshot = receive_message_sync(right).data["screenshot"]
+                sender.join()
+                if version == PROTOCOL_V1:
+                    screenshot = base64.b64decode(screenshot)
+                assert screenshot == SCREENSHOT
+            finally:
+                left.close()
+                right.close()
+        
+        attachment.discard()
+        with pytest.raises(FileNotFoundError):
+            SharedMemoryAttachment(attachment.name, attachment.size).view()
+    
+    def test_negotiate(self):
+        assert negotiate(build_hello())["version"] == PROTOCOL_V2
+        assert negotiate(build_hello())["codec"] == available_codecs()[0]
+        assert negotiate({"versions": [1], "codecs": ["zstd"]}) == {
+            "version": PROTOCOL_V1, "codec": "json", "success": True
+        }
+    
+    def test_msgpack_codec(self):
+        pytest.importorskip("msgpack")
+        assert available_codecs()[0] == "msgpack"
+    
+    def test_ensure_base64(self):
+        assert ensure_base64(b"\x00\x01") == "AAE="
+        assert ensure_base64(None) is None
+
+
+class TestSocketClientNegotiation:
+
+    @pytest.mark.asyncio
+    async def test_negotiates_v2_with_new_server(self):
+        server, serve_task, port = await start_test_server()
+        client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        try:
+            pong = await client.send_request(MSG_TYPE_PING, {})
+            assert pong["success"] is True
+            assert client.protocol_version == PROTOCOL_V2
+            assert client.codec == available_codecs()[0]
+        finally:
+            await client.close()
+            server.request_stop()
+            await serve_task
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_v1_with_old_server(self):
+        # Servidor v1: una respuesta de error al tipo desconocido y cierra
+        async def handle(reader, writer):
+            from common.protocol import send_message_async, MSG_TYPE_ERROR
+            message = await receive_message_async(reader)
+            if message.msg_type == "hello":
+                await send_message_async(writer, MSG_TYPE_ERROR, {"error": "Tipo desconocido"})
+            else:
+                await send_message_async(writer, MSG_TYPE_RESPONSE, {"status": "ok", "success": True})
+            writer.close()
+        
+        old_server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = old_server.sockets[0].getsockname()[1]
+        client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        try:
+            pong = await client.send_request(MSG_TYPE_PING, {})
+            assert pong["success"] is True
+            assert client.protocol_version == PROTOCOL_V1
+        finally:
+            await client.close()
+            old_server.close()
+            await old_server.wait_closed()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -1,7 +1,26 @@
 import pytest
-from processor.screenshot import generate_screenshot
-from processor.performance import analyze_performance, get_simple_performance
+import asyncio
+import os
+import time
+from processor.screenshot import (
+    generate_screenshot, parse_screenshot_options, capture_params, MAX_CAPTURE_HEIGHT
+)
+from processor import browser
+from processor.browser import parse_resource_policy, blocked_url_patterns, apply_resource_policy
+from processor.performance import (
+    analyze_performance, get_simple_performance, build_performance_data, cumulative_layout_shift
+)
+from processor.http_performance import analyze_http_performance, extract_subresources, is_first_party
 from processor.image_processor import download_image, create_thumbnail
+from processor import processing_server
+from processor.processing_server import ProcessingServer
+from processor import worker_pool
+from processor.worker_pool import SupervisedWorkerPool, WorkerCrashedError
+from common.socket_client import AsyncSocketClient
+from common.protocol import (
+    MSG_TYPE_PING, MSG_TYPE_STATS, MSG_TYPE_SCREENSHOT, MSG_TYPE_PERFORMANCE, MSG_TYPE_IMAGE_PROCESSING,
+    FileAttachment, FileSink
+)
 from PIL import Image
 import io
 import base64
@@ -25,6 +44,123 @@ class TestScreenshot:
     def test_screenshot_invalid_url(self):
         screenshot = generate_screenshot('https://invalid-domain-12345.com', timeout=10)
         assert screenshot is None
+    
+    def test_default_options_keep_png_viewport(self):
+        params = capture_params(parse_screenshot_options(), content_height=5000)
+        assert params["format"] == "png"
+        assert "quality" not in params
+        assert params["clip"] == {"x": 0, "y": 0, "width": 1920, "height": 1080, "scale": 1.0}
+        assert params["captureBeyondViewport"] is False
+    
+    def test_preview_options(self):
+        options = parse_screenshot_options({"format": "jpg", "quality": 150, "preview_width": 480})
+        params = capture_params(options, content_height=0)
+        assert params["format"] == "jpeg"
+        assert params["quality"] == 100
+        assert params["clip"]["scale"] == 0.25
+    
+    def test_full_page_capped(self):
+        options = parse_screenshot_options({"format": "webp", "full_page": True, "preview_height": 1000})
+        params = capture_params(options, content_height=50000)
+        assert params["captureBeyondViewport"] is True
+        assert params["clip"]["height"] == MAX_CAPTURE_HEIGHT
+        assert params["clip"]["scale"] == 1000 / MAX_CAPTURE_HEIGHT
+    
+    def test_invalid_format(self):
+        with pytest.raises(ValueError):
+            parse_screenshot_options({"format": "gif"})
+
+
+class TestResourcePolicy:
+    
+    def test_presets(self):
+        assert blocked_url_patterns(parse_resource_policy(None)) == []
+        lean = parse_resource_policy("lean")
+        assert lean["block_trackers"] and lean["block_media"] and not lean["block_images"]
+        assert parse_resource_policy("minimal")["block_images"]
+        with pytest.raises(ValueError):
+            parse_resource_policy("everything")
+    
+    def test_custom_domains_and_patterns(self):
+        policy = parse_resource_policy({"preset": "none", "block_domains": "Ads.example.com, cdn.tracker.io"})
+        patterns = blocked_url_patterns(policy)
+        assert "*://ads.example.com/*" in patterns
+        assert "*://*.cdn.tracker.io/*" in patterns
+        assert not any("doubleclick" in p for p in patterns)
+        
+        patterns = blocked_url_patterns(parse_resource_policy({"block_trackers": True, "block_media": True}))
+        assert "*://*.doubleclick.net/*" in patterns
+        assert "*.mp4" in patterns and "*.mp4?*" in patterns
+    
+    def test_apply_uses_devtools_blocking(self):
+        class FakeDriver:
+            def __init__(self):
+                self.commands = []
+            
+            def execute_cdp_cmd(self, cmd, params):
+                self.commands.append((cmd, params))
+        
+        driver = FakeDriver()
+        apply_resource_policy(driver, parse_resource_policy(None))
+        assert driver.commands == []
+        
+        apply_resource_policy(driver, parse_resource_policy("lean"))
+        assert [c for c, _ in driver.commands] == ["Network.enable", "Network.setBlockedURLs"]
+        assert "*.woff2" in driver.commands[1][1]["urls"]
+
+
+def fake_chromedriver(directory, name='chromedriver'):
+    path = directory / name
+    path.write_text('#!/bin/sh\necho "ChromeDriver 120.0.6099.109"\n')
+    path.chmod(0o755)
+    return str(path)
+
+
+class TestChromedriver:
+    
+    def test_explicit_path_and_self_check(self, tmp_path):
+        path = fake_chromedriver(tmp_path)
+        assert browser.resolve_chromedriver(path) == path
+        assert browser.check_chromedriver(path) == "ChromeDriver 120.0.6099.109"
+        
+        with pytest.raises(FileNotFoundError):
+            browser.resolve_chromedriver(str(tmp_path / "missing"))
+    
+    def test_env_and_path_lookup(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('PATH', str(tmp_path))
+        monkeypatch.delenv(browser.CHROMEDRIVER_ENV, raising=False)
+        with pytest.raises(FileNotFoundError):
+            browser.resolve_chromedriver(allow_download=False)
+        
+        in_path = fake_chromedriver(tmp_path)
+        assert browser.resolve_chromedriver(allow_download=False) == in_path
+        
+        pinned = fake_chromedriver(tmp_path, 'chromedriver-120')
+        monkeypatch.setenv(browser.CHROMEDRIVER_ENV, pinned)
+        assert browser.resolve_chromedriver(allow_download=False) == pinned
+    
+    def test_prepare_at_startup(self, tmp_path, monkeypatch):
+        assert processing_server.prepare_chromedriver(fake_chromedriver(tmp_path)) is not None
+        
+        monkeypatch.setenv('PATH', str(tmp_path / "empty"))
+        monkeypatch.delenv(browser.CHROMEDRIVER_ENV, raising=False)
+        with pytest.raises(FileNotFoundError):
+            processing_server.prepare_chromedriver(offline=True)
+        
+        # Sin ruta explícita, un fallo no impide arrancar el servidor
+        def failing(path=None, allow_download=True):
+            raise RuntimeError("sin red")
+        monkeypatch.setattr(processing_server, 'resolve_chromedriver', failing)
+        assert processing_server.prepare_chromedriver() is None
+    
+    def test_worker_uses_server_path(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(browser, '_chromedriver_path', None)
+        path = fake_chromedriver(tmp_path)
+        processing_server.init_worker(None, processing_server.HANDOFF_PIPE, path)
+        
+        # No se vuelve a resolver en cada navegador
+        monkeypatch.setattr(browser, 'resolve_chromedriver', lambda *a, **k: pytest.fail("resuelto de nuevo"))
+        assert browser.get_chromedriver_path() == path
 
 
 class TestPerformance:
@@ -37,6 +173,79 @@ class TestPerformance:
             assert 'load_time_ms' in performance
             assert performance['load_time_ms'] > 0
     
+    def test_build_performance_data(self):
+        raw = {
+            "navigation": {
+                "protocol": "h2", "requestStart": 20.0, "responseStart": 120.4,
+                "responseEnd": 180.0, "domInteractive": 400.0,
+                "domContentLoadedEventEnd": 450.0, "loadEventEnd": 900.0, "transferSize": 2048
+            },
+            "paint": {"first-paint": 300.0, "first-contentful-paint": 310.0},
+            "lcp": 700.0,
+            "lcpElement": "img",
+            "shifts": [[500.0, 0.05], [900.0, 0.02], [4000.0, 0.01]],
+            "longTasks": [[200.0, 120.0], [600.0, 80.0], [800.0, 40.0]],
+            "resources": {
+                "script": {"count": 3, "transferSize": 10240, "encodedBodySize": 9000},
+                "img": {"count": 2, "transferSize": 5120, "encodedBodySize": 5000}
+            },
+            "elements": {"images": 2, "scripts": 4, "stylesheets": 1}
+        }
+        data = build_performance_data(raw, 950.0)
+        
+        assert data["load_time_ms"] == 900
+        assert data["ttfb_ms"] == 120
+        assert data["response_time_ms"] == 160
+        assert data["first_contentful_paint_ms"] == 310
+        assert data["largest_contentful_paint_ms"] == 700
+        assert data["cumulative_layout_shift"] == 0.07
+        assert data["long_tasks"] == {"count": 3, "total_ms": 240}
+        # Solo cuenta la long task posterior al FCP: 80 - 50
+        assert data["total_blocking_time_ms"] == 30
+        assert data["num_requests"] == 6
+        assert data["total_size_kb"] == 17
+        assert data["resource_types"] == {"script": 3, "img": 2}
+        assert data["bytes_by_type_kb"] == {"script": 10.0, "img": 5.0}
+        assert data["num_scripts"] == 4
+        assert data["protocol"] == "h2"
+    
+    def test_cls_session_windows(self):
+        assert cumulative_layout_shift([]) == 0.0
+        # Una pausa de más de 1 s abre una ventana nueva
+        assert cumulative_layout_shift([[0, 0.1], [2000, 0.05], [2500, 0.05], [2900, 0.05]]) == 0.15
+    
+    def test_single_round_trip(self, monkeypatch):
+        class FakeDriver:
+            def __init__(self):
+                self.cdp = []
+                self.scripts = 0
+            
+            def execute_cdp_cmd(self, cmd, params):
+                self.cdp.append(cmd)
+            
+            def get(self, url):
+                pass
+            
+            def execute_script(self, script):
+                self.scripts += 1
+                return {"navigation": {"loadEventEnd": 42.0}, "elements": {"images": 1}}
+            
+            def find_elements(self, *args):
+                raise AssertionError("no debería consultar elementos por WebDriver")
+            
+            def quit(self):
+                pass
+        
+        driver = FakeDriver()
+        monkeypatch.setattr('processor.performance.create_chrome_driver', lambda timeout, policy=None: driver)
+        data = analyze_performance('https://example.com', timeout=5)
+        
+        assert driver.cdp == ['Page.addScriptToEvaluateOnNewDocument']
+        assert driver.scripts == 1
+        assert data["load_time_ms"] == 42
+        assert data["num_images"] == 1
+        assert data["resource_policy"] == "none"
+    
     def test_simple_performance(self):
         performance = get_simple_performance('https://example.com', timeout=10)
         
@@ -46,6 +255,73 @@ class TestPerformance:
         assert performance['load_time_ms'] > 0
 
 
+TEST_PAGE = b"""<html><head>
+<link rel="stylesheet" href="/style.css"><link rel="icon" href="/favicon.ico">
+<script src="/app.js"></script><script src="https://cdn.other.test/lib.js"></script>
+</head><body><img src="img/a.png"><img src="data:image/png;base64,AAAA"><img src="/missing.png"></body></html>"""
+
+
+async def start_test_site():
+    from aiohttp import web
+    
+    async def page(request):
+        return web.Response(body=TEST_PAGE, content_type='text/html')
+    
+    async def asset(request):
+        return web.Response(body=b'x' * 2048)
+    
+    app = web.Application()
+    app.router.add_get('/', page)
+    for path in ('/style.css', '/app.js', '/img/a.png'):
+        app.router.add_get(path, asset)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+class TestHttpPerformance:
+    
+    def test_extract_subresources(self):
+        resources = extract_subresources(TEST_PAGE.decode(), "https://example.com/dir/")
+        assert resources == [
+            ("https://example.com/style.css", "css"),
+            ("https://example.com/app.js", "script"),
+            ("https://cdn.other.test/lib.js", "script"),
+            ("https://example.com/dir/img/a.png", "img"),
+            ("https://example.com/missing.png", "img")
+        ]
+        assert is_first_party("https://static.example.com/a.js", "example.com")
+        assert not is_first_party("https://cdn.other.test/lib.js", "example.com")
+    
+    @pytest.mark.asyncio
+    async def test_fetches_first_party_subresources(self):
+        runner, url = await start_test_site()
+        try:
+            data = await analyze_http_performance(url, timeout=10)
+        finally:
+            await runner.cleanup()
+        
+        assert data["mode"] == "http"
+        assert data["status_code"] == 200
+        assert data["num_requests"] == 5
+        assert data["third_party_skipped"] == 1
+        assert data["failed_requests"] == 1
+        assert data["resource_types"] == {"css": 1, "script": 1, "img": 2}
+        assert data["num_scripts"] == 2
+        assert data["protocol"] == "HTTP/1.1"
+        assert data["total_size_kb"] == 6
+        for key in ("dns_ms", "connect_ms", "ttfb_ms", "download_ms"):
+            assert data[key] >= 0
+        assert data["load_time_ms"] >= data["total_ms"]
+    
+    @pytest.mark.asyncio
+    async def test_unreachable_host(self):
+        assert await analyze_http_performance("http://127.0.0.1:1/", timeout=5) is None
+
+
 class TestImageProcessor:
     
     def test_download_image(self):
@@ -89,5 +365,420 @@ class TestImageProcessor:
         assert thumbnail is not None
 
 
+class TestSupervisedWorkerPool:
+    
+    @pytest.mark.asyncio
+    async def test_submit(self):
+        pool = SupervisedWorkerPool(2, name="test")
+        await pool.start()
+        try:
+            results = await asyncio.gather(*(pool.submit(abs, -n) for n in range(5)))
+            assert results == [0, 1, 2, 3, 4]
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_start_waits_for_workers(self):
+        # El initializer tarda: start() vuelve recién cuando los workers avisan
+        pool = SupervisedWorkerPool(2, name="test", initializer=time.sleep, initargs=(0.5,))
+        await pool.start()
+        try:
+            start = time.monotonic()
+            assert await pool.submit(abs, -1, timeout=10) == 1
+            assert time.monotonic() - start < 0.3
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_start_fails_when_workers_cannot_start(self, monkeypatch):
+        # El initializer siempre falla: se relanza con espera y start() falla
+        monkeypatch.setattr(worker_pool, "RESPAWN_BACKOFF", 0.05)
+        pool = SupervisedWorkerPool(1, name="test", initializer=os._exit, initargs=(1,))
+        start = time.monotonic()
+        with pytest.raises(WorkerCrashedError):
+            await pool.start()
+        # 5 intentos con 0,05 + 0,1 + 0,2 + 0,4 s de espera entre ellos
+        assert time.monotonic() - start >= 0.75
+        stats = pool.get_stats()[0]
+        assert stats["crashes"] == worker_pool.MAX_STARTUP_FAILURES
+        assert stats["failed"] is True
+    
+    @pytest.mark.asyncio
+    async def test_timeout_kills_and_respawns_worker(self):
+        pool = SupervisedWorkerPool(1, name="test")
+        await pool.start()
+        try:
+            old_pid = pool.get_stats()[0]["pid"]
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.submit(time.sleep, 30, timeout=0.5)
+            
+            stats = pool.get_stats()[0]
+            assert stats["pid"] != old_pid
+            assert stats["timeouts"] == 1
+            assert stats["restarts"] == 1
+            # La capacidad se recupera: el worker nuevo atiende tareas
+            assert await pool.submit(abs, -7, timeout=10) == 7
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_cancellation_restarts_worker(self):
+        pool = SupervisedWorkerPool(1, name="test")
+        await pool.start()
+        try:
+            job = asyncio.create_task(pool.submit(time.sleep, 30))
+            await asyncio.sleep(0.3)
+            job.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await job
+            
+            stats = pool.get_stats()[0]
+            assert stats["cancellations"] == 1
+            assert stats["restarts"] == 1
+            assert await pool.submit(abs, -1, timeout=10) == 1
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_worker_crash(self):
+        pool = SupervisedWorkerPool(1, name="test")
+        await pool.start()
+        try:
+            with pytest.raises(WorkerCrashedError):
+                await pool.submit(os._exit, 1, timeout=10)
+            assert await pool.submit(abs, -2, timeout=10) == 2
+            assert pool.get_stats()[0]["crashes"] == 1
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_task_exception_keeps_worker(self):
+        pool = SupervisedWorkerPool(1, name="test")
+        await pool.start()
+        try:
+            with pytest.raises(RuntimeError):
+                await pool.submit(int, "no es un número", timeout=10)
+            stats = pool.get_stats()[0]
+            assert stats["jobs_failed"] == 1
+            assert stats["restarts"] == 0
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_worker_runs_jobs_together(self):
+        pool = SupervisedWorkerPool(1, name="test", concurrency=4)
+        await pool.start()
+        try:
+            start = time.monotonic()
+            pids = await asyncio.gather(*(pool.submit(async_sleep_task, 0.5, timeout=10) for _ in range(4)))
+            # Las cuatro tareas corren a la vez en el mismo proceso
+            assert time.monotonic() - start < 1.5
+            assert len(set(pids)) == 1
+            # Las funciones comunes también funcionan en un worker concurrente
+            assert await pool.submit(abs, -3, timeout=10) == 3
+            assert pool.get_metrics()["concurrency"] == 4
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_cancel_keeps_worker(self):
+        pool = SupervisedWorkerPool(1, name="test", concurrency=2)
+        await pool.start()
+        try:
+            cancelled = asyncio.create_task(pool.submit(async_sleep_task, 5, timeout=10))
+            sibling = asyncio.create_task(pool.submit(async_sleep_task, 1, timeout=10))
+            await asyncio.sleep(0.3)
+            old_pid = pool.get_stats()[0]["pid"]
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            
+            # Solo se cancela esa página: el worker y su otra tarea siguen
+            assert await sibling == old_pid
+            stats = pool.get_stats()[0]
+            assert stats["cancellations"] == 1
+            assert stats["restarts"] == 0
+            assert await pool.submit(async_sleep_task, 0, timeout=10) == old_pid
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_late_result_discards_attachments(self, tmp_path):
+        pool = SupervisedWorkerPool(1, name="test", concurrency=2)
+        await pool.start()
+        target = str(tmp_path / "late.png")
+        try:
+            # El worker importa este módulo con la primera tarea que lo usa
+            await pool.submit(async_sleep_task, 0, timeout=10)
+            # Una función bloqueante no se puede cancelar: su resultado llega
+            # igual, cuando ya nadie lo espera
+            job = asyncio.create_task(pool.submit(spool_file_task, target, timeout=10))
+            await asyncio.sleep(0.2)
+            job.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await job
+            # El worker escribe el archivo y el pool lo borra al recibir el resultado
+            await asyncio.sleep(1)
+            assert not os.path.exists(target)
+            assert await pool.submit(abs, -1, timeout=10) == 1
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_timeout_cancels_only_that_job(self):
+        pool = SupervisedWorkerPool(1, name="test", concurrency=2)
+        await pool.start()
+        try:
+            old_pid = pool.get_stats()[0]["pid"]
+            slow = asyncio.create_task(pool.submit(async_sleep_task, 30, timeout=0.5))
+            sibling = asyncio.create_task(pool.submit(async_sleep_task, 3, timeout=10))
+            with pytest.raises(asyncio.TimeoutError):
+                await slow
+            # La página vencida se cancela en el worker; la otra termina
+            assert await sibling == old_pid
+            stats = pool.get_stats()[0]
+            assert stats["timeouts"] == 1
+            assert stats["restarts"] == 0
+            assert pool._workers[0].cancelling == set()
+        finally:
+            await pool.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_blocked_worker_is_killed(self):
+        pool = SupervisedWorkerPool(1, name="test", concurrency=2)
+        await pool.start()
+        try:
+            # El worker importa este módulo con la primera tarea que lo usa; si
+            # la importación demora, la cancelación llega antes de que la tarea
+            # bloquee el event loop
+            await pool.submit(async_sleep_task, 0, timeout=10)
+            stuck = asyncio.create_task(pool.submit(blocking_sleep_task, 5, timeout=0.5))
+            sibling = asyncio.create_task(pool.submit(async_sleep_task, 4, timeout=10))
+            with pytest.raises(asyncio.TimeoutError):
+                await stuck
+            # Con el event loop bloqueado la cancelación no se confirma: el
+            # worker se reemplaza y su otra tarea falla con él
+            with pytest.raises(WorkerCrashedError):
+                await sibling
+            stats = pool.get_stats()[0]
+            assert stats["restarts"] == 1
+            assert await pool.submit(abs, -1, timeout=10) == 1
+        finally:
+            await pool.shutdown()
+
+
+def spool_file_task(path):
+    time.sleep(0.5)
+    with open(path, 'wb') as f:
+        f.write(b'png')
+    return {"screenshot": FileAttachment(path), "success": True}
+
+
+async def async_sleep_task(seconds):
+    await asyncio.sleep(seconds)
+    return os.getpid()
+
+
+async def blocking_sleep_task(seconds):
+    # Bloquea el event loop del worker (p. ej. una llamada que no cede)
+    time.sleep(seconds)
+    return os.getpid()
+
+
+async def async_screenshot_task(data):
+    await asyncio.sleep(data.get('sleep', 1))
+    return {"pid": os.getpid(), "success": True}
+
+
+def slow_screenshot_task(data):
+    time.sleep(data.get('sleep', 2))
+    return {"success": True}
+
+
+def large_screenshot_task(data):
+    content = bytes(range(256)) * (data.get('kb', 1024) * 4)
+    return {"screenshot": processing_server.spool_artifact(content, '.png'), "success": True}
+
+
+async def start_test_server(**kwargs):
+    server = ProcessingServer('127.0.0.1', 0, num_processes=1, **kwargs)
+    serve_task = asyncio.create_task(server.serve())
+    while server.server is None:
+        await asyncio.sleep(0.01)
+    port = server.server.sockets[0].getsockname()[1]
+    return server, serve_task, port
+
+
+class TestProcessingServer:
+    
+    def test_default_pool_sizes_add_up(self):
+        for n in range(3, 33):
+            assert sum(processing_server.default_pool_sizes(n).values()) == n
+        assert processing_server.default_pool_sizes(1) == {
+            MSG_TYPE_SCREENSHOT: 1, MSG_TYPE_PERFORMANCE: 1, MSG_TYPE_IMAGE_PROCESSING: 1
+        }
+        assert processing_server.default_pool_sizes(10) == {
+            MSG_TYPE_SCREENSHOT: 4, MSG_TYPE_PERFORMANCE: 4, MSG_TYPE_IMAGE_PROCESSING: 2
+        }
+    
+    @pytest.mark.asyncio
+    async def test_ping_and_task_on_same_connection(self):
+        server, serve_task, port = await start_test_server()
+        client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        try:
+            pong = await client.send_request(MSG_TYPE_PING, {})
+            assert pong == {"status": "ok", "success": True}
+            
+            # Sin imágenes en el HTML la tarea termina sin tocar la red
+            result = await client.send_request(
+                MSG_TYPE_IMAGE_PROCESSING,
+                {"url": "https://example.com", "html_content": ""}
+            )
+            assert result["success"] is True
+            assert result["count"] == 0
+            
+            unknown = await client.send_request("unknown", {})
+            assert unknown["success"] is False
+        finally:
+            await client.close()
+            server.request_stop()
+            await serve_task
+    
+    @pytest.mark.asyncio
+    async def test_many_connections_single_thread(self):
+        import threading
+        server, serve_task, port = await start_test_server()
+        threads_before = threading.active_count()
+        clients = [AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10) for _ in range(50)]
+        try:
+            results = await asyncio.gather(*(c.send_request(MSG_TYPE_PING, {}) for c in clients))
+            assert all(r["success"] for r in results)
+            # Las conexiones no crean threads nuevos
+            assert threading.active_count() <= threads_before
+        finally:
+            await asyncio.gather(*(c.close() for c in clients))
+            server.request_stop()
+            await serve_task
+    
+    @pytest.mark.asyncio
+    async def test_http_performance_skips_browser_pool(self):
+        runner, url = await start_test_site()
+        server, serve_task, port = await start_test_server()
+        client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        try:
+            result = await client.send_request(MSG_TYPE_PERFORMANCE, {"url": url, "mode": "http", "timeout": 10})
+            assert result["success"] is True
+            assert result["performance"]["num_requests"] == 5
+            
+            stats = await client.send_request(MSG_TYPE_STATS, {})
+            assert stats["pools"][MSG_TYPE_PERFORMANCE]["completed"] == 0
+            
+            invalid = await client.send_request(MSG_TYPE_PERFORMANCE, {"url": url, "mode": "curl"})
+            assert invalid["success"] is False
+        finally:
+            await client.close()
+            server.request_stop()
+            await serve_task
+            await runner.cleanup()
+    
+    @pytest.mark.asyncio
+    async def test_playwright_engine_shares_workers(self, monkeypatch):
+        monkeypatch.setitem(processing_server.PLAYWRIGHT_TASK_FUNCTIONS, MSG_TYPE_SCREENSHOT, async_screenshot_task)
+        server, serve_task, port = await start_test_server(
+            engine=processing_server.ENGINE_PLAYWRIGHT, pages_per_worker=3,
+            pool_sizes={MSG_TYPE_SCREENSHOT: 1}
+        )
+        clients = [AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10) for _ in range(3)]
+        try:
+            # Esperar a que el worker termine de arrancar
+            await clients[0].send_request(MSG_TYPE_SCREENSHOT, {"url": "https://example.com", "sleep": 0})
+            
+            start = time.monotonic()
+            results = await asyncio.gather(*(
+                c.send_request(MSG_TYPE_SCREENSHOT, {"url": "https://example.com", "sleep": 1}) for c in clients
+            ))
+            # Un solo worker atiende las tres páginas a la vez
+            assert time.monotonic() - start < 1.9
+            assert len({r["pid"] for r in results}) == 1
+            
+            stats = await clients[0].send_request(MSG_TYPE_STATS, {})
+            assert stats["pools"][MSG_TYPE_SCREENSHOT]["concurrency"] == 3
+            assert stats["pools"][MSG_TYPE_IMAGE_PROCESSING]["concurrency"] == 1
+        finally:
+            for c in clients:
+                await c.close()
+            server.request_stop()
+            await serve_task
+    
+    @pytest.mark.asyncio
+    async def test_job_classes_use_separate_pools(self, monkeypatch):
+        monkeypatch.setitem(processing_server.TASK_FUNCTIONS, MSG_TYPE_SCREENSHOT, slow_screenshot_task)
+        server, serve_task, port = await start_test_server()
+        screenshot_clients = [AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10) for _ in range(2)]
+        image_client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        try:
+            # Saturar el pool de screenshots
+            busy = [
+                asyncio.create_task(c.send_request(MSG_TYPE_SCREENSHOT, {"url": "https://example.com", "sleep": 3}))
+                for c in screenshot_clients
+            ]
+            # Los workers ya arrancaron (start() espera su aviso); solo falta
+            # que las dos tareas lleguen al pool
+            screenshot_pool = server.pools[MSG_TYPE_SCREENSHOT]
+            deadline = time.monotonic() + 2
+            while screenshot_pool.get_metrics()["queued"] < 1 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            
+            start = time.monotonic()
+            result = await image_client.send_request(
+                MSG_TYPE_IMAGE_PROCESSING, {"url": "https://example.com", "html_content": ""}
+            )
+            assert result["success"] is True
+            # El thumbnail no espera a que se libere un navegador
+            assert time.monotonic() - start < 1.5
+            
+            stats = await image_client.send_request(MSG_TYPE_STATS, {})
+            assert stats["pools"][MSG_TYPE_SCREENSHOT]["busy"] == 1
+            assert stats["pools"][MSG_TYPE_SCREENSHOT]["queued"] == 1
+            assert stats["pools"][MSG_TYPE_IMAGE_PROCESSING]["completed"] == 1
+            # Estado de cada worker, además de los totales del pool
+            image_workers = stats["pools"][MSG_TYPE_IMAGE_PROCESSING]["worker_stats"]
+            assert len(image_workers) == 1
+            assert image_workers[0]["jobs_completed"] == 1
+            assert image_workers[0]["alive"] is True
+            
+            await asyncio.gather(*busy)
+        finally:
+            for c in screenshot_clients + [image_client]:
+                await c.close()
+            server.request_stop()
+            await serve_task
+
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("handoff", [processing_server.HANDOFF_SHM, processing_server.HANDOFF_FILE])
+    async def test_large_screenshot_streamed_to_disk(self, monkeypatch, tmp_path, handoff):
+        monkeypatch.setitem(processing_server.TASK_FUNCTIONS, MSG_TYPE_SCREENSHOT, large_screenshot_task)
+        shm_before = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+        server, serve_task, port = await start_test_server(handoff=handoff)
+        client = AsyncSocketClient('127.0.0.1', port, max_retries=1, timeout=10)
+        target = str(tmp_path / "shot.png")
+        try:
+            result = await client.send_request(
+                MSG_TYPE_SCREENSHOT, {"url": "https://example.com", "kb": 2048},
+                sink_factory=lambda index: FileSink(target)
+            )
+            assert isinstance(result["screenshot"], FileAttachment)
+            assert os.path.getsize(target) == 2048 * 1024
+            # El archivo de spool o el segmento compartido se liberan al enviarlo
+            assert os.listdir(server.spool_dir) == []
+            if os.path.isdir('/dev/shm'):
+                assert set(os.listdir('/dev/shm')) <= shm_before
+        finally:
+            await client.close()
+            server.request_stop()
+            await serve_task
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '-m', 'not slow'])
\ No newline at end of file
@@ -1,8 +1,37 @@
 import pytest
 import asyncio
+import socket
 from scraper.async_http import download_page, AsyncHTTPClient
 from scraper.html_parser import parse_html, extract_title, extract_links
 from scraper.metadata_extractor import extract_metadata
+from scraper.task_manager import TaskManager, TaskStatus, create_shared_task_store
+from scraper.backend_pool import ProcessingBackendPool, parse_backend
+from scraper.async_server import ScrapingServer
+from common.protocol import (
+    receive_message_async, send_message_async, MSG_TYPE_RESPONSE, MSG_TYPE_SCREENSHOT
+)
+
+
+async def start_fake_processing_server(reply: dict):
+    # Servidor de procesamiento mínimo: responde cada mensaje con `reply`
+    async def handle(reader, writer):
+        try:
+            while True:
+                await receive_message_async(reader)
+                await send_message_async(writer, MSG_TYPE_RESPONSE, reply)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
 
 
 class TestAsyncHTTP:
@@ -102,5 +131,170 @@ class TestMetadataExtractor:
         assert metadata['twitter']['card'] == 'summary'
 
 
+class TestTaskManager:
+    
+    @pytest.mark.asyncio
+    async def test_task_lifecycle(self):
+        manager = TaskManager()
+        task_id = await manager.create_task('https://example.com')
+        
+        await manager.update_task_status(task_id, TaskStatus.SCRAPING)
+        status = await manager.get_task_status(task_id)
+        assert status['status'] == 'scraping'
+        
+        await manager.set_task_result(task_id, {"status": "success"})
+        result = await manager.get_task_result(task_id)
+        assert result == {"status": "success"}
+    
+    @pytest.mark.asyncio
+    async def test_shared_store_between_managers(self):
+        # Simula dos procesos del servidor usando el mismo almacén compartido
+        mp_manager, store = create_shared_task_store()
+        try:
+            manager_a = TaskManager(store=store)
+            manager_b = TaskManager(store=store)
+            
+            task_id = await manager_a.create_task('https://example.com')
+            await manager_a.update_task_status(task_id, TaskStatus.PROCESSING)
+            
+            status = await manager_b.get_task_status(task_id)
+            assert status is not None
+            assert status['status'] == 'processing'
+        finally:
+            mp_manager.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_old_tasks(self):
+        manager = TaskManager(max_tasks=2)
+        for _ in range(4):
+            await manager.create_task('https://example.com')
+        assert len(manager.tasks) == 2
+    
+    @pytest.mark.asyncio
+    async def test_shared_store_keeps_results_on_disk(self, tmp_path):
+        mp_manager, store = create_shared_task_store(str(tmp_path))
+        try:
+            manager_a = TaskManager(max_tasks=1, store=store)
+            manager_b = TaskManager(store=store)
+            
+            task_id = await manager_a.create_task('https://example.com')
+            await manager_a.set_task_result(task_id, {"status": "success"})
+            
+            # En el Manager queda solo el estado; el resultado está en disco
+            assert store.tasks[task_id].result is None
+            assert await manager_b.get_task_result(task_id) == {"status": "success"}
+            
+            # Al limpiar la tarea se borra también su resultado
+            await manager_a.create_task('https://example.com')
+            assert task_id not in store.tasks
+            assert not (tmp_path / f"{task_id}.json").exists()
+        finally:
+            mp_manager.shutdown()
+
+
+class TestBackendPool:
+    
+    def test_parse_backend(self):
+        assert parse_backend('localhost:9001') == ('localhost', 9001)
+        assert parse_backend('[::1]:9002') == ('::1', 9002)
+        assert parse_backend('10.0.0.5') == ('10.0.0.5', 9000)
+    
+    def test_choose_least_outstanding(self):
+        pool = ProcessingBackendPool([('a', 1), ('b', 2)])
+        pool.backends[0].outstanding = 5
+        # Con dos candidatos, power of two choices siempre elige el menos cargado
+        assert pool.choose_backend().host == 'b'
+    
+    def test_open_circuit_excluded(self):
+        pool = ProcessingBackendPool([('a', 1), ('b', 2)], failure_threshold=2)
+        for _ in range(2):
+            pool.backends[0].record_failure(pool.failure_threshold, 60)
+        assert all(pool.choose_backend().host == 'b' for _ in range(10))
+    
+    @pytest.mark.asyncio
+    async def test_failover_to_healthy_backend(self):
+        server, port = await start_fake_processing_server({"success": True, "screenshot": "abc"})
+        try:
+            pool = ProcessingBackendPool(
+                [('127.0.0.1', unused_port()), ('127.0.0.1', port)],
+                failure_threshold=1, queue_margin=5
+            )
+            for _ in range(3):
+                result = await pool.send_request(MSG_TYPE_SCREENSHOT, {"url": "https://example.com"})
+                assert result == {"success": True, "screenshot": "abc"}
+            
+            dead, alive = pool.backends
+            assert alive.total_requests == 3
+            assert dead.total_failures <= 1
+        finally:
+            server.close()
+            await server.wait_closed()
+    
+    @pytest.mark.asyncio
+    async def test_slow_task_is_not_a_failure(self):
+        # El servidor acepta la conexión pero no responde a tiempo
+        async def handle(reader, writer):
+            await receive_message_async(reader)
+            await asyncio.sleep(5)
+            writer.close()
+        
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            pool = ProcessingBackendPool([('127.0.0.1', port), ('127.0.0.1', port)], queue_margin=0)
+            for backend in pool.backends:
+                backend.codec = "json"  # Ya negociado: el primer mensaje es la tarea
+            # El timeout del cliente sale del payload, con el margen del servidor
+            assert pool.request_timeout({"timeout": 30}) == 40
+            result = await pool.send_request(MSG_TYPE_SCREENSHOT, {"url": "https://example.com", "timeout": -9.5})
+            assert result is None
+            # Sin reintento en el otro nodo y sin sumar al circuit breaker
+            assert sum(b.total_requests for b in pool.backends) == 1
+            assert all(b.consecutive_failures == 0 for b in pool.backends)
+            assert sum(b.total_timeouts for b in pool.backends) == 1
+        finally:
+            server.close()
+            await server.wait_closed()
+    
+    @pytest.mark.asyncio
+    async def test_health_check(self):
+        server, port = await start_fake_processing_server({"success": True, "status": "ok"})
+        try:
+            pool = ProcessingBackendPool([('127.0.0.1', port), ('127.0.0.1', unused_port())])
+            alive, dead = pool.backends
+            assert await pool.check_backend(alive)
+            assert not await pool.check_backend(dead)
+            assert not dead.healthy
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+
+class TestScreenshotOptions:
+    
+    def test_parse_query_options(self):
+        server = ScrapingServer('127.0.0.1', 0, '127.0.0.1', 9000)
+        options = server._parse_screenshot_options(
+            {"screenshot_format": "WEBP", "screenshot_quality": "70", "preview_width": "480", "full_page": "true"}
+        )
+        assert options == {"format": "webp", "quality": 70, "preview_width": 480, "full_page": True}
+        assert server._parse_screenshot_options({}) == {}
+    
+    def test_resource_policy_query(self):
+        server = ScrapingServer('127.0.0.1', 0, '127.0.0.1', 9000)
+        assert server._parse_resource_policy({}) is None
+        assert server._parse_resource_policy({"resource_policy": "lean"}) == "lean"
+        assert server._parse_resource_policy({"block_domains": "a.com,b.com"}) == {
+            "preset": "none", "block_domains": ["a.com", "b.com"]
+        }
+    
+    def test_invalid_query_options(self):
+        server = ScrapingServer('127.0.0.1', 0, '127.0.0.1', 9000)
+        with pytest.raises(ValueError):
+            server._parse_screenshot_options({"screenshot_format": "gif"})
+        with pytest.raises(ValueError):
+            server._parse_screenshot_options({"preview_width": "-5"})
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
\ No newline at end of file